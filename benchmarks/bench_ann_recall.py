@@ -0,0 +1,92 @@
+"""Recall@k and single-query latency of the ANN index types against flat search.
+
+Synthetic clustered, L2-normalized vectors; queries are perturbed corpus
+points. Ground truth is the exact `Flat` index. Each index is built with
+`services.ann_index` exactly as the service does (sampled training).
+
+    python benchmarks/bench_ann_recall.py --sizes 10000 50000 200000 --dim 256
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _corpus(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 50000):
+        size = min(50000, n - start)
+        block = centers[rng.integers(0, clusters, size=size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+        out[start:start + size] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def _latencies(index, queries: np.ndarray, k: int):
+    times = []
+    ids = []
+    for q in queries:
+        started = time.perf_counter()
+        _, idx = index.search(q.reshape(1, -1), k)
+        times.append((time.perf_counter() - started) * 1000)
+        ids.append(idx[0])
+    return np.array(ids), np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main() -> None:
+    from services.ann_index import apply_search_params, build_index, index_spec
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    configs = [
+        ("ivf", {"nprobe": 8}),
+        ("ivf", {"nprobe": 16}),
+        ("ivf", {"nprobe": 64}),
+        ("ivfpq", {"nprobe": 16}),
+        ("ivfpq", {"nprobe": 64}),
+        ("hnsw", {"ef_search": 32}),
+        ("hnsw", {"ef_search": 64}),
+        ("hnsw", {"ef_search": 128}),
+    ]
+    print(f"dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'n':>8}  {'index':<16}{'params':<14}{'build s':>9}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for n in args.sizes:
+        x = _corpus(n, args.dim, clusters=max(16, n // 500))
+        rng = np.random.default_rng(1)
+        queries = x[rng.choice(n, size=args.queries, replace=False)]
+        queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+        started = time.perf_counter()
+        flat = build_index({"type": "flat", "factory": "Flat"}, x)
+        build_s = time.perf_counter() - started
+        truth, p50, p99 = _latencies(flat, queries, args.k)
+        print(f"{n:>8}  {'Flat':<16}{'-':<14}{build_s:>9.2f}{1.0:>10.3f}{p50:>9.3f}{p99:>9.3f}")
+
+        built = {}
+        for kind, params in configs:
+            if kind not in built:
+                spec = index_spec(n, args.dim, kind)
+                started = time.perf_counter()
+                built[kind] = (spec, build_index(spec, x), time.perf_counter() - started)
+            spec, index, build_s = built[kind]
+            apply_search_params(index, **params)
+            found, p50, p99 = _latencies(index, queries, args.k)
+            recall = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found)])
+            label = ",".join(f"{key}={value}" for key, value in params.items())
+            print(f"{n:>8}  {spec['factory']:<16}{label:<14}{build_s:>9.2f}{recall:>10.3f}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Structure-aware chunking vs the fixed-width splitter it replaced.
+
+For each splitter, on the playbooks:
+
+  chunks      number of chunks (= embedding requests rows)
+  tokens      estimated tokens sent to the embedding API
+  cost $/1M   embedding cost per million corpus copies at --price
+  mid-sent.   chunks that start or end in the middle of a sentence
+  hit@k/MRR   golden-set retrieval quality (needs an embedding client:
+              OPENAI_API_KEY, or EMBEDDING_PROVIDER=lmstudio / hashing)
+
+and the chunking time on a synthetic document made of the playbooks
+repeated `--repeat` times at several sizes (the structured splitter is a
+single pass, time should grow linearly).
+
+    python benchmarks/bench_chunking.py --repeat 1000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from eval_embedding_dimensions import GOLDEN, _rank_metrics  # noqa: E402
+
+_SENTENCE_ENDINGS = (".", "!", "?", "…", ":", "”", "\"", "»", ")")
+
+
+def fixed_width_chunks(text: str, chunk_size: int = 700, overlap: int = 120):
+    """The character-offset splitter used before `services.chunking`."""
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = end - overlap
+    return chunks
+
+
+def _cut_mid_sentence(chunk: str, lines: set) -> bool:
+    """The chunk starts or ends inside a sentence (whole lines, e.g. list items, count as sentences)."""
+    chunk_lines = chunk.strip().splitlines()
+    first, last = chunk_lines[0].strip(), chunk_lines[-1].strip()
+    clean_start = first in lines or first[:1].isupper() or first[:1] in "¿¡“\"«("
+    clean_end = last in lines or last.endswith(_SENTENCE_ENDINGS)
+    return not (clean_start and clean_end)
+
+
+def _quality(embedder, docs, chunk_fn, k: int):
+    from services.service_rag_faiss import _embed_texts, _l2_normalize
+
+    golden = [json.loads(line) for line in GOLDEN.read_text(encoding="utf-8").splitlines() if line.strip()]
+    chunks = [(source, text) for source, text, _ in docs for text in chunk_fn(text)]
+    client, model = embedder.client, embedder.model
+    vectors = _l2_normalize(_embed_texts(client, model, [text for _, text in chunks]))
+    queries = _l2_normalize(_embed_texts(client, model, [item["query"] for item in golden]))
+    _, hit, mrr = _rank_metrics(queries @ vectors.T, [source for source, _ in chunks], [item["source"] for item in golden], k)
+    return hit, mrr
+
+
+def main() -> None:
+    from services.chunking import chunk_markdown, chunking_config
+    from services.embedding_providers import embedding_clients
+    from services.llmsettings import LLMSettings
+    from services.token_estimate import estimate_tokens
+    from services.rag_ingest import iter_documents
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--playbooks", default=str(ROOT / "playbooks"))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=1000, help="playbook copies in the largest synthetic document")
+    parser.add_argument("--price", type=float, default=0.02, help="USD per 1M embedding tokens")
+    args = parser.parse_args()
+
+    docs = list(iter_documents(args.playbooks))
+    splitters = {
+        "fixed 700/120": fixed_width_chunks,
+        "markdown {max_tokens}/{overlap_tokens} tok".format(**chunking_config()): lambda text: [c.text for c in chunk_markdown(text)],
+    }
+    embedder = embedding_clients(LLMSettings())
+    if embedder.client is None:
+        print("no embedding client (OPENAI_API_KEY not set): retrieval quality skipped")
+
+    print(f"playbooks={len(docs)} chars={sum(len(text) for _, text, _ in docs)} k={args.k}")
+    print(f"{'splitter':<26}{'chunks':>7}{'tokens':>8}{'cost $/1M':>11}{'mid-sent.':>11}{'hit@k':>8}{'MRR':>8}")
+    for name, split in splitters.items():
+        chunks = [(chunk, text) for _, text, _ in docs for chunk in split(text)]
+        tokens = sum(estimate_tokens(chunk) for chunk, _ in chunks)
+        lines = {text: {line.strip() for line in text.splitlines()} for _, text, _ in docs}
+        mid = sum(_cut_mid_sentence(chunk, lines[text]) for chunk, text in chunks) / max(1, len(chunks))
+        hit, mrr = ("-", "-")
+        if embedder.client is not None:
+            hit, mrr = (f"{v:.3f}" for v in _quality(embedder, docs, split, args.k))
+        print(f"{name:<26}{len(chunks):>7}{tokens:>8}{tokens * args.price:>11.2f}{mid:>11.0%}{hit:>8}{mrr:>8}")
+
+    corpus = "\n\n".join(text for _, text, _ in docs)
+    print()
+    print(f"{'document MB':>12}" + "".join(f"{name:>28}" for name in splitters))
+    for copies in sorted({max(1, args.repeat // 10), args.repeat}):
+        big = "\n\n".join([corpus] * copies)
+        row = f"{len(big.encode('utf-8')) / 2**20:>12.1f}"
+        for split in splitters.values():
+            started = time.perf_counter()
+            split(big)
+            row += f"{(time.perf_counter() - started) * 1000:>25.0f} ms"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Cold start and memory of the RAG artifacts: legacy layout vs mmap layout.
+
+Legacy = chunks.json parsed into dicts + embeddings.npy / faiss.index read
+into RAM. Mmap = offsets+blob chunk store + np.load(mmap_mode="r") /
+faiss IO_FLAG_MMAP_IFC. Each load runs in a fresh process; RssAnon is the
+private memory a worker pays, RssFile is page cache shared between workers.
+
+    python benchmarks/bench_cold_start.py --chunks 100000 --dim 1536
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+MODES = ("legacy-numpy", "legacy-faiss", "mmap-numpy", "mmap-faiss")
+
+
+def _rss() -> dict:
+    values = {}
+    for line in Path("/proc/self/status").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            values[key] = int(rest.split()[0]) / 1024.0
+    return values
+
+
+def _write_corpus(out: Path, n: int, dim: int) -> None:
+    import faiss
+    from services.rag_artifacts import ChunkStoreWriter
+
+    rng = np.random.default_rng(0)
+    words = np.array(["ansiedad", "dormir", "ruptura", "respira", "noche", "pareja", "calma", "paso"])
+    writer = ChunkStoreWriter(out)
+    legacy = []
+    for i in range(n):
+        text = " ".join(rng.choice(words, size=90))
+        source = f"playbook_{i // 50}.md"
+        writer.append(source, i % 50, text)
+        legacy.append({"source": source, "chunk_id": f"playbook_{i // 50}:{i % 50}", "text": text})
+    writer.close()
+    (out / "chunks.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding="utf-8")
+    del legacy
+
+    vectors = np.lib.format.open_memmap(str(out / "embeddings.npy"), mode="w+", dtype=np.float32, shape=(n, dim))
+    for start in range(0, n, 10000):
+        block = rng.standard_normal((min(10000, n - start), dim)).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:start + block.shape[0]] = block
+    vectors.flush()
+    index = faiss.IndexFlatIP(dim)
+    for start in range(0, n, 10000):
+        index.add(np.ascontiguousarray(vectors[start:start + 10000]))
+    faiss.write_index(index, str(out / "faiss.index"))
+
+
+def _load(mode: str, out: Path) -> dict:
+    import faiss
+    from services.rag_artifacts import ChunkStore, load_vectors
+    from services.service_rag_faiss import _SimpleIndex, _read_faiss_index
+
+    start = time.perf_counter()
+    if mode.startswith("legacy"):
+        chunks = json.loads((out / "chunks.json").read_text(encoding="utf-8"))
+        if mode == "legacy-numpy":
+            index = _SimpleIndex(np.load(str(out / "embeddings.npy")))
+        else:
+            index = faiss.read_index(str(out / "faiss.index"))
+    else:
+        chunks = ChunkStore.open(out)
+        if mode == "mmap-numpy":
+            index = _SimpleIndex(load_vectors(out / "embeddings.npy"))
+        else:
+            index = _read_faiss_index(out / "faiss.index")
+    load_s = time.perf_counter() - start
+    after_load = _rss()
+
+    dim = index.embeddings.shape[1] if hasattr(index, "embeddings") else index.d
+    q = np.random.default_rng(1).standard_normal((1, dim)).astype(np.float32)
+    start = time.perf_counter()
+    for _ in range(5):
+        _, idx = index.search(q, 3)
+        _ = [chunks[int(i)]["text"] for i in idx[0]]
+    search_ms = (time.perf_counter() - start) * 1000 / 5
+    return {"mode": mode, "load_s": round(load_s, 3), "search_ms": round(search_ms, 2),
+            "after_load": after_load, "after_search": _rss()}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dir", default=None, help="reuse/keep the synthetic corpus here")
+    parser.add_argument("--load", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.load:
+        print(json.dumps(_load(args.load, Path(args.dir))))
+        return
+
+    tmp = None
+    if args.dir:
+        out = Path(args.dir)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        out = Path(tmp.name)
+    if not (out / "faiss.index").exists():
+        out.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        _write_corpus(out, args.chunks, args.dim)
+        print(f"corpus: {args.chunks} chunks x {args.dim} dims written in {time.perf_counter() - t0:.1f}s")
+
+    print(f"{'mode':<14}{'load_s':>9}{'search_ms':>11}{'load_anon_MB':>14}{'RSS_MB':>9}{'anon_MB':>9}{'file_MB':>9}")
+    for mode in MODES:
+        raw = subprocess.run(
+            [sys.executable, __file__, "--load", mode, "--dir", str(out)],
+            check=True, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": str(ROOT)},
+        ).stdout
+        r = json.loads(raw.strip().splitlines()[-1])
+        m = r["after_search"]
+        print(
+            f"{mode:<14}{r['load_s']:>9}{r['search_ms']:>11}{r['after_load']['RssAnon']:>14.0f}"
+            f"{m['VmRSS']:>9.0f}{m['RssAnon']:>9.0f}{m['RssFile']:>9.0f}"
+        )
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Prompt tokens of the RAG block: plain concatenation vs the context assembler.
+
+Chunks the playbooks like the service and formats top-k sets two ways: the
+previous `+=` join of every chunk, and `assemble_context` (neighbour merge,
+overlap removal, token budget). "neighbours" are k consecutive chunks of one
+playbook (the usual result for a focused query); "random" are k chunks
+drawn from the whole corpus. Tokens are estimated at RAG_CHARS_PER_TOKEN.
+
+    python benchmarks/bench_context_tokens.py --k 3 --budget 800
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _concatenated(chunks) -> str:
+    context = "RAG_CONTEXT_START\n"
+    for item in chunks:
+        context += f"[source={item['source']} id={item['chunk_id']} score={item['score']:.4f}]\n"
+        context += item["text"] + "\n---\n"
+    return context + "RAG_CONTEXT_END"
+
+
+def main() -> None:
+    from services.chunking import chunk_markdown
+    from services.rag_context import assemble_context, estimate_tokens
+    from services.rag_ingest import iter_chunks, iter_documents
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--playbooks", default=str(ROOT / "playbooks"))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=800)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    chunks = [
+        {"source": source, "chunk_id": f"{source[:-3]}:{ordinal}", "ordinal": ordinal, "text": text, "score": 0.5}
+        for source, ordinal, text, _ in iter_chunks(iter_documents(args.playbooks), chunk_markdown)
+    ]
+    neighbours = [
+        chunks[i:i + args.k] for i in range(len(chunks) - args.k + 1)
+        if len({c["source"] for c in chunks[i:i + args.k]}) == 1
+    ]
+    rng = random.Random(0)
+    sets = {
+        "neighbours": neighbours,
+        "random": [rng.sample(chunks, args.k) for _ in range(args.samples)],
+    }
+    print(f"chunks={len(chunks)} k={args.k} budget={args.budget} tokens")
+    print(f"{'top-k sets':<12}{'n':>5}{'concat tok':>12}{'assembled tok':>15}{'saved':>8}{'assemble us':>13}")
+    for name, samples in sets.items():
+        before = after = 0
+        started = time.perf_counter()
+        for sample in samples:
+            after += estimate_tokens(assemble_context(sample, token_budget=args.budget))
+        elapsed = (time.perf_counter() - started) / max(1, len(samples)) * 1e6
+        before = sum(estimate_tokens(_concatenated(sample)) for sample in samples)
+        n = max(1, len(samples))
+        print(f"{name:<12}{len(samples):>5}{before / n:>12.0f}{after / n:>15.0f}{1 - after / max(1, before):>8.0%}{elapsed:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Metadata-filtered search vs searching the whole corpus.
+
+Synthetic corpus split into `--sources` playbooks with one topic each; a
+filter on one topic scores only that slice of embeddings.npy exactly.
+"precomputed" is the topic-routed playbook context (no embedding call).
+
+    python benchmarks/bench_filtered_search.py --chunks 200000 --dim 768 --sources 20
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _p50(fn, queries) -> float:
+    times = []
+    for q in queries:
+        started = time.perf_counter()
+        fn(q.reshape(1, -1))
+        times.append((time.perf_counter() - started) * 1000)
+    return float(np.percentile(times, 50))
+
+
+def main() -> None:
+    from services.ann_index import apply_search_params, build_index, index_spec
+    from services.rag_artifacts import ChunkStore, ChunkStoreWriter
+    from services.rag_metadata import MetadataIndex, chunk_metadata
+    from services.service_rag_faiss import RagIndex, _SimpleIndex
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--sources", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    source_ids = np.repeat(np.arange(args.sources, dtype=np.int32), -(-args.chunks // args.sources))[:args.chunks]
+    meta = [chunk_metadata(f"p{i}.md", {"topics": [f"t{i}"]}) for i in range(args.sources)]
+    started = time.perf_counter()
+    metadata = MetadataIndex(source_ids, meta)
+    meta_ms = (time.perf_counter() - started) * 1000
+    tmp = tempfile.TemporaryDirectory()
+    writer = ChunkStoreWriter(Path(tmp.name))
+    for row, source_id in enumerate(source_ids):
+        writer.append(f"p{source_id}.md", row, "")
+    writer.close()
+    chunks = ChunkStore.open(Path(tmp.name))
+    queries = x[rng.choice(args.chunks, size=args.queries, replace=False)]
+
+    engines = [("numpy exact", _SimpleIndex(x))]
+    spec = index_spec(args.chunks, args.dim)
+    if spec["type"] != "flat":
+        index = build_index(spec, x)
+        apply_search_params(index)
+        engines.append((f"faiss {spec['factory']}", index))
+
+    print(f"chunks={args.chunks} dim={args.dim} sources={args.sources} k={args.k} metadata index built in {meta_ms:.1f} ms")
+    print(f"{'search':<34}{'rows scored':>12}{'p50 ms':>9}")
+    for name, engine in engines:
+        rag = RagIndex(engine, chunks, "m", args.k, {}, True, vectors=x, metadata=metadata)
+        print(f"{name + ' (all)':<34}{args.chunks:>12}{_p50(lambda q: rag._search(q, args.k), queries):>9.3f}")
+    rows = metadata.select({"topics": ["t0"]})
+    print(f"{'filtered topics=[t0]':<34}{rows.size:>12}{_p50(lambda q: rag._search(q, args.k, metadata.select({'topics': ['t0']})), queries):>9.3f}")
+    print(f"{'precomputed playbook context':<34}{0:>12}{_p50(lambda q: rag.playbook_context(['t0']), queries):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
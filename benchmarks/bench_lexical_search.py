@@ -0,0 +1,135 @@
+"""BM25 lexical retrieval: golden-set quality and latency at corpus scale.
+
+Quality: the golden queries against the playbook chunks, ranked by BM25
+alone (no network). With an embedding client (OPENAI_API_KEY, or
+EMBEDDING_PROVIDER=lmstudio / hashing) the vector ranking and the
+reciprocal-rank fusion of both are reported too.
+
+Latency: a synthetic corpus of `--chunks` chunks, `--playbook-share` of
+the words drawn from the playbooks and the rest from a Zipf-distributed
+vocabulary of `--vocab` terms, queried with the golden queries. The vector column is the
+NumPy exact search only; a real vector query adds the embedding round trip.
+
+    python benchmarks/bench_lexical_search.py --chunks 100000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from eval_embedding_dimensions import GOLDEN  # noqa: E402
+
+
+def _metrics(rankings, sources, expected, k: int):
+    hits, rr = [], []
+    for ranked_rows, want in zip(rankings, expected):
+        ranked = [sources[row] for row in ranked_rows]
+        hits.append(want in ranked[:k])
+        rr.append(1.0 / (ranked.index(want) + 1) if want in ranked else 0.0)
+    return float(np.mean(hits)), float(np.mean(rr))
+
+
+def _percentiles(times):
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+
+def main() -> None:
+    from services.chunking import chunk_markdown
+    from services.embedding_providers import embedding_clients
+    from services.lexical_index import BM25Index, LexicalIndexWriter, reciprocal_rank_fusion, tokenize
+    from services.llmsettings import LLMSettings
+    from services.rag_ingest import iter_chunks, iter_documents
+    from services.service_rag_faiss import _SimpleIndex, _embed_texts, _l2_normalize
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--playbooks", default=str(ROOT / "playbooks"))
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=120, help="words per synthetic chunk")
+    parser.add_argument("--vocab", type=int, default=50000, help="extra synthetic terms (Zipf)")
+    parser.add_argument("--playbook-share", type=float, default=0.3)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    golden = [json.loads(line) for line in GOLDEN.read_text(encoding="utf-8").splitlines() if line.strip()]
+    queries = [item["query"] for item in golden]
+    expected = [item["source"] for item in golden]
+    chunks = list(iter_chunks(iter_documents(args.playbooks), chunk_markdown))
+    sources = [source for source, _, _, _ in chunks]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = LexicalIndexWriter(Path(tmp))
+        for _, _, text, _ in chunks:
+            writer.append(text)
+        writer.close()
+        bm25 = BM25Index.open(Path(tmp))
+        lexical = [bm25.search(query, len(chunks))[1].tolist() for query in queries]
+    rows = {"bm25": _metrics(lexical, sources, expected, args.k)}
+    embedder = embedding_clients(LLMSettings())
+    if embedder.client is None:
+        print("no embedding client (OPENAI_API_KEY not set): vector and hybrid quality skipped")
+    else:
+        docs = _l2_normalize(_embed_texts(embedder.client, embedder.model, [text for _, _, text, _ in chunks]))
+        qs = _l2_normalize(_embed_texts(embedder.client, embedder.model, queries))
+        vector = np.argsort(-(qs @ docs.T), axis=1, kind="stable").tolist()
+        fused = [
+            [c["row"] for c in reciprocal_rank_fusion([[{"row": r} for r in v], [{"row": r} for r in b]], top_k=len(chunks))]
+            for v, b in zip(vector, lexical)
+        ]
+        rows[f"vector ({embedder.provider})"] = _metrics(vector, sources, expected, args.k)
+        rows["hybrid (RRF)"] = _metrics(fused, sources, expected, args.k)
+
+    print(f"golden queries={len(golden)} playbook chunks={len(chunks)} k={args.k}")
+    print(f"{'ranking':<20}{'hit@k':>8}{'MRR':>8}")
+    for name, (hit, mrr) in rows.items():
+        print(f"{name:<20}{hit:>8.3f}{mrr:>8.3f}")
+
+    rng = random.Random(0)
+    vocabulary = [word for _, _, text, _ in chunks for word in text.split()]
+    zipf = np.random.default_rng(0).zipf(1.2, size=args.chunks * args.words) % args.vocab
+    synthetic = iter(f"t{n}" for n in zipf.tolist())
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        writer = LexicalIndexWriter(Path(tmp))
+        for _ in range(args.chunks):
+            words = [rng.choice(vocabulary) if rng.random() < args.playbook_share else next(synthetic) for _ in range(args.words)]
+            writer.append(" ".join(words))
+        entry = writer.close()
+        build_s = time.perf_counter() - started
+        size_mb = sum(f.stat().st_size for f in Path(tmp).iterdir()) / 2**20
+        bm25 = BM25Index.open(Path(tmp))
+        times = []
+        for query in queries * 10:
+            started = time.perf_counter()
+            bm25.search(query, args.k)
+            times.append((time.perf_counter() - started) * 1000)
+        bm25_p50, bm25_p99 = _percentiles(times)
+
+    vectors = np.random.default_rng(0).standard_normal((args.chunks, args.dim)).astype(np.float32)
+    index = _SimpleIndex(_l2_normalize(vectors))
+    times = []
+    for q in vectors[: len(queries) * 10]:
+        started = time.perf_counter()
+        index.search(q.reshape(1, -1), args.k)
+        times.append((time.perf_counter() - started) * 1000)
+    vec_p50, vec_p99 = _percentiles(times)
+
+    avg_terms = np.mean([len(set(tokenize(q))) for q in queries])
+    print()
+    print(f"synthetic corpus={args.chunks} chunks x {args.words} words, {entry['terms']} terms, query terms={avg_terms:.1f}")
+    print(f"{'search':<28}{'build s':>9}{'index MB':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'BM25 (lexical index)':<28}{build_s:>9.1f}{size_mb:>10.1f}{bm25_p50:>9.3f}{bm25_p99:>9.3f}")
+    print(f"{f'NumPy exact, dim={args.dim}':<28}{'-':>9}{vectors.nbytes / 2**20:>10.1f}{vec_p50:>9.3f}{vec_p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
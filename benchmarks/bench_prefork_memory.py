@@ -0,0 +1,150 @@
+"""Per-worker and total memory of `services.prefork` with and without preloading.
+
+Builds a synthetic prebuilt index (fake embeddings, no network), starts the
+launcher with N workers in both modes and reads /proc/<pid>/smaps_rollup of
+the parent and every worker once all workers report ready:
+
+- RSS: what `ps`/`top` show per process (counts shared pages in every one).
+- PSS: shared pages split between the processes that map them; the sum over
+  all processes is the real memory footprint.
+- Anon: private + copy-on-write heap pages.
+
+    python benchmarks/bench_prefork_memory.py --chunks 20000 --dim 1536 --workers 2 4 8 16
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+MODEL = "bench-embedding"
+
+
+class _BenchLLM:
+    openai_client = object()
+    openai_async_client = None
+    embedding_model = MODEL
+
+
+def _build_artifacts(cache_dir: Path, n: int, dim: int) -> None:
+    import services.service_rag_faiss as rag_mod
+
+    corpus = cache_dir.parent / "corpus.jsonl"
+    rng = np.random.default_rng(0)
+    words = ["ansiedad", "dormir", "ruptura", "respira", "noche", "pareja", "calma", "paso"]
+    with open(corpus, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"doc{i}", "text": " ".join(rng.choice(words, size=90))}) + "\n")
+
+    def fake_embed(_client, _model, texts, dimensions=None):
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), dim)).astype(np.float32)
+
+    rag_mod._embed_texts = fake_embed
+    rag_mod.build_artifacts(_BenchLLM(), str(corpus), str(cache_dir))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> list:
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return [int(p) for p in path.read_text().split()] if path.exists() else []
+
+
+def _smaps(pid: int) -> dict:
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, _, rest = line.partition(":")
+        if key in ("Rss", "Pss", "Anonymous"):
+            values[key] = int(rest.split()[0]) / 1024.0
+    return values
+
+
+def _wait_ready(port: int, workers: int, timeout: float) -> None:
+    # Requests land on arbitrary workers: require a run of ready answers.
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2) as resp:
+                ready = json.loads(resp.read())["ready"]
+        except OSError:
+            ready = False
+        streak = streak + 1 if ready else 0
+        if streak >= 4 * workers:
+            return
+        time.sleep(0.05)
+    raise TimeoutError("workers did not become ready")
+
+
+def _measure(cache_dir: Path, workers: int, preload: bool) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "RAG_CACHE_DIR": str(cache_dir),
+        "RAG_BUILD_ON_STARTUP": "false",
+        "EMBEDDING_MODEL": MODEL,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-bench-not-used"),
+        "GOOGLE_CLIENT_SECRET": os.environ.get("GOOGLE_CLIENT_SECRET", "bench"),
+        "RAG_QUERY_CACHE_DISK": "false",
+    }
+    cmd = [sys.executable, "-m", "services.prefork", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    if not preload:
+        cmd.append("--no-preload")
+    proc = subprocess.Popen(cmd, cwd=str(ROOT), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, workers, timeout=60 + 10 * workers)
+        time.sleep(0.5)
+        parent = _smaps(proc.pid)
+        kids = [_smaps(pid) for pid in _children(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    total_pss = parent["Pss"] + sum(k["Pss"] for k in kids)
+    return {
+        "workers": len(kids),
+        "rss_worker": sum(k["Rss"] for k in kids) / len(kids),
+        "pss_worker": sum(k["Pss"] for k in kids) / len(kids),
+        "anon_worker": sum(k["Anonymous"] for k in kids) / len(kids),
+        "total_pss": total_pss,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp) / "cache"
+        _build_artifacts(cache_dir, args.chunks, args.dim)
+        print(f"chunks={args.chunks} dim={args.dim} (MB; per-worker values are averages)")
+        print(f"{'mode':<12}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'Anon/worker':>13}{'total PSS':>11}")
+        for workers in args.workers:
+            for preload in (False, True):
+                r = _measure(cache_dir, workers, preload)
+                mode = "preload" if preload else "per-worker"
+                print(
+                    f"{mode:<12}{r['workers']:>8}{r['rss_worker']:>12.1f}{r['pss_worker']:>12.1f}"
+                    f"{r['anon_worker']:>13.1f}{r['total_pss']:>11.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
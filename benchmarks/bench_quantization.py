@@ -0,0 +1,92 @@
+"""Memory vs recall of quantized vector storage (float16 / int8 / FAISS SQ / IVF-PQ).
+
+"codes MB" is what every query scans and what stays resident per index;
+the float32 embeddings.npy used for rescoring is only touched for the
+`factor * k` candidates. Recall@k is against exact float32 search.
+
+    python benchmarks/bench_quantization.py --chunks 100000 --dim 768
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench_ann_recall import _corpus  # noqa: E402
+
+
+def _run(index, queries: np.ndarray, k: int):
+    ids, times = [], []
+    for q in queries:
+        started = time.perf_counter()
+        _, idx = index.search(q.reshape(1, -1), k)
+        times.append((time.perf_counter() - started) * 1000)
+        ids.append(idx[0])
+    return np.array(ids), float(np.percentile(times, 50))
+
+
+def _codes_mb(index) -> float:
+    import faiss
+
+    if hasattr(index, "embeddings"):
+        return index.embeddings.nbytes / 2**20
+    ivf = None
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        pass
+    if ivf is not None:
+        return ivf.ntotal * ivf.code_size / 2**20
+    return index.ntotal * index.code_size / 2**20
+
+
+def main() -> None:
+    from services.ann_index import apply_search_params, build_index, index_spec
+    from services.quantization import load_codes, write_codes
+    from services.service_rag_faiss import _RescoringIndex, _SimpleIndex
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factor", type=int, default=4, help="rescoring candidates = factor * k")
+    args = parser.parse_args()
+
+    x = _corpus(args.chunks, args.dim, clusters=max(16, args.chunks // 500))
+    rng = np.random.default_rng(1)
+    queries = x[rng.choice(args.chunks, size=args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    truth, _ = _run(_SimpleIndex(x), queries, args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        candidates = [("numpy float32", _SimpleIndex(x))]
+        for dtype in ("float16", "int8"):
+            root = Path(tmp) / dtype
+            root.mkdir()
+            codes, scale = load_codes(root, write_codes(root, x, dtype))
+            candidates.append((f"numpy {dtype}", _SimpleIndex(codes, scale=scale)))
+        for kind, dtype in (("flat", "float32"), ("flat", "float16"), ("flat", "int8"), ("ivfpq", "float32")):
+            spec = index_spec(args.chunks, args.dim, kind, dtype=dtype)
+            index = build_index(spec, x)
+            apply_search_params(index, nprobe=32)
+            candidates.append((f"faiss {spec['factory']}", index))
+
+        print(f"chunks={args.chunks} dim={args.dim} k={args.k} rescoring factor={args.factor}")
+        print(f"{'storage':<24}{'codes MB':>10}{'recall':>8}{'p50 ms':>9}{'rescored':>10}{'p50 ms':>9}")
+        for name, index in candidates:
+            found, p50 = _run(index, queries, args.k)
+            recall = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found)])
+            found_r, p50_r = _run(_RescoringIndex(index, x, args.factor), queries, args.k)
+            recall_r = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found_r)])
+            print(f"{name:<24}{_codes_mb(index):>10.1f}{recall:>8.3f}{p50:>9.2f}{recall_r:>10.3f}{p50_r:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
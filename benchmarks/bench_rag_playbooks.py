@@ -0,0 +1,80 @@
+"""rag_playbooks scoring: old pure-Python cosine loop vs the NumPy matrix path.
+
+The query embedding call is patched out; only scoring + top-k is timed.
+
+    python benchmarks/bench_rag_playbooks.py --sizes 100 1000 10000 --dim 1536
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services import rag_playbooks  # noqa: E402
+
+
+def _legacy_retrieve(chunks, vectors, norms, query_vec, top_k):
+    """Scoring loop as it was before vectorization."""
+    query_norm = sum(x * x for x in query_vec) ** 0.5
+    scored = []
+    for chunk, vec, norm in zip(chunks, vectors, norms):
+        if norm == 0 or query_norm == 0:
+            score = 0.0
+        else:
+            dot = 0.0
+            for x, y in zip(query_vec, vec):
+                dot += x * y
+            score = dot / (query_norm * norm)
+        scored.append({**chunk, "score": score})
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:max(1, top_k)]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} k={args.k}")
+    print(f"{'chunks':>8}{'python_ms':>12}{'numpy_ms':>11}{'speedup':>9}{'same_top':>10}")
+    for n in args.sizes:
+        matrix = rng.standard_normal((n, args.dim)).astype(np.float32)
+        query = rng.standard_normal(args.dim).astype(np.float32)
+        chunks = [{"source": f"p{i}.md", "chunk_id": f"p{i}:0", "text": "..."} for i in range(n)]
+        vectors = matrix.tolist()
+        norms = [sum(x * x for x in v) ** 0.5 for v in vectors]
+        query_list = query.tolist()
+
+        start = time.perf_counter()
+        legacy = _legacy_retrieve(chunks, vectors, norms, query_list, args.k)
+        python_ms = (time.perf_counter() - start) * 1000
+
+        rag_playbooks._INDEX = {
+            "chunks": chunks,
+            "vectors": matrix,
+            "norms": np.linalg.norm(matrix, axis=1),
+            "ready": True,
+        }
+        repeat = 50
+        with patch("services.rag_playbooks.embed_texts", return_value=[query_list]):
+            rag_playbooks.retrieve_playbook_chunks("q", top_k=args.k)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fast = rag_playbooks.retrieve_playbook_chunks("q", top_k=args.k)
+            numpy_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        same = [c["chunk_id"] for c in legacy] == [c["chunk_id"] for c in fast]
+        print(f"{n:>8}{python_ms:>12.2f}{numpy_ms:>11.3f}{python_ms / numpy_ms:>8.0f}x{str(same):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Top-k search micro-benchmark: full argsort vs _SimpleIndex vs faiss.IndexFlatIP.
+
+Reports ms per query for single queries and for a batch of queries at
+several corpus sizes (random unit vectors).
+
+    python benchmarks/bench_topk_search.py --sizes 1000 10000 100000 1000000 --dim 256
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services.service_rag_faiss import _SimpleIndex  # noqa: E402
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - optional in benchmarks
+    faiss = None
+
+
+class _ArgsortIndex:
+    """The previous _SimpleIndex: one query, full argsort of every score."""
+
+    def __init__(self, embeddings: np.ndarray) -> None:
+        self.embeddings = embeddings
+
+    def search(self, q: np.ndarray, k: int):
+        scores = q @ self.embeddings.T
+        idx = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, idx, axis=1), idx
+
+
+def _unit(rng, n: int, dim: int) -> np.ndarray:
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        block = rng.standard_normal((min(100_000, n - start), dim)).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start:start + block.shape[0]] = block
+    return out
+
+
+def _time_ms(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} k={args.k} batch={args.batch}  (ms per query)")
+    print(f"{'n':>9}{'argsort':>10}{'simple':>10}{'faiss':>10}{'argsort/b':>11}{'simple/b':>10}{'faiss/b':>10}")
+    for n in args.sizes:
+        embeddings = _unit(rng, n, args.dim)
+        single = _unit(rng, 1, args.dim)
+        batch = _unit(rng, args.batch, args.dim)
+        repeat = max(3, min(200, 2_000_000 // n))
+
+        legacy = _ArgsortIndex(embeddings)
+        simple = _SimpleIndex(embeddings)
+        row = [
+            _time_ms(lambda: legacy.search(single, args.k), repeat),
+            _time_ms(lambda: simple.search(single, args.k), repeat),
+        ]
+        flat = None
+        if faiss is not None:
+            flat = faiss.IndexFlatIP(args.dim)
+            flat.add(embeddings)
+            row.append(_time_ms(lambda: flat.search(single, args.k), repeat))
+        else:
+            row.append(float("nan"))
+
+        # The old engine only took one query per call: a batch is a loop.
+        row.append(_time_ms(lambda: [legacy.search(batch[i:i + 1], args.k) for i in range(args.batch)], max(1, repeat // 8)) / args.batch)
+        row.append(_time_ms(lambda: simple.search(batch, args.k), max(1, repeat // 8)) / args.batch)
+        if flat is not None:
+            row.append(_time_ms(lambda: flat.search(batch, args.k), max(1, repeat // 8)) / args.batch)
+        else:
+            row.append(float("nan"))
+        print(f"{n:>9}" + "".join(f"{v:>10.3f}" if i != 3 else f"{v:>11.3f}" for i, v in enumerate(row)))
+        del embeddings, legacy, simple, flat
+
+
+if __name__ == "__main__":
+    main()
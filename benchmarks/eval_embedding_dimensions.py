@@ -0,0 +1,130 @@
+"""Retrieval quality vs search latency / memory for shortened embeddings.
+
+Chunks the playbooks exactly like the service, embeds them and the golden
+queries once at the model's full size, and evaluates each size as a
+Matryoshka truncation + re-normalization (identical to the `dimensions`
+request parameter of text-embedding-3-*; `--native` re-embeds per size
+through the API instead). Quality is measured on the golden set:
+
+  hit@k      the expected playbook is among the top-k chunk sources
+  MRR        1 / rank of the first chunk from the expected playbook
+  overlap@k  top-k chunks shared with the full-size ranking
+
+Latency and memory are measured on a synthetic corpus of `--corpus-size`
+chunks with the index the service would build for it (RAG_INDEX_TYPE).
+Without an embedding client (OPENAI_API_KEY, or EMBEDDING_PROVIDER=lmstudio /
+hashing) only latency and memory are reported; sizes above what the
+provider returns are skipped for quality.
+
+    python benchmarks/eval_embedding_dimensions.py --dims 256 512 1024 1536 --corpus-size 100000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+GOLDEN = Path(__file__).resolve().parent / "golden_queries.jsonl"
+
+
+def _rank_metrics(scores: np.ndarray, sources, expected, k: int):
+    order = np.argsort(-scores, axis=1, kind="stable")
+    hits, rr = [], []
+    for row, want in zip(order, expected):
+        ranked = [sources[i] for i in row]
+        hits.append(want in ranked[:k])
+        rr.append(1.0 / (ranked.index(want) + 1) if want in ranked else 0.0)
+    return order[:, :k], float(np.mean(hits)), float(np.mean(rr))
+
+
+def _quality(embedder, args, sizes):
+    from services.chunking import chunk_markdown
+    from services.embedding_dimensions import fit_dimensions
+    from services.rag_ingest import iter_chunks, iter_documents
+    from services.service_rag_faiss import _embed_texts, _l2_normalize
+
+    golden = [json.loads(line) for line in Path(args.golden).read_text(encoding="utf-8").splitlines() if line.strip()]
+    chunks = list(iter_chunks(iter_documents(args.playbooks), chunk_markdown))
+    texts = [text for _, _, text, _ in chunks]
+    sources = [source for source, _, _, _ in chunks]
+    queries = [item["query"] for item in golden]
+    expected = [item["source"] for item in golden]
+    client, model = embedder.client, args.model or embedder.model
+
+    full_docs = _l2_normalize(_embed_texts(client, model, texts))
+    full_queries = _l2_normalize(_embed_texts(client, model, queries))
+    reference, _, _ = _rank_metrics(full_queries @ full_docs.T, sources, expected, args.k)
+    print(f"provider={embedder.provider} model={model} chunks={len(chunks)} golden queries={len(golden)} full size={full_docs.shape[1]}")
+
+    results = {}
+    for size in sizes:
+        if size > full_docs.shape[1]:
+            continue
+        if args.native:
+            docs = _l2_normalize(_embed_texts(client, model, texts, size))
+            qs = _l2_normalize(_embed_texts(client, model, queries, size))
+        else:
+            docs, qs = fit_dimensions(full_docs, size), fit_dimensions(full_queries, size)
+        top, hit, mrr = _rank_metrics(qs @ docs.T, sources, expected, args.k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(top, reference)])
+        results[size] = (hit, mrr, float(overlap))
+    return results
+
+
+def _cost(size: int, args):
+    from services.ann_index import apply_search_params, build_index, index_spec
+
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((args.corpus_size, size)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    spec = index_spec(args.corpus_size, size)
+    index = build_index(spec, corpus)
+    apply_search_params(index)
+    queries = corpus[rng.choice(args.corpus_size, size=args.queries, replace=False)]
+    times = []
+    for q in queries:
+        started = time.perf_counter()
+        index.search(q.reshape(1, -1), args.k)
+        times.append((time.perf_counter() - started) * 1000)
+    return spec["factory"], corpus.nbytes / 2**20, float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+
+def main() -> None:
+    from services.embedding_providers import embedding_clients
+    from services.llmsettings import LLMSettings
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 768, 1024, 1536])
+    parser.add_argument("--model", default=None, help="defaults to EMBEDDING_MODEL")
+    parser.add_argument("--playbooks", default=str(ROOT / "playbooks"))
+    parser.add_argument("--golden", default=str(GOLDEN))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--corpus-size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200, help="latency samples per size")
+    parser.add_argument("--native", action="store_true", help="ask the API for each size instead of truncating")
+    args = parser.parse_args()
+
+    embedder = embedding_clients(LLMSettings())
+    sizes = sorted(set(args.dims))
+    quality = {}
+    if embedder.client is None:
+        print("no embedding client (OPENAI_API_KEY not set): reporting latency and memory only")
+    else:
+        quality = _quality(embedder, args, sizes)
+
+    print(f"corpus={args.corpus_size} chunks k={args.k}")
+    print(f"{'dims':>6}  {'index':<14}{'vectors MB':>11}{'p50 ms':>9}{'p99 ms':>9}{'hit@k':>8}{'MRR':>8}{'overlap':>9}")
+    for size in sizes:
+        factory, mb, p50, p99 = _cost(size, args)
+        hit, mrr, overlap = (f"{v:.3f}" for v in quality[size]) if size in quality else ("-", "-", "-")
+        print(f"{size:>6}  {factory:<14}{mb:>11.1f}{p50:>9.3f}{p99:>9.3f}{hit:>8}{mrr:>8}{overlap:>9}")
+
+
+if __name__ == "__main__":
+    main()
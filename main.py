@@ -1,5 +1,8 @@
 ## Basic
+import asyncio
 from datetime import datetime, timezone
+import hmac
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,9 +10,10 @@ load_dotenv(override=True)
 
 ## App core
 
-from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -37,7 +41,11 @@ from services.service_usage import UsageService
 
 app = FastAPI()
 llm = LLMSettings()
-rag = RagFaissService(llm)
+rag = RagFaissService(
+    llm,
+    playbooks_dir=os.getenv("RAG_PLAYBOOKS_PATH", "playbooks"),
+    cache_dir=os.getenv("RAG_CACHE_DIR", ".rag_cache"),
+)
 chatbot = ChatbotService(llm)
 classifier = ClassifierService(llm)
 #auth_service: AuthService | None = None
@@ -45,6 +53,13 @@ classifier = ClassifierService(llm)
 debug = os.getenv("DEBUG", "").lower() == "true"
 anon_limit = int(os.getenv("ANON_MESSAGE_LIMIT", "10"))
 auth_limit = int(os.getenv("AUTH_MESSAGE_LIMIT", "100"))
+rag_timeout = float(os.getenv("RAG_TIMEOUT_SECONDS", "3"))
+classify_timeout = float(os.getenv("CLASSIFY_TIMEOUT_SECONDS", "5"))
+rag_build_on_startup = os.getenv("RAG_BUILD_ON_STARTUP", "true").lower() == "true"
+rag_reload_interval = float(os.getenv("RAG_RELOAD_INTERVAL_SECONDS", "0"))
+rag_admin_token = os.getenv("RAG_ADMIN_TOKEN", "")
+# off | filter | precomputed: usar los temas del clasificador para acotar el RAG.
+rag_topic_routing = os.getenv("RAG_TOPIC_ROUTING", "off").lower()
 auth_service = AuthService(
         debug=debug,
         cookie_name=os.getenv("COOKIE_NAME","oms_session"),
@@ -100,6 +115,7 @@ def root():
         "endpoints": [
             "/api/health",
             "/api/chat",
+            "/api/chat/stream",
             "/api/classify",
             "/api/waitlist",
             "/api/auth/google",
@@ -112,15 +128,55 @@ def root():
 
 @app.get("/api/health")
 def health():
-    if rag._index is None:
-        return {"status": "ok", "rag": "not_initialized"}
-    return {"status": "ok", "rag": rag._index.status()}
+    # live: el proceso responde; ready: el indice RAG esta cargado
+    rag_status = rag.status()
+    return {"status": "ok", "live": True, "ready": rag_status["ready"], "rag": rag_status}
+
+
+_rag_warmup: asyncio.Task | None = None
+_rag_background: set[asyncio.Task] = set()
+
+
+def _spawn_rag_task(coro) -> asyncio.Task:
+    # Guardamos la referencia para que el task no se recolecte a medias
+    task = asyncio.create_task(coro)
+    _rag_background.add(task)
+    task.add_done_callback(_rag_background.discard)
+    return task
+
+
+async def _watch_playbooks() -> None:
+    # Sondeo de playbooks: si cambian, reconstruccion incremental en segundo
+    # plano y cambio atomico del indice (las peticiones en curso usan el anterior)
+    while True:
+        await asyncio.sleep(rag_reload_interval)
+        if not rag.is_ready:
+            continue
+        try:
+            if await asyncio.to_thread(rag.playbooks_changed):
+                await asyncio.to_thread(rag.reload)
+        except Exception:
+            logger.exception("[RAG] playbooks watcher error")
 
 
 @app.on_event("startup") #Deprecated
-def startup_event():
+async def startup_event():
+    global _rag_warmup
     print("Startup Event")
-    rag.build_or_load()
+    # El indice se carga/construye en segundo plano: la app acepta trafico
+    # enseguida y el chat responde sin RAG hasta que este listo.
+    # Con RAG_BUILD_ON_STARTUP=false solo se verifican y cargan artefactos precompilados
+    # (sin red, es rapido): si no pasan la verificacion la app no arranca.
+    # Con services.prefork el indice ya viene cargado del proceso padre.
+    if not rag.is_ready:
+        if rag_build_on_startup:
+            _rag_warmup = asyncio.create_task(asyncio.to_thread(rag.warm_up))
+        else:
+            await asyncio.to_thread(rag.warm_up, True)
+            if not rag.is_ready:
+                raise RuntimeError(f"RAG prebuilt artifacts rejected: {rag.status()['error']}")
+    if rag_reload_interval > 0:
+        _spawn_rag_task(_watch_playbooks())
     #global auth_service, usage_service
  
 
@@ -153,10 +209,54 @@ def require_user(user: dict | None = Depends(get_current_user)) -> dict:
     return _require_auth_service().require_auth(user)
 
 
+async def _retrieve_rag_context(message: str, filters: dict | None = None) -> str:
+    try:
+        return await asyncio.wait_for(
+            rag.aretrieve(message, top_k=3, filters=filters),
+            timeout=rag_timeout,
+        )
+    except asyncio.TimeoutError:
+        # El proveedor de embeddings va lento: el indice BM25 local responde sin red.
+        logger.warning("[RAG] retrieve timed out after %.2fs, using the lexical index", rag_timeout)
+        return rag.lexical_context(message, top_k=3, filters=filters)
 
 
-@app.post("/api/chat")
-async def chat(payload: ChatRequest, request: Request):
+async def _classify_message(message: str) -> dict:
+    try:
+        return await asyncio.wait_for(
+            classifier.aclassify(message),
+            timeout=classify_timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.warning("[CLASSIFY] classify timed out after %.2fs, using defaults", classify_timeout)
+        return ClassifyResult.coerce_defaults({}).model_dump()
+
+
+async def _prepare_chat_context(message: str) -> tuple[str, dict]:
+    if rag_topic_routing not in ("filter", "precomputed"):
+        # RAG y clasificacion no dependen entre si: se lanzan a la vez y
+        # merge_setting espera a ambos (latencia ~ max(rag, classify)).
+        rag_context, classification = await asyncio.gather(
+            _retrieve_rag_context(message),
+            _classify_message(message),
+        )
+        return rag_context, classification
+    # Con enrutado por temas el RAG depende de la clasificacion: va despues,
+    # pero solo busca en los playbooks de esos temas (o no busca nada).
+    classification = await _classify_message(message)
+    topics = classification.get("topics") or []
+    if rag_topic_routing == "precomputed":
+        rag_context = rag.precomputed_context(
+            topics, night_mode=bool(classification.get("night_mode_hint")), top_k=3
+        )
+        if rag_context:
+            return rag_context, classification
+    return await _retrieve_rag_context(message, rag.topic_filters(topics)), classification
+
+
+
+def _enforce_usage(payload: ChatRequest, request: Request) -> tuple[bool, JSONResponse | None]:
+    """Return (is_anon, paywall_response); paywall_response is set when the limit is reached."""
     user: dict | None = None
     if auth_service is not None:
         user = auth_service.get_current_user(request)
@@ -173,29 +273,49 @@ async def chat(payload: ChatRequest, request: Request):
             if exc.status_code == 402:
                 paywall_resp = JSONResponse({"detail": exc.detail}, status_code=402)
                 usage.ensure_guest_id(request, paywall_resp)
-                return paywall_resp
+                return is_anon, paywall_resp
             raise
     else:
         try:
            usage.enforce_auth_limit(user_turns)  # implementar
         except HTTPException as exc:
             if exc.status_code == 402:
-                return JSONResponse({"detail": exc.detail}, status_code=402)
+                return is_anon, JSONResponse({"detail": exc.detail}, status_code=402)
             raise
-    try:
-        rag_context = rag.retrieve(payload.message, top_k=3)
-        logger.info("[RAG] used=%s len=%s", bool(rag_context), len(rag_context) if rag_context else 0)
+    return is_anon, None
 
-        classification = classifier.classify(payload.message)
-        classification_payload = classification if isinstance(classification, dict) else dict(classification)
 
-        merged_setting = merge_setting(
-            request_setting=payload.setting,
-            classification=classification_payload,
-            rag_context=rag_context,
-        )
+async def _build_chat_setting(payload: ChatRequest) -> tuple[dict, dict]:
+    rag_context, classification = await _prepare_chat_context(payload.message)
+    logger.info("[RAG] used=%s len=%s", bool(rag_context), len(rag_context) if rag_context else 0)
+
+    classification_payload = classification if isinstance(classification, dict) else dict(classification)
+
+    merged_setting = merge_setting(
+        request_setting=payload.setting,
+        classification=classification_payload,
+        rag_context=rag_context,
+    )
+    return merged_setting, classification
 
-        chat_response = chatbot.chat(
+
+def _chat_metadata(payload: ChatRequest, classification) -> dict:
+    return {
+        "model": "LMStudio" if payload.use_local else "OpenAI Responses",
+        "classification": classification,
+        "risk": classification.get("risk") if isinstance(classification, dict) else None,
+    }
+
+
+@app.post("/api/chat")
+async def chat(payload: ChatRequest, request: Request):
+    is_anon, paywall_resp = _enforce_usage(payload, request)
+    if paywall_resp is not None:
+        return paywall_resp
+    try:
+        merged_setting, classification = await _build_chat_setting(payload)
+
+        chat_response = await chatbot.achat(
             message=payload.message,
             history=payload.history,
             setting=merged_setting,
@@ -204,9 +324,7 @@ async def chat(payload: ChatRequest, request: Request):
 
         data = {
             "response": chat_response,
-            "model": "LMStudio" if payload.use_local else "OpenAI Responses",
-            "classification": classification,
-            "risk": classification.get("risk") if isinstance(classification, dict) else None,
+            **_chat_metadata(payload, classification),
         }
         resp = JSONResponse(data)
         
@@ -219,6 +337,55 @@ async def chat(payload: ChatRequest, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(payload: ChatRequest, request: Request):
+    """Same flow as /api/chat, but the reply is sent as SSE token deltas.
+
+    Events: `delta` ({"text": ...}) per chunk, then `done` with model,
+    classification and risk, or `error` ({"status_code", "detail"}).
+    """
+    is_anon, paywall_resp = _enforce_usage(payload, request)
+    if paywall_resp is not None:
+        return paywall_resp
+    try:
+        merged_setting, classification = await _build_chat_setting(payload)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for delta in chatbot.astream_chat(
+                message=payload.message,
+                history=payload.history,
+                setting=merged_setting,
+                use_local=payload.use_local,
+            ):
+                yield _sse_event("delta", {"text": delta})
+        except HTTPException as exc:
+            yield _sse_event("error", {"status_code": exc.status_code, "detail": exc.detail})
+            return
+        except Exception as exc:
+            logger.exception("[CHAT] stream failed")
+            yield _sse_event("error", {"status_code": 500, "detail": str(exc)})
+            return
+        yield _sse_event("done", _chat_metadata(payload, classification))
+
+    resp = StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if is_anon:
+        _require_usage_service().ensure_guest_id(request, resp)
+    return resp
+
+
 class ClassifyRequest(BaseModel):
     message: str
     history: list = Field(default_factory=list)
@@ -229,7 +396,7 @@ class ClassifyRequest(BaseModel):
 @app.post("/api/classify", response_model=ClassifyResult)
 async def classify(request: ClassifyRequest):
     try:
-        result = classifier.classify(request.message)
+        result = await classifier.aclassify(request.message)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -238,6 +405,17 @@ async def classify(request: ClassifyRequest):
 
 
 
+@app.post("/api/admin/rag/reload", status_code=202)
+async def admin_rag_reload(x_admin_token: str = Header(default="")):
+    # Bytes: compare_digest rechaza str no ASCII y Starlette decodifica las cabeceras como latin-1.
+    if not rag_admin_token or not hmac.compare_digest(x_admin_token.encode(), rag_admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if rag.status()["reloading"]:
+        raise HTTPException(status_code=409, detail="RAG reload already running")
+    _spawn_rag_task(asyncio.to_thread(rag.reload))
+    return {"ok": True, "status": "reloading"}
+
+
 @app.post("/api/auth/google")
 def auth_google(payload: GoogleAuthIn):
     return _require_auth_service().auth_google(payload)
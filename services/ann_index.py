@@ -0,0 +1,126 @@
+import logging
+import math
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - runtime error path
+    faiss = None
+
+logger = logging.getLogger("rag")
+
+# Index family: auto | flat | ivf | ivfpq | hnsw. "auto" picks by corpus size.
+_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto").lower()
+_FLAT_MAX_CHUNKS = int(os.getenv("RAG_FLAT_MAX_CHUNKS", "50000"))
+_IVFPQ_MIN_CHUNKS = int(os.getenv("RAG_IVFPQ_MIN_CHUNKS", "1000000"))
+_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 = 4 * sqrt(n)
+_PQ_M = int(os.getenv("RAG_PQ_M", "0"))  # 0 = dim / 16 (rounded to a divisor of dim)
+_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+# Search-time knobs, applied every time an index is loaded.
+_NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw")
+# Scalar quantizer used for the stored codes of each vector dtype.
+_SQ_CODES = {"float32": None, "float16": "SQfp16", "int8": "SQ8"}
+# faiss wants ~39 training points per centroid; more only slows training.
+_TRAIN_POINTS_PER_LIST = 64
+_PQ_MIN_TRAIN = 256 * 39
+_SQ_MIN_TRAIN = 65536
+
+
+def choose_index_type(n: int) -> str:
+    if n <= _FLAT_MAX_CHUNKS:
+        return "flat"
+    if n < _IVFPQ_MIN_CHUNKS:
+        return "ivf"
+    return "ivfpq"
+
+
+def _pq_m(dim: int) -> int:
+    target = _PQ_M or max(1, dim // 16)
+    for m in range(min(target, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def index_spec(n: int, dim: int, index_type: str | None = None, dtype: str = "float32") -> Dict[str, Any]:
+    """Resolve the configured index family into a concrete faiss factory string.
+
+    Explicit choices that cannot be trained on `n` vectors fall back to the
+    closest one that can (ivfpq -> ivf -> flat). `dtype` picks the scalar
+    quantizer of the stored codes (IVF-PQ has its own). `lossy` specs are
+    meant to be rescored at full precision.
+    """
+    index_type = index_type or _INDEX_TYPE
+    kind = choose_index_type(n) if index_type == "auto" else index_type
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"RAG_INDEX_TYPE must be auto or one of {INDEX_TYPES}, got {index_type!r}")
+    if kind == "ivfpq" and n < _PQ_MIN_TRAIN:
+        logger.warning("[RAG] %s chunks are too few to train PQ codes, using ivf", n)
+        kind = "ivf"
+    nlist = _IVF_NLIST or int(4 * math.sqrt(max(n, 1)))
+    nlist = max(1, min(nlist, n // 39))
+    if kind == "ivf" and nlist < 2:
+        kind = "flat"
+    sq = _SQ_CODES[dtype]
+    if kind == "flat":
+        spec = {"type": "flat", "factory": sq or "Flat"}
+    elif kind == "hnsw":
+        spec = {
+            "type": "hnsw",
+            "factory": f"HNSW{_HNSW_M}" + (f"_{sq}" if sq else ""),
+            "ef_construction": _HNSW_EF_CONSTRUCTION,
+        }
+    elif kind == "ivf":
+        spec = {"type": "ivf", "factory": f"IVF{nlist},{sq or 'Flat'}", "nlist": nlist}
+    else:
+        m = _pq_m(dim)
+        return {"type": "ivfpq", "factory": f"IVF{nlist},PQ{m}", "nlist": nlist, "pq_m": m, "dtype": "pq", "lossy": True}
+    spec.update(dtype=dtype, lossy=sq is not None)
+    return spec
+
+
+def build_index(spec: Dict[str, Any], vectors: np.ndarray, block_rows: int = 8192, seed: int = 0):
+    """Create, train (on a sample) and fill a faiss index from a possibly mmapped matrix."""
+    n, dim = (int(vectors.shape[0]), int(vectors.shape[1])) if vectors.size else (0, 0)
+    if spec["factory"] == "Flat":
+        # Plain IndexFlatIP keeps the codes mmap-loadable.
+        index = faiss.IndexFlatIP(dim)
+    else:
+        index = faiss.index_factory(dim, spec["factory"], faiss.METRIC_INNER_PRODUCT)
+    if spec["type"] == "hnsw":
+        index.hnsw.efConstruction = int(spec.get("ef_construction", _HNSW_EF_CONSTRUCTION))
+    if not index.is_trained:
+        min_train = _PQ_MIN_TRAIN if spec["type"] == "ivfpq" else _SQ_MIN_TRAIN if spec.get("lossy") else 0
+        train_size = min(n, max(spec.get("nlist", 1) * _TRAIN_POINTS_PER_LIST, min_train))
+        rows = np.sort(np.random.default_rng(seed).choice(n, size=train_size, replace=False))
+        index.train(np.ascontiguousarray(vectors[rows], dtype=np.float32))
+        spec["trained_on"] = int(train_size)
+    for start in range(0, n, block_rows):
+        index.add(np.ascontiguousarray(vectors[start:start + block_rows], dtype=np.float32))
+    return index
+
+
+def apply_search_params(index, nprobe: int = _NPROBE, ef_search: int = _HNSW_EF_SEARCH) -> Dict[str, int]:
+    """Set `nprobe` / `efSearch` on whatever index type this is; returns what was applied."""
+    applied: Dict[str, int] = {}
+    if faiss is None:
+        return applied
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        applied["nprobe"] = int(ivf.nprobe)
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+        applied["efSearch"] = int(ef_search)
+    return applied
@@ -0,0 +1,206 @@
+import os
+import re
+from typing import Iterator, List, NamedTuple, Tuple
+
+from services.token_estimate import default_chars_per_token
+
+# Target chunk size and overlap in (estimated) tokens; ~700 / 120 characters.
+_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "175"))
+_CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "30"))
+# Bump when the splitting rules change: published indexes are re-chunked.
+CHUNKER_VERSION = 2
+# A heading starts a new chunk once the current one is at least this full.
+_MIN_FILL = 0.5
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s*([-*_])(?:\s*\1){2,}\s*$")
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'»”’)\]]*\s+")
+
+
+class TextChunk(NamedTuple):
+    text: str
+    headings: Tuple[str, ...] = ()
+
+    @property
+    def breadcrumb(self) -> str:
+        return " > ".join(self.headings)
+
+
+# (separator before it, text, heading path, is a heading line)
+_Piece = Tuple[str, str, Tuple[str, ...], bool]
+
+
+def chunking_config() -> dict:
+    """Settings that decide chunk boundaries; recorded in the manifest."""
+    return {
+        "version": CHUNKER_VERSION,
+        "max_tokens": _CHUNK_TOKENS,
+        "overlap_tokens": _CHUNK_OVERLAP_TOKENS,
+        "chars_per_token": default_chars_per_token(),
+    }
+
+
+def _blocks(text: str) -> Iterator[Tuple[Tuple[str, ...], str, bool]]:
+    """Headings and paragraphs in document order: (heading path, text, is_heading)."""
+    path: List[Tuple[int, str]] = []
+    paragraph: List[str] = []
+    for line in text.splitlines():
+        heading = _HEADING.match(line)
+        if heading is None and line.strip() and not _RULE.match(line):
+            paragraph.append(line.rstrip())
+            continue
+        if paragraph:
+            yield tuple(title for _, title in path), "\n".join(paragraph), False
+            paragraph = []
+        if heading is not None:
+            level = len(heading.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, heading.group(2)))
+            yield tuple(title for _, title in path), line.strip(), True
+    if paragraph:
+        yield tuple(title for _, title in path), "\n".join(paragraph), False
+
+
+def _sentences(text: str) -> List[str]:
+    out: List[str] = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        out.append(text[start:match.end()].rstrip())
+        start = match.end()
+    if start < len(text):
+        out.append(text[start:])
+    return out
+
+
+def _windows(text: str, max_chars: int, overlap_chars: int, reserve: int = 0) -> Iterator[str]:
+    """Fixed-width windows, for runs of text with no line or sentence break.
+
+    The first window is `reserve` characters shorter, to leave room for the
+    heading lines that open it.
+    """
+    start, width = 0, max_chars - reserve
+    while start < len(text):
+        end = min(start + width, len(text))
+        window = text[start:end].strip()
+        if window:
+            yield window
+        if end >= len(text):
+            return
+        start, width = end - overlap_chars, max_chars
+
+
+def _split(
+    text: str, max_chars: int, overlap_chars: int, sep: str, reserve: int = 0
+) -> Iterator[Tuple[str | None, str]]:
+    """Cut an oversized block at lines, then sentences, then fixed windows (sep None).
+
+    The first piece is at most `max_chars - reserve` long, the others at most `max_chars`.
+    """
+    if len(text) + reserve <= max_chars:
+        yield sep, text
+        return
+    parts, joiner = text.split("\n"), "\n"
+    if len(parts) == 1:
+        parts, joiner = _sentences(text), " "
+    if len(parts) == 1:
+        for window in _windows(text, max_chars, overlap_chars, reserve):
+            yield None, window
+        return
+    for i, part in enumerate(parts):
+        yield from _split(part, max_chars, overlap_chars, sep if i == 0 else joiner, reserve if i == 0 else 0)
+
+
+def _join(pieces: List[_Piece]) -> str:
+    return pieces[0][1] + "".join(sep + text for sep, text, _, _ in pieces[1:])
+
+
+def _heading_start(pieces: List[_Piece]) -> int:
+    """Index where the trailing run of heading lines begins (len(pieces) if none)."""
+    cut = len(pieces)
+    while cut > 0 and pieces[cut - 1][3]:
+        cut -= 1
+    return cut
+
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = _CHUNK_TOKENS,
+    overlap_tokens: int = _CHUNK_OVERLAP_TOKENS,
+    chars_per_token: float | None = None,
+) -> List[TextChunk]:
+    """Split markdown into chunks of at most `max_tokens`, following its structure.
+
+    Paragraphs are packed whole; a heading closes a chunk that is already
+    half full and always stays with the text under it; oversized paragraphs
+    are cut at lines, then sentences, and only text with neither is cut at
+    a fixed width. Consecutive chunks of one section share up to
+    `overlap_tokens` of whole trailing sentences (fixed windows overlap by
+    characters instead). No chunk is longer than `max_tokens`. One pass over
+    the text.
+    """
+    chars_per_token = chars_per_token or default_chars_per_token()
+    max_chars = max(1, int(max_tokens * chars_per_token))
+    overlap_chars = int(overlap_tokens * chars_per_token)
+    if overlap_chars >= max_chars:
+        raise ValueError("overlap must be smaller than chunk_size")
+    if not text:
+        return []
+
+    chunks: List[TextChunk] = []
+    pieces: List[_Piece] = []
+    size = 0
+    body = 0  # pieces that are not heading lines
+
+    def flush(carry: bool, overlap: bool = True) -> None:
+        nonlocal pieces, size, body
+        # Headings belong with the text under them, not at the end of a chunk.
+        cut = _heading_start(pieces) if carry else len(pieces)
+        headings = pieces[cut:]
+        if cut:
+            chunks.append(TextChunk(_join(pieces[:cut]).strip(), pieces[0][2]))
+        tail: List[_Piece] = []
+        if carry and overlap and not headings:
+            budget = overlap_chars
+            for piece in reversed(pieces):
+                if piece[3] or len(piece[1]) + len(piece[0]) > budget:
+                    break
+                budget -= len(piece[1]) + len(piece[0])
+                tail.insert(0, piece)
+        pieces = tail + headings
+        size = len(_join(pieces)) if pieces else 0
+        body = len(tail)
+
+    for path, block, is_heading in _blocks(text):
+        if is_heading and size >= max_chars * _MIN_FILL:
+            flush(carry=False)
+        # Pending heading lines open the next chunk: the first piece leaves room for them.
+        cut = _heading_start(pieces)
+        reserve = len(_join(pieces[cut:])) + 2 if cut < len(pieces) else 0
+        if reserve > max_chars // 2 or reserve >= max_chars - overlap_chars:
+            reserve = 0  # Too long to share a chunk: the headings get their own.
+        for sep, piece in _split(block, max_chars, overlap_chars, "\n\n", reserve):
+            if sep is None:
+                # The previous chunk is not repeated: windows overlap among themselves.
+                flush(carry=True, overlap=False)
+                if pieces and len(_join(pieces)) + 2 + len(piece) <= max_chars:
+                    piece = _join(pieces) + "\n\n" + piece
+                elif pieces:
+                    flush(carry=False)
+                pieces, size, body = [], 0, 0
+                chunks.append(TextChunk(piece, path))
+                continue
+            if pieces and size + len(sep) + len(piece) > max_chars:
+                if body:
+                    flush(carry=True)
+                if body and size + len(sep) + len(piece) > max_chars:
+                    pieces = [item for item in pieces if item[3]]
+                    size, body = (len(_join(pieces)) if pieces else 0), 0
+                # Only heading lines left and still too long to share a chunk.
+                if pieces and size + len(sep) + len(piece) > max_chars:
+                    flush(carry=False)
+            size += len(piece) + (len(sep) if pieces else 0)
+            pieces.append((sep, piece, path, is_heading))
+            body += not is_heading
+    flush(carry=False)
+    return [chunk for chunk in chunks if chunk.text]
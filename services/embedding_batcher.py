@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EmbedFn = Callable[[List[str]], Awaitable[np.ndarray]]
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent query embeddings into a single `embeddings.create` call.
+
+    Requests that arrive within `max_wait_ms` of the first pending one (or
+    until `max_batch_size` items are queued) are sent together as
+    `input=[...]`, and each caller gets back its own row.
+    """
+
+    def __init__(self, embed_fn: EmbedFn, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> None:
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.errors = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures and timers belong to one loop; start clean on a new one.
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        sent_at = time.perf_counter()
+        unique: Dict[str, int] = {}
+        for text, _, _ in batch:
+            unique.setdefault(text, len(unique))
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        for _, _, queued_at in batch:
+            wait = sent_at - queued_at
+            self.total_wait += wait
+            self.max_wait_seen = max(self.max_wait_seen, wait)
+        try:
+            vectors = await self.embed_fn(list(unique))
+        except Exception as exc:
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(np.asarray(vectors[unique[text]], dtype=np.float32))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "largest_batch": self.max_batch_seen,
+            "avg_queue_wait_ms": round(self.total_wait * 1000 / self.items, 3) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_seen * 1000, 3),
+            "errors": self.errors,
+        }
@@ -0,0 +1,182 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Shared content-addressed store of chunk embeddings inside the cache dir.
+EMBEDDING_STORE_FILE = "embeddings_store.sqlite"
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used for cache keys: NFC, collapsed whitespace, casefolded."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split()).casefold()
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of `text` embedded with `model` (the raw text is never stored)."""
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\n")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class SqliteVectorStore:
+    """Small content-addressed vector store on top of SQLite.
+
+    Rows are `key -> float32 vector` plus the time they were written, so the
+    same file can back a TTL cache or a permanent embedding store.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, "
+            "vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[np.ndarray]:
+        return self.get_many([key], max_age=max_age).get(key)
+
+    def get_many(self, keys: Iterable[str], max_age: Optional[float] = None) -> Dict[str, np.ndarray]:
+        keys = list(keys)
+        found: Dict[str, np.ndarray] = {}
+        min_created = time.time() - max_age if max_age is not None else None
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT key, vector, created_at FROM vectors WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob, created_at in rows:
+                    if min_created is not None and created_at < min_created:
+                        continue
+                    found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+        return found
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        self.put_many([(key, vector)])
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            vec = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+            rows.append((key, int(vec.shape[0]), vec.tobytes(), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, dim, vector, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM vectors")]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU + TTL cache of query embeddings keyed by (model, normalized query).
+
+    An optional SQLite tier (`disk_path`) keeps entries across restarts. Only
+    the sha256 of the query is stored, never the user's text.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl_seconds: float = 3600.0,
+        disk_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._disk = SqliteVectorStore(disk_path) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, model: str, query: str) -> str:
+        return embedding_key(model, normalize_query(query))
+
+    def get(self, model: str, query: str) -> Optional[np.ndarray]:
+        key = self._key(model, query)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+        if self._disk is not None:
+            vector = self._disk.get(key, max_age=self.ttl_seconds)
+            if vector is not None:
+                with self._lock:
+                    self._insert(key, vector, now)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, query: str, vector: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        key = self._key(model, query)
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._insert(key, vector, self._clock())
+        if self._disk is not None:
+            self._disk.put(key, vector)
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _insert(self, key: str, vector: np.ndarray, created_at: float) -> None:
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk": self._disk is not None,
+            }
@@ -0,0 +1,39 @@
+from typing import Any, Dict
+
+import numpy as np
+
+# Models that accept the `dimensions` request parameter (Matryoshka-trained:
+# asking for fewer dimensions == truncating the full vector and re-normalizing).
+_NATIVE_DIMENSIONS_PREFIXES = ("text-embedding-3",)
+
+
+def supports_dimensions(model: str) -> bool:
+    return model.startswith(_NATIVE_DIMENSIONS_PREFIXES)
+
+
+def request_kwargs(model: str, dimensions: int | None) -> Dict[str, Any]:
+    """Extra `embeddings.create` arguments for a shortened embedding, if the model takes them."""
+    if dimensions and supports_dimensions(model):
+        return {"dimensions": dimensions}
+    return {}
+
+
+def fit_dimensions(vectors: np.ndarray, dimensions: int | None) -> np.ndarray:
+    """Keep the first `dimensions` components and re-normalize to unit length.
+
+    No-op when unset or when the provider already returned that size.
+    """
+    if not dimensions or vectors.size == 0 or vectors.shape[1] == dimensions:
+        return vectors
+    if vectors.shape[1] < dimensions:
+        raise ValueError(f"embeddings have {vectors.shape[1]} dimensions, EMBEDDING_DIMENSIONS={dimensions}")
+    out = np.array(vectors[:, :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def embedding_space(model: str, dimensions: int | None, provider: str = "openai") -> str:
+    """Identifier of the vector space, used in cache keys: vectors of different sizes or providers never mix."""
+    space = f"{model}@{dimensions}" if dimensions else model
+    return space if provider == "openai" else f"{provider}:{space}"
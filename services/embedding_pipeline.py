@@ -0,0 +1,133 @@
+import logging
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from services.token_estimate import estimate_tokens
+
+logger = logging.getLogger("rag")
+
+_BUILD_CONCURRENCY = int(os.getenv("RAG_EMBED_BUILD_CONCURRENCY", "4"))
+_BATCH_MAX_TOKENS = int(os.getenv("RAG_EMBED_BATCH_TOKENS", "50000"))
+_BATCH_MAX_ITEMS = int(os.getenv("RAG_EMBED_BATCH_ITEMS", "256"))
+_MAX_RETRIES = int(os.getenv("RAG_EMBED_MAX_RETRIES", "6"))
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+
+def plan_batches(
+    texts: Sequence[str],
+    max_tokens: int = _BATCH_MAX_TOKENS,
+    max_items: int = _BATCH_MAX_ITEMS,
+) -> List[List[int]]:
+    """Group text positions into batches bounded by a token budget and an item cap."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for pos, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(pos)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int) and (status in _RETRYABLE_STATUS or status >= 500):
+        return True
+    return type(exc).__name__ in _RETRYABLE_ERRORS
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(
+    fn: Callable[[], np.ndarray],
+    max_retries: int = _MAX_RETRIES,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> np.ndarray:
+    """Run `fn`, retrying rate-limit / transient errors with exponential backoff and full jitter."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt >= max_retries or not _is_retryable(exc):
+                raise
+            delay = _retry_after(exc)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            attempt += 1
+            logger.warning("[RAG] embeddings %s, retry %s/%s in %.2fs", type(exc).__name__, attempt, max_retries, delay)
+            sleep(delay)
+
+
+def embed_in_parallel(
+    embed_fn: Callable[[List[str]], np.ndarray],
+    items: Dict[str, str],
+    on_batch: Callable[[List[Tuple[str, np.ndarray]]], None],
+    max_workers: int = _BUILD_CONCURRENCY,
+    max_tokens: int = _BATCH_MAX_TOKENS,
+    max_items: int = _BATCH_MAX_ITEMS,
+    max_retries: int = _MAX_RETRIES,
+    sleep: Callable[[float], None] = time.sleep,
+) -> int:
+    """Embed `items` (key -> text) with a bounded number of batch requests in flight.
+
+    Every finished batch is handed to `on_batch` (e.g. written to the
+    embedding store) right away, so an interrupted build resumes from the
+    batches that already completed. Returns the number of texts embedded.
+    """
+    keys = list(items)
+    texts = [items[key] for key in keys]
+    batches = plan_batches(texts, max_tokens=max_tokens, max_items=max_items)
+    if not batches:
+        return 0
+
+    def run(batch: List[int]) -> List[Tuple[str, np.ndarray]]:
+        vectors = call_with_retry(lambda: embed_fn([texts[pos] for pos in batch]), max_retries=max_retries, sleep=sleep)
+        return [(keys[pos], vectors[i]) for i, pos in enumerate(batch)]
+
+    done_count = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        pending: set[Future] = {pool.submit(run, batch) for batch in batches}
+        error: BaseException | None = None
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future.cancelled():
+                    continue
+                exc = future.exception()
+                if exc is not None:
+                    if error is None:
+                        error = exc
+                        for other in pending:
+                            other.cancel()
+                    continue
+                result = future.result()
+                on_batch(result)
+                done_count += len(result)
+        if error is not None:
+            logger.warning("[RAG] embedding build stopped after %s/%s texts", done_count, len(keys))
+            raise error
+    return done_count
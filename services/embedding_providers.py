@@ -0,0 +1,101 @@
+import hashlib
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from services.lexical_index import tokenize
+
+# Buckets of the offline feature-hashing embedder.
+_HASHING_DIMENSIONS = int(os.getenv("HASHING_EMBEDDING_DIMENSIONS", "512"))
+
+# openai: OPENAI_API_KEY; lmstudio: the OpenAI-compatible server at
+# LMSTUDIO_BASE_URL; hashing: deterministic, in-process, no network.
+EMBEDDING_PROVIDERS = ("openai", "lmstudio", "hashing")
+
+
+def embedding_provider(value: str | None = None) -> str:
+    value = (value or "openai").lower()
+    if value not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"EMBEDDING_PROVIDER must be one of {EMBEDDING_PROVIDERS}, got {value!r}")
+    return value
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dimensions: int) -> Tuple[int, float]:
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimensions, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic offline embeddings: signed feature hashing of terms and term bigrams.
+
+    Terms come from the lexical tokenizer (accent folding, stopwords, light
+    stemming); counts are dampened with 1 + log(tf) and rows are unit length.
+    Quality is far below a trained model, but it needs no network and the
+    same text always maps to the same vector.
+    Exposes `embeddings.create` like the OpenAI client.
+    """
+
+    def __init__(self, dimensions: int = _HASHING_DIMENSIONS) -> None:
+        self.dimensions = dimensions
+        self.embeddings = self
+
+    @property
+    def model(self) -> str:
+        return f"feature-hashing-{self.dimensions}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = tokenize(text)
+            counts: Dict[str, int] = {}
+            for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                bucket, sign = _bucket(feature, self.dimensions)
+                out[row, bucket] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def create(self, model: str, input: List[str], **_kwargs) -> Any:
+        vectors = self.embed(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector.tolist()) for vector in vectors])
+
+
+class _AsyncEmbeddings:
+    def __init__(self, embedder: HashingEmbedder) -> None:
+        self._embedder = embedder
+
+    async def create(self, model: str, input: List[str], **kwargs) -> Any:
+        return self._embedder.create(model, input, **kwargs)
+
+
+@dataclass(frozen=True)
+class EmbeddingClients:
+    """What the RAG service embeds with: provider name, model and sync / async clients."""
+
+    provider: str
+    model: str
+    client: Any
+    async_client: Any
+
+
+def embedding_clients(llm, provider: str | None = None) -> EmbeddingClients:
+    """Clients for `provider` (default: `llm.embedding_provider`, else openai)."""
+    provider = embedding_provider(provider or getattr(llm, "embedding_provider", None))
+    if provider == "hashing":
+        embedder = HashingEmbedder()
+        return EmbeddingClients(provider, embedder.model, embedder, SimpleNamespace(embeddings=_AsyncEmbeddings(embedder)))
+    if provider == "lmstudio":
+        return EmbeddingClients(
+            provider, llm.embedding_model, llm.lmstudio_client, getattr(llm, "lmstudio_async_client", None)
+        )
+    return EmbeddingClients(
+        provider, llm.embedding_model, llm.openai_client, getattr(llm, "openai_async_client", None)
+    )
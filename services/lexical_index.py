@@ -0,0 +1,252 @@
+import json
+import math
+import os
+import re
+import shutil
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from services.rag_artifacts import load_vectors
+
+# BM25 parameters: term-frequency saturation and document-length normalization.
+_BM25_K1 = float(os.getenv("RAG_BM25_K1", "1.2"))
+_BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+# Reciprocal rank fusion constant: larger values flatten the rank weights.
+_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Postings buffered by the writer before a run is spilled to disk (~10 bytes each).
+_RUN_POSTINGS = int(os.getenv("RAG_LEXICAL_RUN_POSTINGS", "500000"))
+
+# Inverted index next to the chunk store: postings of term t are
+# doc ids / term frequencies in [offsets[t], offsets[t + 1]).
+TERMS_FILE = "lexical.terms.json"
+OFFSETS_FILE = "lexical.offsets.npy"
+POSTINGS_FILE = "lexical.postings.npy"
+TF_FILE = "lexical.tf.npy"
+DOC_LEN_FILE = "lexical.doc_len.npy"
+LEXICAL_FILES = (TERMS_FILE, OFFSETS_FILE, POSTINGS_FILE, TF_FILE, DOC_LEN_FILE)
+# Spilled (term id, doc, tf) runs while building; removed by `close`.
+_RUNS_DIR = "lexical.runs"
+
+_TOKEN = re.compile(r"\w+")
+_VOWELS = frozenset("aeiou")
+_TF_MAX = np.iinfo(np.uint16).max
+
+
+def _fold_table() -> Dict[int, str]:
+    """Latin letters with diacritics -> base letter (á -> a, ñ -> n, ü -> u)."""
+    table: Dict[int, str] = {}
+    for code in range(0xC0, 0x250):
+        base = unicodedata.normalize("NFKD", chr(code))[:1]
+        if base.isascii() and base != chr(code):
+            table[code] = base
+    return table
+
+
+_FOLD = _fold_table()
+
+# Folded Spanish function words: frequent everywhere, useless for ranking.
+STOPWORDS = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando de del desde
+    donde durante e el ella ellas ello ellos en entre era eran es esa esas ese eso esos esta estaba estan estar
+    estas este esto estos estoy fue fueron ha hay han hasta he la las le les lo los mas me mi mis mucho muy nada
+    ni no nos nosotros o os otra otras otro otros para pero poco por porque que quien quienes se sea ser si sin
+    sobre son soy su sus tambien te tengo ti tiene todo todos tu tus un una uno unos y ya yo
+    """.split()
+)
+
+
+def fold(text: str) -> str:
+    return text.casefold().translate(_FOLD)
+
+
+def _stem(word: str) -> str:
+    """Light Spanish stemmer: drop the plural, then the final gender vowel."""
+    if len(word) > 4 and word.endswith("es") and word[-3] not in _VOWELS:
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in "aoe":
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of `text`: casefolded, accent-folded, stopwords removed, lightly stemmed."""
+    return [_stem(word) for word in _TOKEN.findall(fold(text)) if word not in STOPWORDS]
+
+
+class LexicalIndexWriter:
+    """Append chunk texts in row order; `close` writes the inverted index.
+
+    Postings are buffered as flat (term id, doc, tf) arrays and spilled to
+    disk every `run_postings` entries; `close` merges the runs straight into
+    the mmapped posting files. Build memory is the vocabulary, one run and
+    one int per chunk, not the corpus.
+    """
+
+    def __init__(self, root: Path, run_postings: int = _RUN_POSTINGS) -> None:
+        self.root = Path(root)
+        self.run_postings = max(1, run_postings)
+        self._term_ids: Dict[str, int] = {}
+        self._df = array("q")
+        self._run_terms, self._run_docs, self._run_tfs = array("i"), array("i"), array("H")
+        self._runs: List[Path] = []
+        self._doc_len = array("i")
+
+    def append(self, text: str) -> None:
+        doc = len(self._doc_len)
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            term_id = self._term_ids.setdefault(term, len(self._term_ids))
+            if term_id == len(self._df):
+                self._df.append(0)
+            self._df[term_id] += 1
+            self._run_terms.append(term_id)
+            self._run_docs.append(doc)
+            self._run_tfs.append(min(tf, _TF_MAX))
+        self._doc_len.append(sum(counts.values()))
+        if len(self._run_docs) >= self.run_postings:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self._run_docs:
+            return
+        run = self.root / _RUNS_DIR / f"{len(self._runs)}.npz"
+        run.parent.mkdir(exist_ok=True)
+        np.savez(
+            run,
+            terms=np.frombuffer(self._run_terms, dtype=np.int32),
+            docs=np.frombuffer(self._run_docs, dtype=np.int32),
+            tfs=np.frombuffer(self._run_tfs, dtype=np.uint16),
+        )
+        self._runs.append(run)
+        self._run_terms, self._run_docs, self._run_tfs = array("i"), array("i"), array("H")
+
+    def close(self) -> Dict[str, Any]:
+        """Merge the runs into the index files; returns the manifest entry."""
+        self._spill()
+        terms = sorted(self._term_ids)
+        # rank[term id] = position of the term in the sorted vocabulary.
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[np.fromiter((self._term_ids[term] for term in terms), dtype=np.int64, count=len(terms))] = np.arange(len(terms))
+        lengths = np.zeros(len(terms), dtype=np.int64)
+        lengths[rank] = np.frombuffer(self._df, dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        postings = np.lib.format.open_memmap(str(self.root / POSTINGS_FILE), mode="w+", dtype=np.int32, shape=(int(offsets[-1]),))
+        tfs = np.lib.format.open_memmap(str(self.root / TF_FILE), mode="w+", dtype=np.uint16, shape=(int(offsets[-1]),))
+        cursor = offsets[:-1].copy()
+        # Runs hold increasing doc ids, so appending them in order keeps every posting list sorted.
+        for run in self._runs:
+            with np.load(run) as data:
+                ranks = rank[data["terms"]]
+                order = np.argsort(ranks, kind="stable")
+                ranks = ranks[order]
+                within = np.arange(ranks.size) - np.searchsorted(ranks, ranks, side="left")
+                positions = cursor[ranks] + within
+                postings[positions] = data["docs"][order]
+                tfs[positions] = data["tfs"][order]
+                unique, counts = np.unique(ranks, return_counts=True)
+                cursor[unique] += counts
+        postings.flush()
+        tfs.flush()
+        del postings, tfs
+        shutil.rmtree(self.root / _RUNS_DIR, ignore_errors=True)
+        np.save(str(self.root / OFFSETS_FILE), offsets)
+        np.save(str(self.root / DOC_LEN_FILE), np.frombuffer(self._doc_len, dtype=np.int32))
+        (self.root / TERMS_FILE).write_text(json.dumps(terms, ensure_ascii=False), encoding="utf-8")
+        return {"terms": len(terms), "postings": int(offsets[-1]), "files": list(LEXICAL_FILES)}
+
+
+class BM25Index:
+    """BM25 over the mmapped inverted index; one query reads only its terms' postings."""
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = _BM25_K1,
+        b: float = _BM25_B,
+    ) -> None:
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(np.mean(doc_len)) if doc_len.size else 0.0
+
+    @classmethod
+    def open(cls, root: Path) -> "BM25Index":
+        root = Path(root)
+        terms = json.loads((root / TERMS_FILE).read_text(encoding="utf-8"))
+        return cls(
+            terms,
+            np.load(str(root / OFFSETS_FILE)),
+            load_vectors(root / POSTINGS_FILE),
+            load_vectors(root / TF_FILE),
+            load_vectors(root / DOC_LEN_FILE),
+        )
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk row for `query` (0 where no term matches)."""
+        n = self.ntotal
+        out = np.zeros(n, dtype=np.float32)
+        if n == 0 or self.avg_len == 0:
+            return out
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.postings[start:end])
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = math.log(1.0 + (n - docs.size + 0.5) / (docs.size + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * np.asarray(self.doc_len[docs], dtype=np.float32) / self.avg_len)
+            # Doc ids are unique within one posting list, so fancy += is safe.
+            out[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return out
+
+    def search(self, query: str, k: int, rows: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, row ids) by BM25, restricted to `rows` if given; rows without a matching term are left out."""
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores > 0) if rows is None else rows[scores[rows] > 0]
+        if k <= 0 or candidates.size == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Ties keep row order, like the vector search.
+        order = np.lexsort((candidates, -scores[candidates]))
+        candidates = candidates[order].astype(np.int64)
+        return scores[candidates], candidates
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Dict[str, Any]]], top_k: int, k: int = _RRF_K) -> List[Dict[str, Any]]:
+    """Fuse ranked chunk lists (matched on `row`) by reciprocal rank.
+
+    The fused `score` is scaled to [0, 1]: 1 means first in every ranking.
+    """
+    rankings = [list(ranking) for ranking in rankings]
+    fused: Dict[int, float] = {}
+    best: Dict[int, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            fused[chunk["row"]] = fused.get(chunk["row"], 0.0) + 1.0 / (k + rank)
+            best.setdefault(chunk["row"], chunk)
+    scale = len(rankings) / (k + 1) if rankings else 1.0
+    order = sorted(fused, key=lambda row: (-fused[row], row))[:top_k]
+    return [{**best[row], "score": fused[row] / scale} for row in order]
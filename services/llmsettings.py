@@ -3,7 +3,7 @@ from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 try:
     from anthropic import Anthropic
@@ -31,11 +31,20 @@ class LLMSettings:
         self.model_chat_lm = os.getenv("MODEL_LM", "openai/gpt-oss-20b")
         self.model_classifier_oa = os.getenv("OMS_CLASSIFIER_MODEL", "gpt-5-nano")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        # Shortened embeddings (e.g. 512 of text-embedding-3-small's 1536); 0 = model default.
+        self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+        # openai | lmstudio (LMSTUDIO_BASE_URL) | hashing (offline, no network).
+        self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
 
         self.openai_client: Optional[OpenAI] = None
         if self.openai_api_key:
             self.openai_client = OpenAI(api_key=self.openai_api_key)
 
+        # Async clients for the FastAPI handlers: same keys, non-blocking I/O.
+        self.openai_async_client: Optional[AsyncOpenAI] = None
+        if self.openai_api_key:
+            self.openai_async_client = AsyncOpenAI(api_key=self.openai_api_key)
+
         self.anthropic_client = None
         if self.anthropic_api_key and Anthropic is not None:
             self.anthropic_client = Anthropic(api_key=self.anthropic_api_key)
@@ -44,6 +53,10 @@ class LLMSettings:
             base_url=self.lmstudio_base_url,
             api_key="lm-studio",
         )
+        self.lmstudio_async_client = AsyncOpenAI(
+            base_url=self.lmstudio_base_url,
+            api_key="lm-studio",
+        )
 
 
 _LLM_SETTINGS: Optional[LLMSettings] = None
@@ -0,0 +1,192 @@
+"""Pre-fork launcher: load the RAG index once, then fork uvicorn workers.
+
+    python -m services.prefork --workers 4 --host 0.0.0.0 --port 8000
+
+The parent imports the heavy modules and loads (or builds) the index before
+forking, so workers share those pages copy-on-write. `main` - and with it
+every OpenAI / LM Studio HTTP client - is imported only in the children,
+after fork. The parent's own settings are only used to build the index;
+their clients and the SQLite connections are closed and dropped before
+forking. Each worker then adopts the parent's index instead of loading its
+own. Linux/macOS only (`os.fork`).
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from dataclasses import replace
+from typing import Dict, List
+
+import uvicorn
+
+from services.llmsettings import LLMSettings
+from services.service_rag_faiss import RagFaissService, RagIndex
+
+logger = logging.getLogger("prefork")
+
+# Modules `main` needs, imported in the parent so their code and objects are
+# shared. None of them creates an HTTP client at import time.
+PRELOAD_MODULES = (
+    "fastapi",
+    "fastapi.middleware.cors",
+    "fastapi.responses",
+    "pydantic",
+    "openai",
+    "google.oauth2.id_token",
+    "google.auth.transport.requests",
+    "itsdangerous",
+    "models.classifier",
+    "services.merge_setting",
+    "services.service_auth",
+    "services.service_chatbot",
+    "services.service_classifier",
+    "services.service_usage",
+)
+
+
+def preload_modules() -> None:
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as exc:
+            logger.info("[PREFORK] skip preloading %s: %s", name, exc)
+
+
+def preload_index(prebuilt: bool) -> RagIndex | None:
+    """Load the index in the parent; None if a build failed (workers then warm up on their own).
+
+    Prebuilt artifacts that fail verification raise instead: the launcher does not start.
+    """
+    llm = LLMSettings()
+    service = RagFaissService(
+        llm,
+        playbooks_dir=os.getenv("RAG_PLAYBOOKS_PATH", "playbooks"),
+        cache_dir=os.getenv("RAG_CACHE_DIR", ".rag_cache"),
+    )
+    try:
+        service.warm_up(prebuilt=prebuilt)
+    finally:
+        # SQLite connections and pooled HTTP sockets must not cross fork().
+        service.close()
+        for name in ("openai_client", "lmstudio_client"):
+            client = getattr(llm, name, None)
+            if client is not None:
+                client.close()
+    if not service.is_ready:
+        if prebuilt:
+            raise RuntimeError(f"RAG prebuilt artifacts rejected: {service.status()['error']}")
+        logger.warning("[PREFORK] index preload failed: %s", service.status()["error"])
+        return None
+    # The batcher holds `service._aembed_queries` (and so the settings above);
+    # workers bind their own cache and batcher in `adopt`.
+    return replace(service._index, query_cache=None, query_batcher=None)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, index: RagIndex | None, log_level: str) -> None:
+    import main  # after fork: fresh settings and HTTP clients in every worker
+
+    if index is not None:
+        main.rag.adopt(index)
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, index: RagIndex | None, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, index, log_level)
+        except Exception:
+            logger.exception("[PREFORK] worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.prefork", description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        help="let every worker load its own index (baseline for memory comparisons)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    index = None
+    if not args.no_preload:
+        preload_modules()
+        prebuilt = os.getenv("RAG_BUILD_ON_STARTUP", "true").lower() != "true"
+        started = time.perf_counter()
+        try:
+            index = preload_index(prebuilt)
+        except RuntimeError as exc:
+            logger.error("[PREFORK] %s", exc)
+            return 1
+        logger.info("[PREFORK] index preloaded in %.2fs", time.perf_counter() - started)
+    # Free the preload service and its settings (a reference cycle through the
+    # batcher), then keep the GC off what is left: objects created so far are
+    # never freed, and GC writes to their headers would un-share the pages after fork.
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(max(1, args.workers)):
+        children[spawn(sock, index, args.log_level)] = slot
+    logger.info("[PREFORK] %s workers on %s:%s pids=%s", len(children), args.host, args.port, sorted(children))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        logger.warning("[PREFORK] worker %s exited (status %s), restarting", pid, status)
+        children[spawn(sock, index, args.log_level)] = slot
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from services.rag_artifacts import load_vectors
+
+# Storage of the vectors that are scanned on every query:
+# float32 (exact) | float16 | int8 (symmetric, one scale per dimension).
+_VECTOR_DTYPE = os.getenv("RAG_VECTOR_DTYPE", "float32").lower()
+# Lossy indexes return `factor * k` candidates that are re-ranked with the
+# float32 rows of embeddings.npy (0 disables rescoring).
+_RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+F16_FILE = "embeddings.f16.npy"
+I8_FILE = "embeddings.i8.npy"
+I8_SCALE_FILE = "embeddings.i8scale.npy"
+
+
+def vector_dtype(value: str | None = None) -> str:
+    value = (value or _VECTOR_DTYPE).lower()
+    if value not in VECTOR_DTYPES:
+        raise ValueError(f"RAG_VECTOR_DTYPE must be one of {VECTOR_DTYPES}, got {value!r}")
+    return value
+
+
+def rescore_factor() -> int:
+    """Candidates per result re-ranked with float32 rows (RAG_RESCORE_FACTOR, 0 = off)."""
+    return _RESCORE_FACTOR
+
+
+def int8_scale(vectors: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+    """Per-dimension scale so that max |x[:, d]| maps to 127."""
+    peak = np.zeros(vectors.shape[1], dtype=np.float32)
+    for start in range(0, vectors.shape[0], block_rows):
+        np.maximum(peak, np.abs(vectors[start:start + block_rows]).max(axis=0), out=peak)
+    peak[peak == 0] = 1.0
+    return peak / 127.0
+
+
+def encode_int8(block: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(block / scale), -127, 127).astype(np.int8)
+
+
+def write_codes(root: Path, vectors: np.ndarray, dtype: str, block_rows: int = 8192) -> Dict[str, Any]:
+    """Write the compressed copy of `vectors` next to embeddings.npy; returns its manifest entry."""
+    root = Path(root)
+    if dtype == "float32" or vectors.size == 0:
+        return {"dtype": "float32", "files": []}
+    if dtype == "float16":
+        out = np.lib.format.open_memmap(str(root / F16_FILE), mode="w+", dtype=np.float16, shape=vectors.shape)
+        for start in range(0, vectors.shape[0], block_rows):
+            out[start:start + block_rows] = vectors[start:start + block_rows].astype(np.float16)
+        out.flush()
+        del out
+        return {"dtype": "float16", "files": [F16_FILE]}
+    scale = int8_scale(vectors, block_rows)
+    np.save(str(root / I8_SCALE_FILE), scale)
+    out = np.lib.format.open_memmap(str(root / I8_FILE), mode="w+", dtype=np.int8, shape=vectors.shape)
+    for start in range(0, vectors.shape[0], block_rows):
+        out[start:start + block_rows] = encode_int8(vectors[start:start + block_rows], scale)
+    out.flush()
+    del out
+    return {"dtype": "int8", "scale": "per_dimension", "files": [I8_FILE, I8_SCALE_FILE]}
+
+
+def load_codes(root: Path, entry: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray | None]:
+    """mmap the compressed vectors described by a manifest entry: (codes, scale or None)."""
+    root = Path(root)
+    if entry.get("dtype") == "float16":
+        return load_vectors(root / F16_FILE), None
+    if entry.get("dtype") == "int8":
+        return load_vectors(root / I8_FILE), np.load(str(root / I8_SCALE_FILE))
+    raise ValueError(f"no compressed vectors for dtype {entry.get('dtype')!r}")
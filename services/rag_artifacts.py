@@ -0,0 +1,315 @@
+import hashlib
+import json
+import mmap
+import os
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Chunk texts live in one utf-8 blob addressed by an offsets array; the rest
+# of the per-chunk metadata is stored as flat arrays. Everything is opened
+# with mmap, so N worker processes share the same page-cache pages.
+OFFSETS_FILE = "chunks.offsets.npy"
+BLOB_FILE = "chunks.blob"
+SOURCE_IDS_FILE = "chunks.source_ids.npy"
+ORDINALS_FILE = "chunks.ordinals.npy"
+SOURCES_FILE = "chunks.sources.json"
+# Metadata (topics, playbook, language, ...) per source, aligned with SOURCES_FILE.
+SOURCE_META_FILE = "chunks.source_meta.json"
+# Heading breadcrumb of every chunk, deduplicated like the sources.
+SECTION_IDS_FILE = "chunks.section_ids.npy"
+SECTIONS_FILE = "chunks.sections.json"
+CHUNK_FILES = (
+    OFFSETS_FILE,
+    BLOB_FILE,
+    SOURCE_IDS_FILE,
+    ORDINALS_FILE,
+    SOURCES_FILE,
+    SOURCE_META_FILE,
+    SECTION_IDS_FILE,
+    SECTIONS_FILE,
+)
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "faiss.index"
+MANIFEST_FILE = "manifest.json"
+BUILD_LOCK_FILE = ".build.lock"
+# Everything the manifest checksums; the manifest itself is written last.
+ARTIFACT_FILES = CHUNK_FILES + (EMBEDDINGS_FILE, INDEX_FILE)
+
+
+def source_stem(source: str) -> str:
+    """Prefix of chunk ids: the source path without its `.md` suffix."""
+    return source[:-3] if source.endswith(".md") else source
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def artifact_checksums(root: Path, names: Sequence[str] = ARTIFACT_FILES) -> Dict[str, str]:
+    return {name: file_sha256(Path(root) / name) for name in names}
+
+
+def verify_checksums(root: Path, checksums: Dict[str, str], names: Sequence[str] = ARTIFACT_FILES) -> None:
+    """Raise `RuntimeError` unless every artifact exists and matches its recorded sha256."""
+    root = Path(root)
+    for name in names:
+        expected = checksums.get(name)
+        if not expected:
+            raise RuntimeError(f"RAG artifact {name} has no checksum in the manifest")
+        path = root / name
+        if not path.exists():
+            raise RuntimeError(f"RAG artifact missing: {path}")
+        if file_sha256(path) != expected:
+            raise RuntimeError(f"RAG artifact checksum mismatch: {path}")
+
+
+@contextmanager
+def build_lock(path: Path, timeout: float = 1800.0, poll_interval: float = 0.2) -> Iterator[None]:
+    """Exclusive cross-process lock (`flock`) around an index build.
+
+    Raises `TimeoutError` if another process holds it for longer than
+    `timeout`. Without `fcntl` (Windows) it is a no-op.
+    """
+    if fcntl is None:  # pragma: no cover - Windows
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"timed out waiting for RAG build lock {path}")
+                time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ChunkStoreWriter:
+    """Append chunks one by one; texts go straight to disk."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._blob = open(self.root / BLOB_FILE, "wb")
+        self._offsets = array("q", [0])
+        self._source_ids = array("i")
+        self._ordinals = array("i")
+        self._sources: List[str] = []
+        self._source_meta: List[Dict[str, Any]] = []
+        self._source_index: Dict[str, int] = {}
+        self._section_ids = array("i")
+        self._sections: List[str] = []
+        self._section_index: Dict[str, int] = {}
+
+    def append(self, source: str, ordinal: int, text: str, meta: Dict[str, Any] | None = None, section: str = "") -> None:
+        """Add one chunk; `meta` is recorded for its source the first time the source appears."""
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        source_id = self._source_index.get(source)
+        if source_id is None:
+            source_id = len(self._sources)
+            self._source_index[source] = source_id
+            self._sources.append(source)
+            self._source_meta.append(meta or {})
+        self._source_ids.append(source_id)
+        self._ordinals.append(ordinal)
+        section_id = self._section_index.setdefault(section, len(self._sections))
+        if section_id == len(self._sections):
+            self._sections.append(section)
+        self._section_ids.append(section_id)
+
+    def __len__(self) -> int:
+        return len(self._source_ids)
+
+    def close(self) -> None:
+        self._blob.close()
+        np.save(str(self.root / OFFSETS_FILE), np.frombuffer(self._offsets, dtype=np.int64))
+        np.save(str(self.root / SOURCE_IDS_FILE), np.frombuffer(self._source_ids, dtype=np.int32))
+        np.save(str(self.root / ORDINALS_FILE), np.frombuffer(self._ordinals, dtype=np.int32))
+        (self.root / SOURCES_FILE).write_text(json.dumps(self._sources, ensure_ascii=False), encoding="utf-8")
+        (self.root / SOURCE_META_FILE).write_text(json.dumps(self._source_meta, ensure_ascii=False), encoding="utf-8")
+        np.save(str(self.root / SECTION_IDS_FILE), np.frombuffer(self._section_ids, dtype=np.int32))
+        (self.root / SECTIONS_FILE).write_text(json.dumps(self._sections, ensure_ascii=False), encoding="utf-8")
+
+
+def write_chunk_store(root: Path, chunks: List[Dict[str, Any]]) -> None:
+    writer = ChunkStoreWriter(root)
+    for chunk in chunks:
+        writer.append(
+            chunk["source"],
+            int(chunk["chunk_id"].rsplit(":", 1)[1]),
+            chunk["text"],
+            chunk.get("metadata"),
+            chunk.get("section", ""),
+        )
+    writer.close()
+
+
+class ChunkStore(Sequence):
+    """Read-only, memory-mapped view of the chunks written by `ChunkStoreWriter`.
+
+    `store[i]` returns the same dict shape the index always used
+    (`source`, `chunk_id`, `text`), decoded lazily from the blob.
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        blob,
+        source_ids: np.ndarray,
+        ordinals: np.ndarray,
+        sources: List[str],
+        source_meta: List[Dict[str, Any]] | None = None,
+        section_ids: np.ndarray | None = None,
+        sections: List[str] | None = None,
+    ) -> None:
+        self.offsets = offsets
+        self.blob = blob
+        self.source_ids = source_ids
+        self.ordinals = ordinals
+        self.sources = sources
+        self.source_meta = source_meta if source_meta is not None else [{} for _ in sources]
+        self.section_ids = section_ids
+        self.sections = sections or []
+        self._source_stems = [source_stem(name) for name in sources]
+        # Context headers, built once per source instead of once per retrieved chunk.
+        self._header_prefixes = [f"[source={name} id={stem}:" for name, stem in zip(sources, self._source_stems)]
+
+    @classmethod
+    def open(cls, root: Path) -> "ChunkStore":
+        root = Path(root)
+        offsets = np.load(str(root / OFFSETS_FILE), mmap_mode="r")
+        source_ids = np.load(str(root / SOURCE_IDS_FILE), mmap_mode="r")
+        ordinals = np.load(str(root / ORDINALS_FILE), mmap_mode="r")
+        sources = json.loads((root / SOURCES_FILE).read_text(encoding="utf-8"))
+        meta_path = root / SOURCE_META_FILE
+        source_meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+        section_ids, sections = None, None
+        if (root / SECTION_IDS_FILE).exists():
+            section_ids = np.load(str(root / SECTION_IDS_FILE), mmap_mode="r")
+            sections = json.loads((root / SECTIONS_FILE).read_text(encoding="utf-8"))
+        blob_path = root / BLOB_FILE
+        if blob_path.stat().st_size == 0:
+            blob = b""
+        else:
+            with open(blob_path, "rb") as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(offsets, blob, source_ids, ordinals, sources, source_meta, section_ids, sections)
+
+    def __len__(self) -> int:
+        return int(self.source_ids.shape[0])
+
+    def text(self, idx: int) -> str:
+        start = int(self.offsets[idx])
+        end = int(self.offsets[idx + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def source(self, idx: int) -> str:
+        return self.sources[int(self.source_ids[idx])]
+
+    def metadata(self, idx: int) -> Dict[str, Any]:
+        return self.source_meta[int(self.source_ids[idx])]
+
+    def section(self, idx: int) -> str:
+        """Heading breadcrumb of a chunk (`Title > Section`), empty if it has none."""
+        if self.section_ids is None:
+            return ""
+        return self.sections[int(self.section_ids[idx])]
+
+    def header(self, idx: int) -> str:
+        """Context header of a chunk without its score: `[source=... id=stem:ordinal`."""
+        return f"{self._header_prefixes[int(self.source_ids[idx])]}{int(self.ordinals[idx])}"
+
+    def chunk_id(self, idx: int) -> str:
+        return f"{self._source_stems[int(self.source_ids[idx])]}:{int(self.ordinals[idx])}"
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        return {
+            "source": self.source(idx),
+            "chunk_id": self.chunk_id(idx),
+            "text": self.text(idx),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def load_vectors(path: Path) -> np.ndarray:
+    """Open an `.npy` matrix read-only through mmap (no private copy)."""
+    return np.load(str(path), mmap_mode="r")
+
+
+class VectorFileWriter:
+    """Append float32 row blocks to disk and publish them as one `.npy` file.
+
+    Rows go to a raw side file while the total count is unknown; `close`
+    writes the final matrix block by block through `open_memmap`.
+    """
+
+    def __init__(self, path: Path, block_rows: int = 8192) -> None:
+        self.path = Path(path)
+        self.block_rows = block_rows
+        self._raw_path = self.path.with_name(self.path.name + ".part")
+        self._raw = open(self._raw_path, "wb")
+        self.rows = 0
+        self.dim = 0
+
+    def append(self, block: np.ndarray) -> None:
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        if block.size == 0:
+            return
+        if self.dim and block.shape[1] != self.dim:
+            raise ValueError(f"embedding dim changed from {self.dim} to {block.shape[1]}")
+        self.dim = int(block.shape[1])
+        self._raw.write(block.tobytes())
+        self.rows += int(block.shape[0])
+
+    def close(self) -> np.ndarray:
+        self._raw.close()
+        try:
+            if self.rows == 0:
+                np.save(str(self.path), np.zeros((0, 0), dtype=np.float32))
+            else:
+                raw = np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+                out = np.lib.format.open_memmap(str(self.path), mode="w+", dtype=np.float32, shape=(self.rows, self.dim))
+                for start in range(0, self.rows, self.block_rows):
+                    out[start:start + self.block_rows] = raw[start:start + self.block_rows]
+                out.flush()
+                del out, raw
+        finally:
+            os.remove(self._raw_path)
+        return load_vectors(self.path)
+
+    def discard(self) -> None:
+        """Drop the rows appended so far without publishing a file."""
+        self._raw.close()
+        if self._raw_path.exists():
+            os.remove(self._raw_path)
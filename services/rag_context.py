@@ -0,0 +1,149 @@
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from services.token_estimate import default_chars_per_token, estimate_tokens
+
+# Upper bound of the RAG block injected into the instructions (0 = no limit).
+_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "800"))
+# Maximal marginal relevance: 1 ranks by relevance only, lower values trade
+# relevance for diversity among the retrieved chunks.
+_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "1.0"))
+# Candidates fetched per returned chunk when MMR is on.
+_MMR_CANDIDATES = 3
+# Longest repeated span looked for between neighbouring chunks (the
+# chunker overlaps them by up to RAG_CHUNK_OVERLAP_TOKENS, ~120 characters).
+_MAX_OVERLAP_CHARS = 256
+
+CONTEXT_START = "RAG_CONTEXT_START"
+CONTEXT_END = "RAG_CONTEXT_END"
+SEPARATOR = "---"
+
+
+def mmr_enabled() -> bool:
+    return _MMR_LAMBDA < 1
+
+
+def mmr_candidates() -> int:
+    """Candidates to fetch per returned chunk: more when MMR has to choose among them."""
+    return _MMR_CANDIDATES if mmr_enabled() else 1
+
+
+def overlap_length(left: str, right: str, max_chars: int = _MAX_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    for size in range(min(len(left), len(right), max_chars), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def mmr_select(chunks: Sequence[Dict[str, Any]], vectors: np.ndarray, k: int, lambda_: float = _MMR_LAMBDA) -> List[Dict[str, Any]]:
+    """Pick `k` of the ranked `chunks` by maximal marginal relevance.
+
+    Relevance is each chunk's `score`; redundancy is the inner product with
+    the chunks already picked, read from `vectors` at each chunk's `row`.
+    """
+    if lambda_ >= 1 or len(chunks) <= 1:
+        return list(chunks[:k])
+    candidates = np.asarray(vectors[[chunk["row"] for chunk in chunks]], dtype=np.float32)
+    similarity = candidates @ candidates.T
+    relevance = np.array([chunk["score"] for chunk in chunks], dtype=np.float32)
+    picked: List[int] = [0]
+    redundancy = similarity[0].copy()
+    while len(picked) < min(k, len(chunks)):
+        gain = lambda_ * relevance - (1 - lambda_) * redundancy
+        gain[picked] = -np.inf
+        best = int(np.argmax(gain))
+        picked.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return [chunks[i] for i in picked]
+
+
+def _ordinal(chunk: Dict[str, Any]) -> int:
+    if "ordinal" in chunk:
+        return int(chunk["ordinal"])
+    return int(chunk["chunk_id"].rsplit(":", 1)[1])
+
+
+def _header_prefix(chunk: Dict[str, Any]) -> str:
+    return chunk.get("header") or f"[source={chunk['source']} id={chunk['chunk_id']}"
+
+
+def _merge(chunks: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Join chunks of the same source with consecutive ordinals, dropping the overlapping text.
+
+    Blocks keep the rank of their best chunk.
+    """
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for rank, chunk in enumerate(chunks):
+        by_source.setdefault(chunk["source"], []).append({**chunk, "_rank": rank})
+    blocks: List[Dict[str, Any]] = []
+    for items in by_source.values():
+        items.sort(key=_ordinal)
+        block = None
+        for item in items:
+            if block is not None and _ordinal(item) == block["last"] + 1:
+                cut = overlap_length(block["text"], item["text"])
+                block["text"] += item["text"][cut:] if cut else "\n" + item["text"]
+                block["last"] = _ordinal(item)
+                block["score"] = max(block["score"], item["score"])
+                block["_rank"] = min(block["_rank"], item["_rank"])
+                continue
+            block = {
+                "header": _header_prefix(item),
+                "first": _ordinal(item),
+                "last": _ordinal(item),
+                "text": item["text"],
+                "score": item["score"],
+                "_rank": item["_rank"],
+            }
+            blocks.append(block)
+    blocks.sort(key=lambda block: block["_rank"])
+    return blocks
+
+
+def _render(blocks: Sequence[Dict[str, Any]]) -> str:
+    if not blocks:
+        return ""
+    lines = [CONTEXT_START]
+    for block in blocks:
+        span = f"-{block['last']}" if block["last"] != block["first"] else ""
+        lines.append(f"{block['header']}{span} score={block['score']:.4f}]")
+        lines.append(block["text"])
+        lines.append(SEPARATOR)
+    lines.append(CONTEXT_END)
+    return "\n".join(lines)
+
+
+def _truncate(chunk: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+    text = chunk["text"][:max(0, max_chars)]
+    space = text.rfind(" ")
+    if 0 < space and len(text) < len(chunk["text"]):
+        text = text[:space]
+    return {**chunk, "text": text}
+
+
+def assemble_context(
+    chunks: Sequence[Dict[str, Any]],
+    token_budget: int = _CONTEXT_TOKEN_BUDGET,
+    chars_per_token: float | None = None,
+) -> str:
+    """RAG block for ranked `chunks` that fits `token_budget`.
+
+    Neighbouring chunks of one source are merged without their repeated
+    overlap; chunks that do not fit are skipped (the best one is cut to
+    fit rather than dropped).
+    """
+    chars_per_token = chars_per_token or default_chars_per_token()
+    selected: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        candidate = _render(_merge(selected + [chunk]))
+        if token_budget <= 0 or estimate_tokens(candidate, chars_per_token) <= token_budget:
+            selected.append(chunk)
+        elif not selected:
+            spare = token_budget * chars_per_token - (len(candidate) - len(chunk["text"]))
+            truncated = _truncate(chunk, int(spare))
+            if truncated["text"]:
+                selected.append(truncated)
+    return _render(_merge(selected))
@@ -0,0 +1,112 @@
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from services.chunking import TextChunk
+
+# A document is (source, text, metadata); a chunk is (source, ordinal, text,
+# section), section being the heading breadcrumb ("" for plain-text splitters).
+# Every stage is a generator, so only one document and one window of chunks
+# are in memory at a time, whatever the size of the corpus.
+Document = Tuple[str, str, Dict[str, Any]]
+Chunk = Tuple[str, int, str, str]
+# Fields of a jsonl line that are not document metadata.
+_JSONL_RESERVED = ("text", "source", "id")
+
+
+def is_jsonl(path: Path) -> bool:
+    return path.is_file() and path.suffix == ".jsonl"
+
+
+def list_markdown_files(root: Path) -> List[Path]:
+    """Every `.md` file under `root` (recursive), in a stable order."""
+    return sorted(root.rglob("*.md"), key=lambda p: p.relative_to(root).as_posix())
+
+
+def source_name(root: Path, path: Path) -> str:
+    return path.relative_to(root).as_posix()
+
+
+def _front_matter_value(raw: str) -> Any:
+    raw = raw.strip()
+    if raw.startswith("[") and raw.endswith("]"):
+        return [item.strip().strip("\"'") for item in raw[1:-1].split(",") if item.strip()]
+    if raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    return raw.strip("\"'")
+
+
+def split_front_matter(text: str) -> Tuple[Dict[str, Any], str]:
+    """Split a leading `---` block of `key: value` lines off a markdown document.
+
+    Values may be `[a, b]` lists, `true` / `false` or plain strings (a YAML
+    subset, no dependency). Text without front matter is returned as is.
+    """
+    if not text.startswith("---\n"):
+        return {}, text
+    end = text.find("\n---\n", 3)
+    if end == -1:
+        return {}, text
+    meta: Dict[str, Any] = {}
+    for line in text[4:end].splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip():
+            meta[key.strip()] = _front_matter_value(value)
+    return meta, text[end + 5:].lstrip("\n")
+
+
+def iter_markdown_documents(root: Path) -> Iterator[Document]:
+    for path in list_markdown_files(root):
+        meta, text = split_front_matter(path.read_text(encoding="utf-8"))
+        yield source_name(root, path), text, meta
+
+
+def iter_jsonl_documents(path: Path) -> Iterator[Document]:
+    """One JSON object per line with `text` and an `id` or `source`; other fields are metadata."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            text = obj.get("text") or ""
+            if not text:
+                continue
+            source = obj.get("source") or obj.get("id") or f"{path.name}#{lineno}"
+            yield str(source), text, {key: value for key, value in obj.items() if key not in _JSONL_RESERVED}
+
+
+def iter_documents(path: str) -> Iterator[Document]:
+    """Documents from a directory tree of markdown files or from a `.jsonl` file."""
+    root = Path(path)
+    if is_jsonl(root):
+        return iter_jsonl_documents(root)
+    if not root.exists() or not root.is_dir():
+        raise FileNotFoundError(f"playbooks_dir not found: {path}")
+    return iter_markdown_documents(root)
+
+
+def iter_chunks(
+    documents: Iterable[Document],
+    chunk_fn: Callable[[str], List[str] | List[TextChunk]],
+    on_document: Callable[[str, Dict[str, Any]], None] | None = None,
+) -> Iterator[Chunk]:
+    """Chunk every document; `on_document(source, metadata)` runs before its chunks are yielded."""
+    for source, text, meta in documents:
+        if on_document is not None:
+            on_document(source, meta)
+        for ordinal, chunk in enumerate(chunk_fn(text)):
+            if isinstance(chunk, TextChunk):
+                yield source, ordinal, chunk.text, chunk.breadcrumb
+            else:
+                yield source, ordinal, chunk, ""
+
+
+def windows(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        window = list(islice(iterator, size))
+        if not window:
+            return
+        yield window
@@ -0,0 +1,128 @@
+import os
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.rag_artifacts import source_stem
+
+# Language of documents that do not declare one.
+_DEFAULT_LANGUAGE = os.getenv("RAG_DEFAULT_LANGUAGE", "es").lower()
+# Share of the classifier topics a playbook must cover before its precomputed
+# context is served instead of a vector search.
+_PRECOMPUTED_MIN_CONFIDENCE = float(os.getenv("RAG_PRECOMPUTED_MIN_CONFIDENCE", "1.0"))
+
+FILTER_KEYS = ("topics", "playbook", "language", "night_mode")
+# Catch-all classifier topic: it says nothing about the playbook.
+GENERIC_TOPICS = frozenset({"otro"})
+
+
+def precomputed_min_confidence() -> float:
+    """RAG_PRECOMPUTED_MIN_CONFIDENCE: topic coverage needed to skip the vector search."""
+    return _PRECOMPUTED_MIN_CONFIDENCE
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def chunk_metadata(source: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized metadata of a document, shared by all of its chunks.
+
+    `raw` is the markdown front matter or the extra fields of a jsonl line.
+    """
+    playbook = raw.get("playbook") or raw.get("id") or PurePosixPath(source_stem(source)).name
+    return {
+        "playbook": str(playbook),
+        "topics": sorted({topic.casefold() for topic in _as_list(raw.get("topics"))}),
+        "language": str(raw.get("language") or _DEFAULT_LANGUAGE).lower(),
+        "night_mode": _as_bool(raw.get("night_mode", False)),
+    }
+
+
+def _filter_values(key: str, value: Any) -> List[Any]:
+    if key == "night_mode":
+        return [_as_bool(value)]
+    values = _as_list(value)
+    return [item.casefold() for item in values] if key in ("topics", "language") else values
+
+
+class MetadataIndex:
+    """Chunk row ids per metadata value, derived once per loaded index.
+
+    Metadata is stored per source; `source_ids` maps every chunk row to its
+    source, so a filter resolves to the sorted rows of the matching sources.
+    """
+
+    def __init__(self, source_ids: np.ndarray, source_meta: Sequence[Dict[str, Any]]) -> None:
+        self.source_meta = list(source_meta)
+        source_ids = np.asarray(source_ids, dtype=np.int64)
+        order = np.argsort(source_ids, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(source_ids, minlength=len(self.source_meta)))])
+        # Stable sort: each source's rows stay in ordinal order.
+        self.source_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.source_meta))]
+        self._sources_by: Dict[Tuple[str, Any], List[int]] = {}
+        for source_id, meta in enumerate(self.source_meta):
+            for key in FILTER_KEYS:
+                values = meta.get("topics", []) if key == "topics" else [meta.get(key)]
+                for value in values:
+                    self._sources_by.setdefault((key, value), []).append(source_id)
+
+    @property
+    def topics(self) -> Set[str]:
+        return {value for key, value in self._sources_by if key == "topics"}
+
+    def _rows(self, source_ids: Iterable[int]) -> np.ndarray:
+        parts = [self.source_rows[source_id] for source_id in sorted(set(source_ids))]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Rows matching every filter key (any of the values given for a key)."""
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"unknown RAG filters {sorted(unknown)}, expected {FILTER_KEYS}")
+        rows: np.ndarray | None = None
+        for key, value in filters.items():
+            if value is None:
+                continue
+            sources = [sid for item in _filter_values(key, value) for sid in self._sources_by.get((key, item), [])]
+            matched = self._rows(sources)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        if rows is None:
+            return np.arange(sum(len(r) for r in self.source_rows), dtype=np.int64)
+        return rows
+
+    def route(self, topics: Iterable[str], night_mode: bool = False) -> Tuple[int | None, float]:
+        """The one source the classifier topics point to, and the share of topics it covers.
+
+        Ties on coverage are broken by night-mode suitability; a remaining tie
+        means the topics are ambiguous and (None, 0.0) is returned.
+        """
+        wanted = {topic.casefold() for topic in topics} - GENERIC_TOPICS
+        if not wanted:
+            return None, 0.0
+        scored = sorted(
+            (
+                (len(wanted.intersection(meta.get("topics", []))) / len(wanted), meta.get("night_mode") == night_mode, sid)
+                for sid, meta in enumerate(self.source_meta)
+            ),
+            key=lambda item: (item[0], item[1]),
+            reverse=True,
+        )
+        if not scored or scored[0][0] == 0:
+            return None, 0.0
+        if len(scored) > 1 and scored[1][:2] == scored[0][:2]:
+            return None, 0.0
+        return scored[0][2], scored[0][0]
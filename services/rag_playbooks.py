@@ -1,13 +1,22 @@
 import os
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
-_EMBED_MODEL = "text-embedding-3-small"
+import numpy as np
 
+from services.chunking import chunk_markdown
+from services.embedding_cache import EMBEDDING_STORE_FILE, SqliteVectorStore, embedding_key
+from services.embedding_dimensions import embedding_space, fit_dimensions, request_kwargs
+from services.embedding_pipeline import embed_in_parallel, plan_batches
+from services.embedding_providers import embedding_clients
+from services.llmsettings import get_llmsettings
+from services.rag_ingest import split_front_matter
+
+# vectors: contiguous float32 matrix (n_chunks, dim); norms: precomputed L2 norms.
 _INDEX: Dict[str, Any] = {
     "chunks": [],
-    "vectors": [],
-    "norms": [],
+    "vectors": np.zeros((0, 0), dtype=np.float32),
+    "norms": np.zeros((0,), dtype=np.float32),
     "ready": False,
 }
 
@@ -19,7 +28,7 @@ def load_playbooks(playbooks_dir: str = "playbooks") -> List[Dict[str, str]]:
 
     items: List[Dict[str, str]] = []
     for path in sorted(root.glob("*.md")):
-        text = path.read_text(encoding="utf-8")
+        _, text = split_front_matter(path.read_text(encoding="utf-8"))
         items.append({
             "id": path.stem,
             "source": path.name,
@@ -29,78 +38,116 @@ def load_playbooks(playbooks_dir: str = "playbooks") -> List[Dict[str, str]]:
 
 
 def chunk_text(text: str, chunk_size: int = 600, overlap: int = 100) -> List[str]:
-    if not text:
-        return []
-    if overlap >= chunk_size:
-        raise ValueError("overlap must be smaller than chunk_size")
-
-    chunks: List[str] = []
-    start = 0
-    length = len(text)
-    while start < length:
-        end = min(start + chunk_size, length)
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        if end >= length:
-            break
-        start = end - overlap
-    return chunks
+    """Structure-aware chunks (see `services.chunking`), sizes in characters."""
+    return [chunk.text for chunk in chunk_markdown(text, chunk_size, overlap, chars_per_token=1)]
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
     if not texts:
         return []
 
-    from openai import OpenAI
-    client = OpenAI()
+    llm = get_llmsettings()
+    embedder = embedding_clients(llm)
+    client = embedder.client
+    if client is None:
+        raise RuntimeError(f"no {embedder.provider} client for RAG embeddings")
+    dimensions = getattr(llm, "embedding_dimensions", None)
     vectors: List[List[float]] = []
-    batch_size = 100
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
+    # One request per `embed_in_parallel` batch (same token / item budget).
+    for batch in plan_batches(texts):
         resp = client.embeddings.create(
-            model=_EMBED_MODEL,
-            input=batch
+            model=embedder.model,
+            input=[texts[pos] for pos in batch],
+            **request_kwargs(embedder.model, dimensions),
         )
         for item in resp.data:
             vectors.append(item.embedding)
+    if dimensions:
+        return fit_dimensions(np.array(vectors, dtype=np.float32), dimensions).tolist()
     return vectors
 
 
-def _vector_norm(vec: List[float]) -> float:
-    return sum(x * x for x in vec) ** 0.5
-
-
-def _cosine_similarity(a: List[float], b: List[float], norm_a: float, norm_b: float) -> float:
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    dot = 0.0
-    for x, y in zip(a, b):
-        dot += x * y
-    return dot / (norm_a * norm_b)
-
-
-def init_rag_index(playbooks_dir: str = "playbooks", chunk_size: int = 600, overlap: int = 100) -> None:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY missing for RAG embeddings")
+def _embed_chunks(texts: List[str], cache_dir: str) -> np.ndarray:
+    """Embed playbook chunks through the content-addressed disk cache.
 
+    Only chunks whose (model, text) hash is not cached reach the API, so a
+    warm restart makes no embedding calls.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    llm = get_llmsettings()
+    embedder = embedding_clients(llm)
+    model = embedding_space(embedder.model, getattr(llm, "embedding_dimensions", None), embedder.provider)
+    store = SqliteVectorStore(str(Path(cache_dir) / EMBEDDING_STORE_FILE))
+    try:
+        keys = [embedding_key(model, text) for text in texts]
+        cached = store.get_many(set(keys))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+
+            def persist(batch: List[Tuple[str, np.ndarray]]) -> None:
+                store.put_many(batch)
+                cached.update(batch)
+
+            embed_in_parallel(lambda batch: _as_matrix(embed_texts(batch)), missing, on_batch=persist)
+        return _as_matrix([cached[key] for key in keys])
+    finally:
+        store.close()
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    return matrix
+
+
+def _cosine_scores(matrix: np.ndarray, norms: np.ndarray, query_vec: np.ndarray) -> np.ndarray:
+    query_norm = float(np.linalg.norm(query_vec))
+    denom = norms * query_norm
+    dots = matrix @ query_vec
+    scores = np.zeros_like(dots)
+    np.divide(dots, denom, out=scores, where=denom != 0)
+    return scores
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first (ties keep chunk order)."""
+    k = min(k, scores.shape[0])
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def init_rag_index(
+    playbooks_dir: str = "playbooks",
+    chunk_size: int = 600,
+    overlap: int = 100,
+    cache_dir: str = ".rag_cache",
+) -> None:
     playbooks = load_playbooks(playbooks_dir=playbooks_dir)
 
     chunks: List[Dict[str, Any]] = []
     texts: List[str] = []
     for pb in playbooks:
-        pb_chunks = chunk_text(pb["text"], chunk_size=chunk_size, overlap=overlap)
+        pb_chunks = chunk_markdown(pb["text"], chunk_size, overlap, chars_per_token=1)
         for idx, chunk in enumerate(pb_chunks):
             chunks.append({
                 "source": pb["source"],
                 "chunk_id": f"{pb['id']}:{idx}",
-                "text": chunk,
+                "text": chunk.text,
+                "section": chunk.breadcrumb,
             })
-            texts.append(chunk)
+            texts.append(chunk.text)
 
-    vectors = embed_texts(texts)
-    norms = [_vector_norm(vec) for vec in vectors]
+    vectors = _embed_chunks(texts, cache_dir)
+    norms = np.linalg.norm(vectors, axis=1) if vectors.size else np.zeros((0,), dtype=np.float32)
 
     _INDEX["chunks"] = chunks
     _INDEX["vectors"] = vectors
@@ -114,22 +161,24 @@ def retrieve_playbook_chunks(query: str, top_k: int = 3) -> List[Dict[str, Any]]
     if not query:
         return []
 
-    query_vec = embed_texts([query])[0]
-    query_norm = _vector_norm(query_vec)
-
-    scored: List[Dict[str, Any]] = []
-    for chunk, vec, norm in zip(_INDEX["chunks"], _INDEX["vectors"], _INDEX["norms"]):
-        score = _cosine_similarity(query_vec, vec, query_norm, norm)
-        scored.append({
+    matrix = _as_matrix(_INDEX["vectors"])
+    if matrix.size == 0:
+        return []
+    norms = np.asarray(_INDEX["norms"], dtype=np.float32)
+    query_vec = np.asarray(embed_texts([query])[0], dtype=np.float32)
+
+    scores = _cosine_scores(matrix, norms, query_vec)
+    chunks = _INDEX["chunks"]
+    top: List[Dict[str, Any]] = []
+    for idx in _top_k_indices(scores, max(1, top_k)):
+        chunk = chunks[idx]
+        top.append({
             "source": chunk["source"],
             "chunk_id": chunk["chunk_id"],
             "text": chunk["text"],
-            "score": score,
+            "score": float(scores[idx]),
         })
 
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    top = scored[:max(1, top_k)]
-
     if os.getenv("RAG_DEBUG", "false").lower() == "true":
         debug_items = ", ".join([f"{c['source']}:{c['score']:.4f}" for c in top])
         print(f"[RAG_DEBUG] top_k={top_k} {debug_items}")
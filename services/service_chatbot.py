@@ -1,3 +1,6 @@
+import asyncio
+from typing import AsyncIterator
+
 from fastapi import HTTPException
 
 from services.llmsettings import LLMSettings
@@ -103,6 +106,8 @@ class ChatbotService:
         self.llm = llm
         self.client_lm = llm.lmstudio_client
         self.client_oa = llm.openai_client
+        self.aclient_lm = getattr(llm, "lmstudio_async_client", None)
+        self.aclient_oa = getattr(llm, "openai_async_client", None)
 
     def _safe_history(self, history: list[dict] | None) -> list[dict]:
         if not isinstance(history, list):
@@ -149,13 +154,13 @@ class ChatbotService:
         except Exception:
             return ""
 
-    def chat(
+    def _build_request(
         self,
         message: str,
         history: list[dict],
         setting: dict,
         use_local: bool,
-    ) -> str:
+    ) -> dict:
         base_setting = setting or {}
         instructions = self.build_instructions(base_setting)
         if base_setting.get("risk") and base_setting.get("risk") != "none":
@@ -171,21 +176,34 @@ class ChatbotService:
         ]
 
         model = self.llm.model_chat_lm if use_local else self.llm.model_chat_oa
-        client = self.client_lm if use_local else self.client_oa
+        return {
+            "model": model,
+            "reasoning": {"effort": "low"},
+            "instructions": instructions,
+            "input": input_messages,
+            "store": False,
+        }
+
+    def _require_client(self, client, use_local: bool):
         if not use_local and client is None:
             raise HTTPException(
                 status_code=500,
                 detail="OPENAI_API_KEY is required when use_local is false",
             )
+        return client
+
+    def chat(
+        self,
+        message: str,
+        history: list[dict],
+        setting: dict,
+        use_local: bool,
+    ) -> str:
+        request = self._build_request(message, history, setting, use_local)
+        client = self._require_client(self.client_lm if use_local else self.client_oa, use_local)
 
         try:
-            response = client.responses.create( # type: ignore
-                model=model,
-                reasoning={"effort": "low"},
-                instructions=instructions,
-                input=input_messages, # type: ignore
-                store=False,
-            )
+            response = client.responses.create(**request) # type: ignore
         except HTTPException:
             raise
         except Exception as exc:
@@ -195,3 +213,66 @@ class ChatbotService:
             ) from exc
 
         return self._extract_response_text(response)
+
+    async def achat(
+        self,
+        message: str,
+        history: list[dict],
+        setting: dict,
+        use_local: bool,
+    ) -> str:
+        """Async version of `chat` that does not block the event loop."""
+        aclient = self.aclient_lm if use_local else self.aclient_oa
+        if aclient is None:
+            # Sin cliente async (p.ej. settings de tests): el sync va a un hilo.
+            if (self.client_lm if use_local else self.client_oa) is not None:
+                return await asyncio.to_thread(self.chat, message, history, setting, use_local)
+        request = self._build_request(message, history, setting, use_local)
+        client = self._require_client(aclient, use_local)
+
+        try:
+            response = await client.responses.create(**request) # type: ignore
+        except HTTPException:
+            raise
+        except Exception as exc:
+            raise HTTPException(
+                status_code=502,
+                detail="Error calling LLM provider",
+            ) from exc
+
+        return self._extract_response_text(response)
+
+    def _extract_stream_delta(self, event) -> str:
+        if getattr(event, "type", None) != "response.output_text.delta":
+            return ""
+        return getattr(event, "delta", "") or ""
+
+    async def astream_chat(
+        self,
+        message: str,
+        history: list[dict],
+        setting: dict,
+        use_local: bool,
+    ) -> AsyncIterator[str]:
+        """Yield the reply as text deltas as soon as the provider emits them."""
+        aclient = self.aclient_lm if use_local else self.aclient_oa
+        if aclient is None and (self.client_lm if use_local else self.client_oa) is not None:
+            # Sin cliente async no hay streaming real: se envia la respuesta entera.
+            yield await self.achat(message, history, setting, use_local)
+            return
+        request = self._build_request(message, history, setting, use_local)
+        client = self._require_client(aclient, use_local)
+
+        try:
+            stream = await client.responses.create(**request, stream=True) # type: ignore
+            async for event in stream:
+                delta = self._extract_stream_delta(event)
+                if delta:
+                    yield delta
+        except HTTPException:
+            raise
+        except Exception as exc:
+            raise HTTPException(
+                status_code=502,
+                detail="Error calling LLM provider",
+            ) from exc
@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 from models.classifier import ClassifyResult
@@ -5,9 +6,29 @@ from services.llmsettings import LLMSettings
 
 
 class ClassifierService:
+    INSTRUCTIONS = (
+        "Eres un clasificador emocional para OverMyShoulder. "
+        "PROHIBIDO diagnosticar. Solo clasifica emocion, intensidad, riesgo y temas. "
+        "Night mode si hay señales de insomnio o si el mensaje menciona noche/dormir. "
+        "Si hay menciones claras de autolesion o deseo de morir -> risk='self_harm'. "
+        "Si hay urgencia inminente, plan o intento -> risk='crisis'. "
+        "Si no esta claro, usa risk='none'. "
+        "Devuelve SOLO JSON valido, sin markdown ni texto extra. "
+        "Estructura exacta (topics max 5):\n"
+        "{"
+        "\"mood\":\"triste|ansioso|solo|enfadado|confundido|neutro|alegre\","
+        "\"intensity\":1-5,"
+        "\"tone_hint\":\"suave|normal|directo\","
+        "\"night_mode_hint\":true/false,"
+        "\"risk\":\"none|self_harm|crisis\","
+        "\"topics\":[\"ruptura\",\"insomnio\",\"pareja\",\"trabajo\",\"familia\",\"autoestima\",\"otro\"]"
+        "}"
+    )
+
     def __init__(self, llm: LLMSettings) -> None:
         self.llm = llm
         self.client = llm.openai_client
+        self.aclient = getattr(llm, "openai_async_client", None)
 
     def _extract_json_object(self, text: str) -> dict:
         if not text:
@@ -45,41 +66,41 @@ class ClassifierService:
         except Exception:
             return ""
 
+    def _build_request(self, message: str) -> dict:
+        return {
+            "model": self.llm.model_classifier_oa,
+            "reasoning": {"effort": "low"},
+            "instructions": self.INSTRUCTIONS,
+            "input": [{"role": "user", "content": message}],
+            "response_format": {"type": "json_object"},
+            "max_output_tokens": 160,
+            "store": False,
+        }
+
+    def _parse_response(self, response) -> dict:
+        raw = self._extract_response_text(response)
+        parsed = self._extract_json_object(raw)
+        return ClassifyResult.coerce_defaults(parsed).model_dump()
+
     def classify(self, message: str) -> dict:
         if self.client is None:
             return ClassifyResult.coerce_defaults({}).model_dump()
 
-        instructions = (
-            "Eres un clasificador emocional para OverMyShoulder. "
-            "PROHIBIDO diagnosticar. Solo clasifica emocion, intensidad, riesgo y temas. "
-            "Night mode si hay señales de insomnio o si el mensaje menciona noche/dormir. "
-            "Si hay menciones claras de autolesion o deseo de morir -> risk='self_harm'. "
-            "Si hay urgencia inminente, plan o intento -> risk='crisis'. "
-            "Si no esta claro, usa risk='none'. "
-            "Devuelve SOLO JSON valido, sin markdown ni texto extra. "
-            "Estructura exacta (topics max 5):\n"
-            "{"
-            "\"mood\":\"triste|ansioso|solo|enfadado|confundido|neutro|alegre\","
-            "\"intensity\":1-5,"
-            "\"tone_hint\":\"suave|normal|directo\","
-            "\"night_mode_hint\":true/false,"
-            "\"risk\":\"none|self_harm|crisis\","
-            "\"topics\":[\"ruptura\",\"insomnio\",\"pareja\",\"trabajo\",\"familia\",\"autoestima\",\"otro\"]"
-            "}"
-        )
+        try:
+            response = self.client.responses.create(**self._build_request(message))
+            return self._parse_response(response)
+        except Exception:
+            return ClassifyResult.coerce_defaults({}).model_dump()
+
+    async def aclassify(self, message: str) -> dict:
+        """Async version of `classify` that does not block the event loop."""
+        if self.aclient is None:
+            if self.client is None:
+                return ClassifyResult.coerce_defaults({}).model_dump()
+            return await asyncio.to_thread(self.classify, message)
 
         try:
-            response = self.client.responses.create(
-                model=self.llm.model_classifier_oa,
-                reasoning={"effort": "low"},
-                instructions=instructions,
-                input=[{"role": "user", "content": message}],
-                response_format={"type": "json_object"},
-                max_output_tokens=160,
-                store=False,
-            )
-            raw = self._extract_response_text(response)
-            parsed = self._extract_json_object(raw)
-            return ClassifyResult.coerce_defaults(parsed).model_dump()
+            response = await self.aclient.responses.create(**self._build_request(message))
+            return self._parse_response(response)
         except Exception:
             return ClassifyResult.coerce_defaults({}).model_dump()
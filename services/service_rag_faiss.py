@@ -1,10 +1,15 @@
+import argparse
+import asyncio
 import hashlib
 import json
 import os
-from dataclasses import dataclass
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Sequence, Tuple
 
 import logging
 import numpy as np
@@ -15,65 +20,184 @@ except Exception as exc:  # pragma: no cover - runtime error path
     faiss = None
     _FAISS_IMPORT_ERROR = exc
 
+from services.ann_index import apply_search_params, build_index, index_spec
+from services.embedding_batcher import EmbeddingBatcher
+from services.embedding_cache import EMBEDDING_STORE_FILE, QueryEmbeddingCache, SqliteVectorStore, embedding_key
+from services.embedding_dimensions import embedding_space, fit_dimensions, request_kwargs
+from services.embedding_providers import EmbeddingClients, embedding_clients
+from services.embedding_pipeline import embed_in_parallel, plan_batches
 from services.llmsettings import LLMSettings
+from services.quantization import load_codes, rescore_factor, vector_dtype, write_codes
+from services.rag_artifacts import (
+    ARTIFACT_FILES,
+    BUILD_LOCK_FILE,
+    CHUNK_FILES,
+    EMBEDDINGS_FILE,
+    INDEX_FILE,
+    MANIFEST_FILE,
+    ChunkStore,
+    ChunkStoreWriter,
+    VectorFileWriter,
+    artifact_checksums,
+    build_lock,
+    file_sha256,
+    load_vectors,
+    verify_checksums,
+)
+from services.chunking import chunk_markdown, chunking_config
+from services.lexical_index import BM25Index, LexicalIndexWriter, reciprocal_rank_fusion
+from services.rag_context import assemble_context, mmr_candidates, mmr_enabled, mmr_select
+from services.rag_ingest import is_jsonl, iter_chunks, iter_documents, list_markdown_files, source_name, windows
+from services.rag_metadata import GENERIC_TOPICS, MetadataIndex, chunk_metadata, precomputed_min_confidence
 
 logger = logging.getLogger("rag")
 
 _DEFAULT_TOP_K = int(os.getenv("TOP_K", "3"))
 _RAG_DEBUG = os.getenv("RAG_DEBUG", "false").lower() == "true"
+_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+_QUERY_CACHE_TTL_SECONDS = float(os.getenv("RAG_QUERY_CACHE_TTL_SECONDS", "3600"))
+_QUERY_CACHE_DISK = os.getenv("RAG_QUERY_CACHE_DISK", "false").lower() == "true"
+_EMBED_BATCH_MAX_SIZE = int(os.getenv("RAG_EMBED_BATCH_MAX_SIZE", "32"))
+_EMBED_BATCH_WAIT_MS = float(os.getenv("RAG_EMBED_BATCH_WAIT_MS", "5"))
+_SEARCH_BLOCK_SIZE = int(os.getenv("RAG_SEARCH_BLOCK_SIZE", "16384"))
+_QUANTIZED_BLOCK_SIZE = 4096
+_INGEST_WINDOW = int(os.getenv("RAG_INGEST_WINDOW", "1024"))
+# vector: embed the query (BM25 only if that fails or there is no client);
+# hybrid: fuse vector and BM25 rankings; lexical: BM25 only, no network.
+_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "vector").lower()
+# Candidates fetched from each ranking per returned chunk in hybrid mode.
+_FUSION_CANDIDATES = 4
+# Version of the on-disk artifact layout; caches with another layout are rebuilt.
+_LAYOUT_VERSION = 8
+# Each build lives in its own directory; manifest.json names the live one.
+_STAGING_PREFIX = ".build-"
+_KEEP_BUILDS = int(os.getenv("RAG_KEEP_BUILDS", "2"))
+_BUILD_LOCK_TIMEOUT_SECONDS = float(os.getenv("RAG_BUILD_LOCK_TIMEOUT_SECONDS", "1800"))
 
 
-def _load_playbooks(playbooks_dir: str) -> List[Tuple[str, str]]:
+def _scan_playbooks(playbooks_dir: str, known_files: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Stat every corpus file and hash only the ones whose (size, mtime) changed.
+
+    `playbooks_dir` is a directory tree of `.md` files or a single `.jsonl`.
+    """
     root = Path(playbooks_dir)
-    if not root.exists() or not root.is_dir():
+    if is_jsonl(root):
+        files = [(root.name, root)]
+    elif root.exists() and root.is_dir():
+        files = [(source_name(root, path), path) for path in list_markdown_files(root)]
+    else:
         raise FileNotFoundError(f"playbooks_dir not found: {playbooks_dir}")
-    items: List[Tuple[str, str]] = []
-    for path in sorted(root.glob("*.md")):
-        items.append((path.name, path.read_text(encoding="utf-8")))
-    return items
+    entries: List[Dict[str, Any]] = []
+    for name, path in files:
+        st = path.stat()
+        known = known_files.get(name) or {}
+        if known.get("sha256") and known.get("size") == st.st_size and known.get("mtime_ns") == st.st_mtime_ns:
+            sha = known["sha256"]
+        else:
+            sha = file_sha256(path)
+        entries.append({
+            "name": name,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha,
+        })
+    return entries
 
 
-def _hash_playbooks(items: List[Tuple[str, str]]) -> str:
+def _hash_file_entries(entries: List[Dict[str, Any]]) -> str:
     h = hashlib.sha256()
-    for name, text in items:
-        h.update(name.encode("utf-8"))
+    for entry in entries:
+        h.update(entry["name"].encode("utf-8"))
         h.update(b"\n")
-        h.update(text.encode("utf-8"))
+        h.update(entry["sha256"].encode("utf-8"))
         h.update(b"\n---\n")
     return h.hexdigest()
 
 
-def _chunk_text(text: str, chunk_size: int = 700, overlap: int = 120) -> List[str]:
-    if not text:
-        return []
-    if overlap >= chunk_size:
-        raise ValueError("overlap must be smaller than chunk_size")
-    chunks: List[str] = []
-    start = 0
-    length = len(text)
-    while start < length:
-        end = min(start + chunk_size, length)
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        if end >= length:
-            break
-        start = end - overlap
-    return chunks
-
-
-def _embed_texts(client, model: str, texts: List[str]) -> np.ndarray:
+def _embed_texts(client, model: str, texts: List[str], dimensions: int | None = None) -> np.ndarray:
     if not texts:
         return np.zeros((0, 0), dtype=np.float32)
     vectors: List[List[float]] = []
-    batch_size = 100
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        resp = client.embeddings.create(model=model, input=batch)
+    # Same token / item budget as `embed_in_parallel`: each of its batches is one request.
+    for batch in plan_batches(texts):
+        resp = client.embeddings.create(
+            model=model, input=[texts[pos] for pos in batch], **request_kwargs(model, dimensions)
+        )
         for item in resp.data:
             vectors.append(item.embedding)
     arr = np.array(vectors, dtype=np.float32)
-    return arr
+    # Models without a `dimensions` parameter are truncated here.
+    return fit_dimensions(arr, dimensions)
+
+
+async def _aembed_texts(aclient, model: str, texts: List[str], dimensions: int | None = None) -> np.ndarray:
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors: List[List[float]] = []
+    for batch in plan_batches(texts):
+        resp = await aclient.embeddings.create(
+            model=model, input=[texts[pos] for pos in batch], **request_kwargs(model, dimensions)
+        )
+        for item in resp.data:
+            vectors.append(item.embedding)
+    return fit_dimensions(np.array(vectors, dtype=np.float32), dimensions)
+
+
+def _read_manifest(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    # Readers see either the old or the new manifest, never a partial one.
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _manifest_files(manifest: Dict[str, Any]) -> Tuple[str, ...]:
+    # Lexical-only builds (`"index": null`) have no embeddings.npy / faiss.index.
+    return (
+        (ARTIFACT_FILES if manifest.get("index") is not None else CHUNK_FILES)
+        + tuple((manifest.get("quantization") or {}).get("files") or ())
+        + tuple((manifest.get("lexical") or {}).get("files") or ())
+    )
+
+
+def _artifacts_root(cache_root: Path, manifest: Dict[str, Any]) -> Path:
+    name = manifest.get("artifacts_dir")
+    if not name:
+        raise RuntimeError(f"RAG manifest in {cache_root} has no artifacts_dir")
+    return cache_root / name
+
+
+def _remove_stale_staging(cache_root: Path) -> None:
+    """Drop staging dirs left by crashed builds (only called while holding the build lock)."""
+    for path in cache_root.glob(f"{_STAGING_PREFIX}*"):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _prune_builds(cache_root: Path, keep: str) -> None:
+    """Delete old build directories, keeping the newest `_KEEP_BUILDS` (including `keep`).
+
+    Files still mmapped by an older snapshot stay readable after unlinking.
+    """
+    builds = [
+        path for path in cache_root.iterdir()
+        if path.is_dir() and path.name.startswith(f"v{_LAYOUT_VERSION}-") and path.name != keep
+    ]
+    builds.sort(key=lambda path: path.stat().st_mtime_ns, reverse=True)
+    for path in builds[max(0, _KEEP_BUILDS - 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _artifact_version(content_hash: str) -> str:
+    return f"v{_LAYOUT_VERSION}-{content_hash[:12]}"
 
 
 def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
@@ -87,33 +211,135 @@ def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
 @dataclass
 class RagIndex:
     index: Any
-    chunks: List[Dict[str, Any]]
+    chunks: Sequence[Dict[str, Any]]
     model: str
     top_k_default: int
     manifest: Dict[str, Any]
     loaded_from_cache: bool
+    query_cache: QueryEmbeddingCache | None = None
+    query_batcher: EmbeddingBatcher | None = None
+    dimensions: int | None = None
+    provider: str = "openai"
+    # float32 matrix (mmapped embeddings.npy) for exact search over filtered rows.
+    vectors: np.ndarray | None = None
+    metadata: MetadataIndex | None = None
+    lexical: BM25Index | None = None
+    _precomputed: Dict[Tuple[int, int], List[Dict[str, Any]]] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.metadata is None and hasattr(self.chunks, "source_ids"):
+            self.metadata = MetadataIndex(self.chunks.source_ids, self.chunks.source_meta)
 
-    def retrieve(self, client, query: str, top_k: int = None) -> List[Dict[str, Any]]:
+    @property
+    def space(self) -> str:
+        return embedding_space(self.model, self.dimensions, self.provider)
+
+    def retrieve(self, client, query: str, top_k: int = None, filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
         
         logger.info("[RAG] retrieve() called")
         if not query:
             return []
         k = top_k if top_k is not None else self.top_k_default
-        q = _embed_texts(client, self.model, [query])
-        q = _l2_normalize(q)
-        scores, indices = self.index.search(q, k)
+        rows = self._filtered_rows(filters)
+        if rows is not None and rows.size == 0:
+            return []
+        q = self._cached_query_vector(query)
+        if q is None:
+            q = _l2_normalize(_embed_texts(client, self.model, [query], self.dimensions))
+            self._cache_query_vector(query, q)
+        return self._search(q, k, rows)
+
+    async def aretrieve(
+        self, aclient, query: str, top_k: int = None, filters: Dict[str, Any] | None = None
+    ) -> List[Dict[str, Any]]:
+        logger.info("[RAG] aretrieve() called")
+        if not query:
+            return []
+        k = top_k if top_k is not None else self.top_k_default
+        rows = self._filtered_rows(filters)
+        if rows is not None and rows.size == 0:
+            return []
+        q = self._cached_query_vector(query)
+        if q is None:
+            if self.query_batcher is not None:
+                q = (await self.query_batcher.embed(query)).reshape(1, -1)
+            else:
+                q = await _aembed_texts(aclient, self.model, [query], self.dimensions)
+            q = _l2_normalize(q)
+            self._cache_query_vector(query, q)
+        return self._search(q, k, rows)
+
+    def lexical_retrieve(self, query: str, top_k: int = None, filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        """BM25 over the chunk texts: no query embedding, no network."""
+        if not query or self.lexical is None:
+            return []
+        k = top_k if top_k is not None else self.top_k_default
+        rows = self._filtered_rows(filters)
+        if rows is not None and rows.size == 0:
+            return []
+        scores, indices = self.lexical.search(query, k, rows)
+        return [self._chunk_result(int(idx), float(score)) for score, idx in zip(scores, indices)]
+
+    def _filtered_rows(self, filters: Dict[str, Any] | None) -> np.ndarray | None:
+        if not filters:
+            return None
+        if self.metadata is None:
+            raise RuntimeError("this RAG index has no chunk metadata to filter on")
+        return self.metadata.select(filters)
+
+    def playbook_context(self, topics: Sequence[str], night_mode: bool = False, top_k: int = None) -> List[Dict[str, Any]]:
+        """First chunks of the playbook the topics point to, if the match is confident; no embedding call.
+
+        Results are built once per (playbook, k) and reused for the life of the index.
+        """
+        if self.metadata is None:
+            return []
+        source_id, confidence = self.metadata.route(topics, night_mode)
+        if source_id is None or confidence < precomputed_min_confidence():
+            return []
+        k = top_k if top_k is not None else self.top_k_default
+        cached = self._precomputed.get((source_id, k))
+        if cached is None:
+            cached = [self._chunk_result(int(row), 1.0) for row in self.metadata.source_rows[source_id][:k]]
+            self._precomputed[(source_id, k)] = cached
+        return cached
+
+    def _chunk_result(self, idx: int, score: float) -> Dict[str, Any]:
+        chunk = self.chunks[idx]
+        return {
+            "source": chunk["source"],
+            "chunk_id": chunk["chunk_id"],
+            "text": chunk["text"],
+            "score": score,
+            "row": idx,
+            "ordinal": int(self.chunks.ordinals[idx]),
+            "header": self.chunks.header(idx),
+            "section": self.chunks.section(idx),
+        }
+
+    def _cached_query_vector(self, query: str) -> np.ndarray | None:
+        if self.query_cache is None:
+            return None
+        vector = self.query_cache.get(self.space, query)
+        if vector is None:
+            return None
+        return vector.reshape(1, -1)
+
+    def _cache_query_vector(self, query: str, q: np.ndarray) -> None:
+        if self.query_cache is not None and q.size:
+            self.query_cache.put(self.space, query, q[0])
+
+    def _search(self, q: np.ndarray, k: int, rows: np.ndarray | None = None) -> List[Dict[str, Any]]:
+        if rows is None:
+            scores, indices = self.index.search(q, k)
+        else:
+            # Filtered: exact scores over the selected slice only.
+            scores, indices = _search_rows(self.vectors, rows, q, k)
         results: List[Dict[str, Any]] = []
         for score, idx in zip(scores[0], indices[0]):
             if idx < 0 or idx >= len(self.chunks):
                 continue
-            chunk = self.chunks[idx]
-             
-            results.append({
-                "source": chunk["source"],
-                "chunk_id": chunk["chunk_id"],
-                "text": chunk["text"],
-                "score": float(score),
-            })
+            results.append(self._chunk_result(int(idx), float(score)))
         if _RAG_DEBUG:
             debug_items = ", ".join([f"{c['source']}:{c['score']:.4f}" for c in results])
             print(f"[RAG_DEBUG] top_k={k} {debug_items}")
@@ -127,23 +353,150 @@ class RagIndex:
     def status(self) -> Dict[str, Any]:
         return {
             "loaded_from_cache": self.loaded_from_cache,
+            "embedding_provider": self.provider,
             "embedding_model": self.model,
+            "embedding_dimensions": self.dimensions,
+            "version": self.manifest.get("version"),
             "hash": self.manifest.get("hash"),
+            "index_type": (self.manifest.get("index") or {}).get("factory"),
             "created_at": self.manifest.get("created_at"),
+            "lexical_terms": (self.manifest.get("lexical") or {}).get("terms"),
+            "query_cache": self.query_cache.stats() if self.query_cache is not None else None,
+            "query_batcher": self.query_batcher.stats() if self.query_batcher is not None else None,
         }
 
 
 class _SimpleIndex:
-    def __init__(self, embeddings: np.ndarray) -> None:
+    """Exact inner-product search in NumPy with the `faiss.Index.search` interface.
+
+    Takes a matrix of queries at once. Scores are computed over blocks of
+    `block_size` vectors so memory stays at n_queries x block_size, and top-k
+    uses argpartition: only the k winners of each query are sorted.
+    """
+
+    def __init__(self, embeddings: np.ndarray, block_size: int = _SEARCH_BLOCK_SIZE, scale: np.ndarray | None = None) -> None:
         self.embeddings = embeddings
+        self.block_size = max(1, block_size)
+        # float16 / int8 codes are widened block by block; keep that temporary small.
+        if embeddings.dtype != np.float32:
+            self.block_size = min(self.block_size, _QUANTIZED_BLOCK_SIZE)
+        self.scale = scale
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.embeddings.shape[0]) if self.embeddings.size else 0
 
     def search(self, q: np.ndarray, k: int):
-        if self.embeddings.size == 0:
-            return np.zeros((1, 0), dtype=np.float32), np.zeros((1, 0), dtype=np.int64)
-        scores = q @ self.embeddings.T
-        idx = np.argsort(-scores, axis=1)[:, :k]
-        top_scores = np.take_along_axis(scores, idx, axis=1)
-        return top_scores, idx
+        q = np.atleast_2d(np.asarray(q, dtype=np.float32))
+        n = self.ntotal
+        if n == 0 or k <= 0:
+            return np.zeros((q.shape[0], 0), dtype=np.float32), np.zeros((q.shape[0], 0), dtype=np.int64)
+        k = min(k, n)
+        if self.scale is not None:
+            # q . (codes * scale) == (q * scale) . codes
+            q = q * self.scale
+        best = None
+        for start in range(0, n, self.block_size):
+            block = self.embeddings[start:start + self.block_size]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores = q @ block.T
+            scores, idx = _top_k(scores, k)
+            best = _merge_top_k(best, scores, idx + start, k)
+        return _sorted_top_k(best)
+
+
+def _merge_top_k(best, scores: np.ndarray, idx: np.ndarray, k: int):
+    """Fold one block's (scores, ids) into the running per-row top-k."""
+    if best is None:
+        return scores, idx
+    merged_scores = np.concatenate([best[0], scores], axis=1)
+    merged_idx = np.concatenate([best[1], idx], axis=1)
+    best_scores, sel = _top_k(merged_scores, k)
+    return best_scores, np.take_along_axis(merged_idx, sel, axis=1)
+
+
+def _sorted_top_k(best):
+    best_scores, best_idx = best
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_idx, order, axis=1)
+
+
+def _search_rows(vectors: np.ndarray, rows: np.ndarray, q: np.ndarray, k: int, block_size: int = _SEARCH_BLOCK_SIZE):
+    """Exact inner-product top-k restricted to `rows` (sorted) of `vectors`, read block by block."""
+    q = np.atleast_2d(np.asarray(q, dtype=np.float32))
+    k = min(k, int(rows.size))
+    if k <= 0:
+        return np.zeros((q.shape[0], 0), dtype=np.float32), np.zeros((q.shape[0], 0), dtype=np.int64)
+    # A source's chunks are stored contiguously, so a filter is usually a few
+    # row ranges: those are scanned as slices of the mmap, without a copy.
+    runs = np.split(rows, np.flatnonzero(np.diff(rows) != 1) + 1)
+    if len(runs) > max(1, rows.size // 64):
+        runs = [rows]
+    best = None
+    for run in runs:
+        contiguous = len(runs) > 1 or run.size == 1 or run[-1] - run[0] == run.size - 1
+        for start in range(0, run.size, block_size):
+            ids = run[start:start + block_size]
+            block = vectors[ids[0]:ids[-1] + 1] if contiguous else vectors[ids]
+            scores, sel = _top_k(q @ np.asarray(block, dtype=np.float32).T, k)
+            best = _merge_top_k(best, scores, ids[sel], k)
+    return _sorted_top_k(best)
+
+
+class _RescoringIndex:
+    """Wrap a lossy index: fetch `factor * k` candidates, re-rank them exactly.
+
+    `full` is the float32 matrix (mmapped embeddings.npy); only candidate
+    rows are read, so it stays out of memory between queries.
+    """
+
+    def __init__(self, base, full: np.ndarray, factor: int) -> None:
+        self.base = base
+        self.full = full
+        self.factor = max(1, factor)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.base.ntotal)
+
+    def search(self, q: np.ndarray, k: int):
+        q = np.atleast_2d(np.asarray(q, dtype=np.float32))
+        out_scores = np.full((q.shape[0], max(k, 0)), -np.inf, dtype=np.float32)
+        out_idx = np.full((q.shape[0], max(k, 0)), -1, dtype=np.int64)
+        if k <= 0 or self.ntotal == 0:
+            return out_scores, out_idx
+        _, candidates = self.base.search(q, k * self.factor)
+        for row, ids in enumerate(candidates):
+            ids = np.unique(ids[ids >= 0])  # sorted: sequential reads from the mmap
+            if ids.size == 0:
+                continue
+            scores = self.full[ids] @ q[row]
+            top = np.argsort(-scores, kind="stable")[:k]
+            out_scores[row, :top.size] = scores[top]
+            out_idx[row, :top.size] = ids[top]
+        return out_scores, out_idx
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Unordered top-k per row: (scores, column indices)."""
+    k = min(k, scores.shape[1])
+    if k == scores.shape[1]:
+        idx = np.broadcast_to(np.arange(k, dtype=np.int64), scores.shape).copy()
+        return scores, idx
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k].astype(np.int64)
+    return np.take_along_axis(scores, idx, axis=1), idx
+
+
+def _read_faiss_index(path: Path):
+    # Flat codes are mmapped instead of copied into each worker's heap.
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flag is not None:
+        try:
+            return faiss.read_index(str(path), mmap_flag)
+        except RuntimeError:
+            logger.info("[RAG] faiss mmap not supported for %s, reading into memory", path.name)
+    return faiss.read_index(str(path))
 
 
 class RagFaissService:
@@ -153,118 +506,599 @@ class RagFaissService:
         playbooks_dir: str = "playbooks",
         cache_dir: str = ".rag_cache",
         disable_faiss: bool = False,
+        query_cache: QueryEmbeddingCache | None = None,
     ) -> None:
         self.llm = llm
         self.playbooks_dir = playbooks_dir
         self.cache_dir = cache_dir
         self.disable_faiss = disable_faiss
+        if query_cache is None and _QUERY_CACHE_SIZE > 0:
+            disk_path = str(Path(cache_dir) / "query_embeddings.sqlite") if _QUERY_CACHE_DISK else None
+            query_cache = QueryEmbeddingCache(
+                max_size=_QUERY_CACHE_SIZE,
+                ttl_seconds=_QUERY_CACHE_TTL_SECONDS,
+                disk_path=disk_path,
+            )
+        self.query_cache = query_cache
+        self.query_batcher: EmbeddingBatcher | None = None
+        if _EMBED_BATCH_WAIT_MS > 0 and _EMBED_BATCH_MAX_SIZE > 1:
+            self.query_batcher = EmbeddingBatcher(
+                self._aembed_queries,
+                max_batch_size=_EMBED_BATCH_MAX_SIZE,
+                max_wait_ms=_EMBED_BATCH_WAIT_MS,
+            )
+        self._store: SqliteVectorStore | None = None
         self._index: RagIndex | None = None
+        # Warm-up state for /api/health: idle -> loading -> ready | failed.
+        self._state = "idle"
+        self._error: str | None = None
+        self._progress: Dict[str, Any] = {}
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self.reloads = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._index is not None
+
+    @property
+    def embedding_dimensions(self) -> int | None:
+        return getattr(self.llm, "embedding_dimensions", None)
+
+    @property
+    def embedder(self) -> EmbeddingClients:
+        """Embedding provider, model and clients selected by EMBEDDING_PROVIDER (read on every call)."""
+        return embedding_clients(self.llm)
+
+    def warm_up(self, prebuilt: bool = False) -> None:
+        """Load or build the index, recording state instead of raising (run it off the event loop)."""
+        self._state = "loading"
+        self._error = None
+        try:
+            if prebuilt:
+                self.load_prebuilt()
+            else:
+                self.build_or_load()
+        except Exception as exc:
+            self._state = "failed"
+            self._error = f"{type(exc).__name__}: {exc}"
+            logger.exception("[RAG] warm-up failed, serving without RAG context")
+            return
+        self._state = "ready"
+
+    def adopt(self, index: RagIndex) -> None:
+        """Serve an index loaded elsewhere (e.g. by the pre-fork parent).
+
+        The query cache and batcher are rebound to this service so query
+        embeddings go through this process's own clients.
+        """
+        self._index = replace(index, query_cache=self.query_cache, query_batcher=self.query_batcher)
+        self._state = "ready"
+        self._progress = {"phase": "done"}
+
+    def close(self) -> None:
+        """Close the SQLite connections (embedding store, query cache disk tier)."""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        if self.query_cache is not None:
+            self.query_cache.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "ready": self.is_ready,
+            "progress": dict(self._progress),
+            "error": self._error,
+            "reloading": self._reloading,
+            "reloads": self.reloads,
+            "index": self._index.status() if self._index is not None else None,
+        }
 
     def build_or_load(self) -> RagIndex:
+        """Load the published index if playbooks are unchanged, else build and publish a new one.
+
+        Each build is written to its own directory and published by replacing
+        `manifest.json`; `self._index` is swapped in one assignment, so callers
+        holding the previous `RagIndex` keep a consistent snapshot.
+        """
         if faiss is None and not self.disable_faiss:
             raise RuntimeError(f"faiss not available: {_FAISS_IMPORT_ERROR}")
 
-        client = self.llm.openai_client
-        model = self.llm.embedding_model
-
-        items = _load_playbooks(self.playbooks_dir)
-        content_hash = _hash_playbooks(items)
+        embedder = self.embedder
+        client, model, provider = embedder.client, embedder.model, embedder.provider
+        dimensions = self.embedding_dimensions
 
         cache_root = Path(self.cache_dir)
         cache_root.mkdir(parents=True, exist_ok=True)
+        manifest_path = cache_root / MANIFEST_FILE
 
-        manifest_path = cache_root / "manifest.json"
-        chunks_path = cache_root / "chunks.json"
-        embeds_path = cache_root / "embeddings.npy"
-        index_path = cache_root / "faiss.index"
+        previous = _read_manifest(manifest_path)
+        same_space = (
+            previous.get("embedding_provider", "openai") == provider
+            and previous.get("embedding_model") == model
+            and previous.get("embedding_dimensions") == dimensions
+        )
+        known_files = (previous.get("files") or {}) if same_space else {}
 
-        if manifest_path.exists() and chunks_path.exists() and embeds_path.exists() and index_path.exists():
-            try:
-                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
-                if manifest.get("hash") == content_hash and manifest.get("embedding_model") == model:
-                    chunks = json.loads(chunks_path.read_text(encoding="utf-8"))
-                    if self.disable_faiss:
-                        embeddings = np.load(str(embeds_path))
-                        index = _SimpleIndex(embeddings)
-                    else:
-                        index = faiss.read_index(str(index_path))
-                    self._index = RagIndex(
-                        index=index,
-                        chunks=chunks,
-                        model=model,
-                        top_k_default=_DEFAULT_TOP_K,
-                        manifest=manifest,
-                        loaded_from_cache=True
-                    )
-                    return self._index
-            except Exception:
-                pass
-
-        if client is None:
-            raise RuntimeError("OPENAI_API_KEY missing for RAG embeddings")
-
-        chunks: List[Dict[str, Any]] = []
-        texts: List[str] = []
-        for name, text in items:
-            pb_id = Path(name).stem
-            pb_chunks = _chunk_text(text)
-            for idx, chunk in enumerate(pb_chunks):
-                chunks.append({
-                    "source": name,
-                    "chunk_id": f"{pb_id}:{idx}",
-                    "text": chunk,
-                })
-                texts.append(chunk)
-
-        embeddings = _embed_texts(client, model, texts)
-        embeddings = _l2_normalize(embeddings)
-
-        if self.disable_faiss:
-            index = _SimpleIndex(embeddings)
+        self._progress = {"phase": "scanning"}
+        entries = _scan_playbooks(self.playbooks_dir, known_files)
+        content_hash = _hash_file_entries(entries)
+
+        index = self._load_current(cache_root, previous, content_hash, model, dimensions, entries, provider)
+        if index is not None:
+            return index
+
+        # One worker builds; the others block here and then load its result.
+        self._progress = {"phase": "waiting_for_build_lock"}
+        with build_lock(cache_root / BUILD_LOCK_FILE, timeout=_BUILD_LOCK_TIMEOUT_SECONDS):
+            index = self._load_current(
+                cache_root, _read_manifest(manifest_path), content_hash, model, dimensions, entries, provider
+            )
+            if index is not None:
+                logger.info("[RAG] index published by another worker, loaded version=%s", index.manifest.get("version"))
+                return index
+            _remove_stale_staging(cache_root)
+            index = self._build(cache_root, entries, content_hash, client, model, dimensions, provider)
+        self._index = index
+        return index
+
+    def _load_current(
+        self,
+        cache_root: Path,
+        manifest: Dict[str, Any],
+        content_hash: str,
+        model: str,
+        dimensions: int | None,
+        entries: List[Dict[str, Any]],
+        provider: str = "openai",
+    ) -> RagIndex | None:
+        """Open the published index if it matches the playbooks on disk, else None."""
+        if (
+            manifest.get("hash") != content_hash
+            or manifest.get("embedding_provider", "openai") != provider
+            or manifest.get("embedding_model") != model
+            or manifest.get("embedding_dimensions") != dimensions
+            or manifest.get("layout") != _LAYOUT_VERSION
+            or manifest.get("chunking") != chunking_config()
+        ):
+            return None
+        if manifest.get("index") is None:
+            # Lexical-only build: try the vectors again once there is a client to embed with.
+            stale = _RETRIEVAL_MODE != "lexical" and self.embedder.client is not None
+        elif self.disable_faiss:
+            quantization = manifest.get("quantization") or {}
+            stale = manifest.get("engine") == "numpy" and quantization.get("dtype", "float32") != vector_dtype()
         else:
-            dim = embeddings.shape[1] if embeddings.size else 0
-            index = faiss.IndexFlatIP(dim)
-            if embeddings.size:
-                index.add(embeddings)
-
-        chunks_path.write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
-        np.save(str(embeds_path), embeddings)
-        if self.disable_faiss:
-            index_path.write_text("disabled", encoding="utf-8")
+            n = int((manifest.get("stats") or {}).get("chunks", 0))
+            wanted = index_spec(n, int(manifest.get("dim") or 0), dtype=vector_dtype())
+            stale = (manifest.get("index") or {}).get("factory") != wanted["factory"]
+        if stale:
+            # Index / storage settings changed: rebuild (vectors come from the embedding store).
+            return None
+        try:
+            index = self._open_index(cache_root, manifest)
+        except Exception:
+            logger.warning("[RAG] published index unreadable, rebuilding", exc_info=True)
+            return None
+        self._refresh_file_stats(cache_root / MANIFEST_FILE, manifest, entries)
+        self._progress = {"phase": "done"}
+        self._index = index
+        return index
+
+    def _build(
+        self,
+        cache_root: Path,
+        entries: List[Dict[str, Any]],
+        content_hash: str,
+        client,
+        model: str,
+        dimensions: int | None,
+        provider: str = "openai",
+    ) -> RagIndex:
+        staging = cache_root / f"{_STAGING_PREFIX}{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            manifest, index, chunks = self._write_artifacts(
+                staging, entries, content_hash, client, model, dimensions, provider
+            )
+            artifacts_dir = f"{manifest['version']}-{uuid.uuid4().hex[:8]}"
+            os.rename(staging, cache_root / artifacts_dir)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        manifest["artifacts_dir"] = artifacts_dir
+        vectors = load_vectors(cache_root / artifacts_dir / EMBEDDINGS_FILE) if index is not None else None
+        _write_manifest(cache_root / MANIFEST_FILE, manifest)
+        _prune_builds(cache_root, keep=artifacts_dir)
+        self._progress["phase"] = "done"
+        return RagIndex(
+            index=index,
+            chunks=chunks,
+            model=model,
+            top_k_default=_DEFAULT_TOP_K,
+            manifest=manifest,
+            loaded_from_cache=False,
+            query_cache=self.query_cache,
+            query_batcher=self.query_batcher,
+            dimensions=dimensions,
+            provider=provider,
+            vectors=vectors,
+            lexical=BM25Index.open(cache_root / artifacts_dir),
+        )
+
+    def _write_artifacts(
+        self,
+        out: Path,
+        entries: List[Dict[str, Any]],
+        content_hash: str,
+        client,
+        model: str,
+        dimensions: int | None,
+        provider: str = "openai",
+    ) -> Tuple[Dict[str, Any], Any, ChunkStore]:
+        # Per file: stat / hash and its chunk count (the embedding store is content-addressed,
+        # so the manifest stays O(files), not O(chunks)).
+        files: Dict[str, Any] = {entry["name"]: {**entry, "chunks": 0} for entry in entries}
+        jsonl_name = entries[0]["name"] if is_jsonl(Path(self.playbooks_dir)) else None
+        # Metadata of documents whose chunks have not been written yet.
+        pending_meta: Dict[str, Dict[str, Any]] = {}
+
+        def on_document(source: str, raw: Dict[str, Any]) -> None:
+            pending_meta[source] = chunk_metadata(source, raw)
+
+        chunk_writer = ChunkStoreWriter(out)
+        lexical_writer = LexicalIndexWriter(out)
+        # Lexical mode needs no vectors; in the other modes they are dropped if the
+        # embedding call fails, so a fresh deploy still gets a BM25-only index.
+        vector_writer = VectorFileWriter(out / EMBEDDINGS_FILE) if _RETRIEVAL_MODE != "lexical" else None
+        total = 0
+        embedded = 0
+        self._progress = {"phase": "embedding", "files_total": len(entries), "chunks_done": 0, "chunks_embedded": 0}
+        # Streaming ingestion: read -> chunk -> embed a window -> append to disk.
+        # Only one window of chunk texts and vectors is in memory at a time.
+        chunk_stream = iter_chunks(iter_documents(self.playbooks_dir), chunk_markdown, on_document=on_document)
+        for window in windows(chunk_stream, _INGEST_WINDOW):
+            texts = [text for _, _, text, _ in window]
+            if vector_writer is not None:
+                try:
+                    vectors, window_embedded = self._embed_with_store(client, model, texts, dimensions, provider)
+                except Exception:
+                    if self._index is not None and self._index.index is not None:
+                        raise  # reload: keep serving the published vector index
+                    logger.warning("[RAG] embedding failed, building a lexical-only index", exc_info=True)
+                    vector_writer.discard()
+                    vector_writer = None
+                else:
+                    vector_writer.append(_l2_normalize(vectors))
+                    embedded += window_embedded
+            for source, ordinal, text, section in window:
+                chunk_writer.append(source, ordinal, text, pending_meta.pop(source, None), section)
+                lexical_writer.append(text)
+                files[jsonl_name or source]["chunks"] += 1
+            total += len(window)
+            self._progress.update(chunks_done=total, chunks_embedded=embedded)
+        chunk_writer.close()
+        lexical = lexical_writer.close()
+        embeddings = vector_writer.close() if vector_writer is not None else None
+        chunks = ChunkStore.open(out)
+        self._progress["phase"] = "indexing"
+
+        dim = int(embeddings.shape[1]) if embeddings is not None and embeddings.size else 0
+        dtype = vector_dtype()
+        if embeddings is None:
+            # Lexical-only: chunk store + BM25 files, no embeddings.npy / faiss.index.
+            spec = None
+            quantization = {"dtype": None, "files": []}
+        elif self.disable_faiss:
+            spec = {"type": "flat", "factory": "Flat"}
+            quantization = write_codes(out, embeddings, dtype, block_rows=_INGEST_WINDOW)
+            (out / INDEX_FILE).write_text("disabled", encoding="utf-8")
         else:
-            faiss.write_index(index, str(index_path))
+            spec = index_spec(total, dim, dtype=dtype)
+            quantization = {"dtype": spec["dtype"], "files": []}
+            faiss_index = build_index(spec, embeddings, block_rows=_INGEST_WINDOW)
+            faiss.write_index(faiss_index, str(out / INDEX_FILE))
+            del faiss_index
 
         manifest = {
+            "version": _artifact_version(content_hash),
             "hash": content_hash,
+            "layout": _LAYOUT_VERSION,
+            "engine": "none" if spec is None else "numpy" if self.disable_faiss else "faiss",
+            "index": spec,
+            "dim": dim,
+            "embedding_provider": provider,
             "embedding_model": model,
+            "embedding_dimensions": dimensions,
+            "chunking": chunking_config(),
             "created_at": datetime.now(timezone.utc).isoformat(),
+            "quantization": quantization,
+            "lexical": lexical,
+            "checksums": {},
+            "stats": {
+                "chunks": total,
+                "embedded": embedded,
+                "reused": total - embedded,
+            },
+            "files": files,
         }
-        manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        manifest["checksums"] = artifact_checksums(out, _manifest_files(manifest))
+        logger.info("[RAG] index built: chunks=%s embedded=%s reused=%s", total, embedded, total - embedded)
+        if embeddings is None:
+            return manifest, None, chunks
+        return manifest, self._search_index(out, manifest, embeddings), chunks
 
-        self._index = RagIndex(
-            index=index,
+    def playbooks_changed(self) -> bool:
+        """Cheap poll: stat the corpus and compare its content hash with the live index."""
+        index = self._index
+        if index is None:
+            return True
+        known_files = index.manifest.get("files") or {}
+        entries = _scan_playbooks(self.playbooks_dir, known_files)
+        return _hash_file_entries(entries) != index.manifest.get("hash")
+
+    def reload(self) -> bool:
+        """Rebuild incrementally and swap the live index; False if a reload is already running."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._reloading = True
+            previous = self._index
+            try:
+                index = self.build_or_load()
+            except Exception as exc:
+                # Keep serving the previous snapshot.
+                self._index = previous
+                self._error = f"{type(exc).__name__}: {exc}"
+                logger.exception("[RAG] reload failed, keeping version %s", previous.manifest.get("version") if previous else None)
+                return False
+            self._error = None
+            self._state = "ready"
+            self.reloads += 1
+            logger.info("[RAG] reloaded index version=%s", index.manifest.get("version"))
+            return True
+        finally:
+            self._reloading = False
+            self._reload_lock.release()
+
+    def load_prebuilt(self) -> RagIndex:
+        """Verify and mmap-load artifacts made by the `build` CLI.
+
+        Playbooks are not scanned and nothing is embedded, so boot never
+        touches the network.
+        """
+        cache_root = Path(self.cache_dir)
+        manifest_path = cache_root / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"RAG artifacts not found: {manifest_path}")
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("layout") != _LAYOUT_VERSION:
+            raise RuntimeError(f"RAG artifacts layout {manifest.get('layout')} != {_LAYOUT_VERSION}, rebuild them")
+        embedder = self.embedder
+        if manifest.get("embedding_provider", "openai") != embedder.provider:
+            raise RuntimeError(
+                f"RAG artifacts were built with the {manifest.get('embedding_provider', 'openai')} embedding provider, "
+                f"EMBEDDING_PROVIDER is {embedder.provider}"
+            )
+        if manifest.get("embedding_model") != embedder.model:
+            raise RuntimeError(
+                f"RAG artifacts were built with {manifest.get('embedding_model')}, "
+                f"EMBEDDING_MODEL is {embedder.model}"
+            )
+        if manifest.get("embedding_dimensions") != self.embedding_dimensions:
+            raise RuntimeError(
+                f"RAG artifacts were built with {manifest.get('embedding_dimensions') or 'full'} dimensions, "
+                f"EMBEDDING_DIMENSIONS is {self.embedding_dimensions or 'unset'}"
+            )
+        verify_checksums(_artifacts_root(cache_root, manifest), manifest.get("checksums") or {}, _manifest_files(manifest))
+        self._index = self._open_index(cache_root, manifest)
+        logger.info("[RAG] prebuilt index loaded: version=%s chunks=%s", manifest.get("version"), len(self._index.chunks))
+        return self._index
+
+    def _open_index(self, cache_root: Path, manifest: Dict[str, Any]) -> RagIndex:
+        if faiss is None and not self.disable_faiss:
+            raise RuntimeError(f"faiss not available: {_FAISS_IMPORT_ERROR}")
+        root = _artifacts_root(cache_root, manifest)
+        chunks = ChunkStore.open(root)
+        vectors = load_vectors(root / EMBEDDINGS_FILE) if manifest.get("index") is not None else None
+        return RagIndex(
+            index=self._search_index(root, manifest, vectors) if vectors is not None else None,
             chunks=chunks,
-            model=model,
+            model=manifest["embedding_model"],
             top_k_default=_DEFAULT_TOP_K,
             manifest=manifest,
-            loaded_from_cache=False
+            loaded_from_cache=True,
+            query_cache=self.query_cache,
+            query_batcher=self.query_batcher,
+            dimensions=manifest.get("embedding_dimensions"),
+            provider=manifest.get("embedding_provider", "openai"),
+            vectors=vectors,
+            lexical=BM25Index.open(root) if manifest.get("lexical") else None,
         )
-        return self._index
 
-    def retrieve(self, query: str, top_k: int = 3) -> str:
-        if not query:
+    def _search_index(self, root: Path, manifest: Dict[str, Any], full: np.ndarray | None = None):
+        """Searchable index of an artifact dir; lossy ones are wrapped with full-precision rescoring."""
+        if full is None:
+            full = load_vectors(root / EMBEDDINGS_FILE)
+        quantization = manifest.get("quantization") or {}
+        if self.disable_faiss or manifest.get("engine") == "numpy":
+            if not quantization.get("files"):
+                return _SimpleIndex(full)
+            codes, scale = load_codes(root, quantization)
+            base = _SimpleIndex(codes, scale=scale)
+        else:
+            base = _read_faiss_index(root / INDEX_FILE)
+            apply_search_params(base)
+            if not (manifest.get("index") or {}).get("lossy"):
+                return base
+        factor = rescore_factor()
+        if factor <= 0:
+            return base
+        return _RescoringIndex(base, full, factor)
+
+    async def _aembed_queries(self, texts: List[str]) -> np.ndarray:
+        embedder = self.embedder
+        return await _aembed_texts(embedder.async_client, embedder.model, texts, self.embedding_dimensions)
+
+    def _embedding_store(self) -> SqliteVectorStore:
+        if self._store is None:
+            self._store = SqliteVectorStore(str(Path(self.cache_dir) / EMBEDDING_STORE_FILE))
+        return self._store
+
+    def _embed_with_store(
+        self, client, model: str, texts: List[str], dimensions: int | None = None, provider: str = "openai"
+    ) -> Tuple[np.ndarray, int]:
+        """Return vectors for `texts`, calling the API only for chunks not in the store."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32), 0
+        store = self._embedding_store()
+        space = embedding_space(model, dimensions, provider)
+        keys = [embedding_key(space, text) for text in texts]
+        vectors = store.get_many(set(keys))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            if client is None:
+                raise RuntimeError(f"no {provider} client for RAG embeddings")
+
+            def persist(batch: List[Tuple[str, np.ndarray]]) -> None:
+                store.put_many(batch)
+                vectors.update(batch)
+
+            embed_in_parallel(lambda batch: _embed_texts(client, model, batch, dimensions), missing, on_batch=persist)
+        return np.stack([vectors[key] for key in keys]).astype(np.float32), len(missing)
+
+    def _refresh_file_stats(self, manifest_path: Path, manifest: Dict[str, Any], entries: List[Dict[str, Any]]) -> None:
+        """Record new (size, mtime) of touched-but-unchanged files so the next start skips hashing them."""
+        files = manifest.get("files") or {}
+        changed = False
+        for entry in entries:
+            known = files.get(entry["name"])
+            if known is None:
+                continue
+            if known.get("size") != entry["size"] or known.get("mtime_ns") != entry["mtime_ns"]:
+                known.update(size=entry["size"], mtime_ns=entry["mtime_ns"])
+                changed = True
+        if changed:
+            _write_manifest(manifest_path, manifest)
+
+    def retrieve(self, query: str, top_k: int = 3, filters: Dict[str, Any] | None = None) -> str:
+        """Context for `query`; `filters` (topics, playbook, language, night_mode) restrict the search."""
+        index = self._index  # one snapshot for the whole call, even if a reload swaps it
+        if not query or index is None:
+            # Until warm-up finishes the chat runs without RAG context.
             return ""
-        if self._index is None:
-            raise RuntimeError("RAG index not initialized")
-        client = self.llm.openai_client
-        if client is None:
+        client = self.embedder.client
+        if _RETRIEVAL_MODE == "lexical" or client is None or index.index is None:
+            return self._format_context(index.lexical_retrieve(query, top_k, filters))
+        try:
+            rag_chunks = index.retrieve(client, query, top_k=self._candidates(top_k), filters=filters)
+        except Exception:
+            if index.lexical is None:
+                raise
+            logger.warning("[RAG] query embedding failed, answering from the lexical index", exc_info=True)
+            return self._format_context(index.lexical_retrieve(query, top_k, filters))
+        return self._format_context(self._rank(index, query, rag_chunks, top_k, filters))
+
+    async def aretrieve(self, query: str, top_k: int = 3, filters: Dict[str, Any] | None = None) -> str:
+        """Async version of `retrieve`: the query embedding does not block the event loop."""
+        index = self._index
+        if not query or index is None:
             return ""
-        rag_chunks = self._index.retrieve(client, query, top_k=top_k)
-        if not rag_chunks:
+        embedder = self.embedder
+        aclient = embedder.async_client
+        if _RETRIEVAL_MODE == "lexical" or (aclient is None and embedder.client is None) or index.index is None:
+            return self._format_context(index.lexical_retrieve(query, top_k, filters))
+        if aclient is None:
+            return await asyncio.to_thread(self.retrieve, query, top_k, filters)
+        try:
+            rag_chunks = await index.aretrieve(aclient, query, top_k=self._candidates(top_k), filters=filters)
+        except Exception:
+            if index.lexical is None:
+                raise
+            logger.warning("[RAG] query embedding failed, answering from the lexical index", exc_info=True)
+            return self._format_context(index.lexical_retrieve(query, top_k, filters))
+        return self._format_context(self._rank(index, query, rag_chunks, top_k, filters))
+
+    def lexical_context(self, query: str, top_k: int = 3, filters: Dict[str, Any] | None = None) -> str:
+        """Context from BM25 alone (sub-millisecond, no network), e.g. when the embedding call timed out."""
+        index = self._index
+        if not query or index is None:
             return ""
-        rag_context = "RAG_CONTEXT_START\n"
-        for item in rag_chunks:
-            rag_context += f"[source={item['source']} id={item['chunk_id']} score={item['score']:.4f}]\n"
-            rag_context += item["text"] + "\n---\n"
-        rag_context += "RAG_CONTEXT_END"
-        return rag_context
+        return self._format_context(index.lexical_retrieve(query, top_k, filters))
+
+    def topic_filters(self, topics: Sequence[str]) -> Dict[str, Any] | None:
+        """Filters for the classifier topics the index knows about; None when none of them is tagged."""
+        index = self._index
+        if index is None or index.metadata is None:
+            return None
+        known = index.metadata.topics
+        wanted = [topic for topic in topics if topic in known and topic not in GENERIC_TOPICS]
+        return {"topics": wanted} if wanted else None
+
+    def precomputed_context(self, topics: Sequence[str], night_mode: bool = False, top_k: int = 3) -> str:
+        """Context of the one playbook the classifier topics match confidently, or "" (no embedding call)."""
+        index = self._index
+        if index is None:
+            return ""
+        return self._format_context(index.playbook_context(topics, night_mode, top_k=top_k))
+
+    @staticmethod
+    def _candidates(top_k: int) -> int:
+        factor = mmr_candidates()
+        if _RETRIEVAL_MODE == "hybrid":
+            factor = max(factor, _FUSION_CANDIDATES)
+        return top_k * factor
+
+    def _rank(
+        self, index: RagIndex, query: str, rag_chunks: List[Dict[str, Any]], top_k: int, filters: Dict[str, Any] | None
+    ) -> List[Dict[str, Any]]:
+        """Final chunks from the vector candidates: fused with BM25 in hybrid mode, then diversified."""
+        if _RETRIEVAL_MODE == "hybrid" and index.lexical is not None:
+            lexical = index.lexical_retrieve(query, self._candidates(top_k), filters)
+            rag_chunks = reciprocal_rank_fusion([rag_chunks, lexical], top_k=self._candidates(top_k))
+        return self._diversify(index, rag_chunks, top_k)
+
+    @staticmethod
+    def _diversify(index: RagIndex, rag_chunks: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        if mmr_enabled() and index.vectors is not None:
+            return mmr_select(rag_chunks, index.vectors, top_k)
+        return rag_chunks[:top_k]
+
+    def _format_context(self, rag_chunks: List[Dict[str, Any]]) -> str:
+        # Adjacent chunks are merged and the block is capped at RAG_CONTEXT_TOKEN_BUDGET.
+        return assemble_context(rag_chunks)
+
+
+def build_artifacts(llm: LLMSettings, playbooks_dir: str, out_dir: str, disable_faiss: bool = False) -> Dict[str, Any]:
+    """Run the full build into `out_dir` and return its manifest."""
+    service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=out_dir, disable_faiss=disable_faiss)
+    return service.build_or_load().manifest
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.service_rag_faiss", description="Offline RAG index tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="chunk, embed and index the playbooks into versioned artifacts")
+    build.add_argument("--playbooks", default="playbooks", help="directory of .md files or a .jsonl file")
+    build.add_argument("--out", default=".rag_cache", help="artifact directory")
+    build.add_argument("--no-faiss", action="store_true", help="write artifacts for the NumPy search engine")
+    verify = sub.add_parser("verify", help="check artifact checksums without loading the index")
+    verify.add_argument("--out", default=".rag_cache", help="artifact directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        manifest = build_artifacts(LLMSettings(), args.playbooks, args.out, disable_faiss=args.no_faiss)
+        print(f"built {manifest['version']} ({manifest['stats']['chunks']} chunks) in {args.out}")
+        return 0
+    manifest = json.loads((Path(args.out) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    verify_checksums(_artifacts_root(Path(args.out), manifest), manifest.get("checksums") or {}, _manifest_files(manifest))
+    print(f"ok {manifest.get('version')} in {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,14 @@
+import math
+import os
+
+# Token estimate without a tokenizer; ~4 characters per token for Spanish prose.
+_CHARS_PER_TOKEN = float(os.getenv("RAG_CHARS_PER_TOKEN", "4"))
+
+
+def default_chars_per_token() -> float:
+    """RAG_CHARS_PER_TOKEN, shared by the chunker and the context assembler."""
+    return _CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str, chars_per_token: float = _CHARS_PER_TOKEN) -> int:
+    return math.ceil(len(text) / chars_per_token)
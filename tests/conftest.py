@@ -16,5 +16,9 @@ except ModuleNotFoundError:
         def __init__(self, *args, **kwargs):
             pass
 
+    class AsyncOpenAI(OpenAI):
+        pass
+
     openai.OpenAI = OpenAI
+    openai.AsyncOpenAI = AsyncOpenAI
     sys.modules["openai"] = openai
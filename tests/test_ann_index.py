@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import services.ann_index as ann
+from services.ann_index import apply_search_params, build_index, index_spec
+
+faiss = pytest.importorskip("faiss")
+
+
+def _clustered(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((32, dim))
+    x = centers[rng.integers(0, 32, size=n)] + 0.3 * rng.standard_normal((n, dim))
+    x = x.astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_auto_index_spec_scales_with_corpus_size():
+    assert index_spec(1000, 64, "auto")["type"] == "flat"
+    assert index_spec(200_000, 64, "auto")["factory"] == "IVF1788,Flat"
+    spec = index_spec(2_000_000, 1536, "auto")
+    assert spec["type"] == "ivfpq"
+    assert spec["pq_m"] == 96
+    assert 1536 % spec["pq_m"] == 0
+
+
+def test_explicit_index_types_fall_back_when_untrainable():
+    assert index_spec(5000, 64, "ivfpq")["type"] == "ivf"
+    assert index_spec(50, 64, "ivf")["type"] == "flat"
+    assert index_spec(50, 64, "hnsw")["factory"] == "HNSW32"
+    with pytest.raises(ValueError):
+        index_spec(50, 64, "lsh")
+
+
+def test_auto_respects_thresholds(monkeypatch):
+    monkeypatch.setattr(ann, "_FLAT_MAX_CHUNKS", 100)
+    assert index_spec(5000, 64)["type"] == "ivf"
+
+
+@pytest.mark.parametrize("index_type", ["ivf", "hnsw"])
+def test_ann_index_recall_against_flat(index_type):
+    x = _clustered(4000, 32)
+    queries = x[:50] + 0.05
+    flat = build_index({"type": "flat", "factory": "Flat"}, x)
+    spec = index_spec(len(x), 32, index_type)
+    index = build_index(spec, x, block_rows=1000)
+    applied = apply_search_params(index, nprobe=32, ef_search=128)
+
+    _, truth = flat.search(queries, 10)
+    _, found = index.search(queries, 10)
+    recall = np.mean([len(set(t) & set(f)) / 10 for t, f in zip(truth, found)])
+
+    assert index.ntotal == len(x)
+    assert recall >= 0.9
+    assert applied == ({"nprobe": 32} if index_type == "ivf" else {"efSearch": 128})
+    if index_type == "ivf":
+        assert spec["trained_on"] == len(x)
+
+
+def test_apply_search_params_survives_reload(tmp_path):
+    x = _clustered(4000, 16)
+    index = build_index(index_spec(len(x), 16, "ivf"), x)
+    faiss.write_index(index, str(tmp_path / "faiss.index"))
+
+    loaded = faiss.read_index(str(tmp_path / "faiss.index"))
+
+    assert apply_search_params(loaded, nprobe=7) == {"nprobe": 7}
+    assert apply_search_params(build_index({"type": "flat", "factory": "Flat"}, x)) == {}
@@ -0,0 +1,239 @@
+import asyncio
+import importlib
+import json
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from models.classifier import ClassifyResult
+
+
+def _make_request() -> Request:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "method": "POST",
+        "path": "/api/chat",
+        "headers": [],
+        "query_string": b"",
+        "client": ("testclient", 123),
+        "server": ("testserver", 80),
+        "scheme": "http",
+        "root_path": "",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    return Request(scope, receive)
+
+
+def _import_main(monkeypatch):
+    import dotenv
+
+    noop_load_dotenv = lambda *args, **kwargs: True
+    monkeypatch.setattr(dotenv, "load_dotenv", noop_load_dotenv)
+    llmsettings_mod = sys.modules.get("services.llmsettings")
+    if llmsettings_mod is not None:
+        monkeypatch.setattr(llmsettings_mod, "load_dotenv", noop_load_dotenv)
+    monkeypatch.setenv("GOOGLE_CLIENT_SECRET", "test-secret")
+    monkeypatch.setenv("DEBUG", "true")
+
+    sys.modules.pop("main", None)
+    return importlib.import_module("main")
+
+
+class SlowRag:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def aretrieve(self, query: str, top_k: int = 3, filters: dict | None = None) -> str:
+        await asyncio.sleep(self.delay)
+        return "RAG_CONTEXT_START\nfoo\nRAG_CONTEXT_END"
+
+    def lexical_context(self, query: str, top_k: int = 3, filters: dict | None = None) -> str:
+        return "RAG_CONTEXT_START\nlexical\nRAG_CONTEXT_END"
+
+
+class RoutingRag:
+    def __init__(self, precomputed: str = ""):
+        self.precomputed = precomputed
+        self.calls = []
+
+    def precomputed_context(self, topics, night_mode=False, top_k=3) -> str:
+        self.calls.append(("precomputed", list(topics), night_mode))
+        return self.precomputed
+
+    def topic_filters(self, topics):
+        return {"topics": list(topics)}
+
+    async def aretrieve(self, query: str, top_k: int = 3, filters: dict | None = None) -> str:
+        self.calls.append(("search", filters))
+        return "RAG_CONTEXT_START\nsearched\nRAG_CONTEXT_END"
+
+
+class SlowClassifier:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def aclassify(self, message: str) -> dict:
+        await asyncio.sleep(self.delay)
+        return ClassifyResult.coerce_defaults({"mood": "triste", "topics": ["ruptura"]}).model_dump()
+
+
+class RecordingChatbot:
+    def __init__(self):
+        self.settings = []
+
+    async def achat(self, message, history, setting, use_local):
+        self.settings.append(setting)
+        return "ok"
+
+
+def test_chat_runs_rag_and_classifier_concurrently(monkeypatch):
+    main = _import_main(monkeypatch)
+    chatbot = RecordingChatbot()
+    monkeypatch.setattr(main, "rag", SlowRag(0.3))
+    monkeypatch.setattr(main, "classifier", SlowClassifier(0.3))
+    monkeypatch.setattr(main, "chatbot", chatbot)
+
+    start = time.perf_counter()
+    resp = asyncio.run(main.chat(main.ChatRequest(message="hola"), _make_request()))
+    elapsed = time.perf_counter() - start
+
+    body = json.loads(resp.body)
+    assert body["classification"]["mood"] == "triste"
+    assert chatbot.settings[0]["_rag_context"].startswith("RAG_CONTEXT_START")
+    assert elapsed < 0.55
+
+
+def test_chat_falls_back_to_default_classification_on_timeout(monkeypatch):
+    main = _import_main(monkeypatch)
+    chatbot = RecordingChatbot()
+    monkeypatch.setattr(main, "rag", SlowRag(0.0))
+    monkeypatch.setattr(main, "classifier", SlowClassifier(0.5))
+    monkeypatch.setattr(main, "chatbot", chatbot)
+    monkeypatch.setattr(main, "classify_timeout", 0.05)
+
+    resp = asyncio.run(main.chat(main.ChatRequest(message="hola"), _make_request()))
+
+    body = json.loads(resp.body)
+    assert body["classification"] == ClassifyResult.coerce_defaults({}).model_dump()
+    assert body["risk"] == "none"
+    assert "_rag_context" in chatbot.settings[0]
+
+
+def test_chat_uses_lexical_context_when_rag_times_out(monkeypatch):
+    main = _import_main(monkeypatch)
+    chatbot = RecordingChatbot()
+    monkeypatch.setattr(main, "rag", SlowRag(0.5))
+    monkeypatch.setattr(main, "classifier", SlowClassifier(0.0))
+    monkeypatch.setattr(main, "chatbot", chatbot)
+    monkeypatch.setattr(main, "rag_timeout", 0.05)
+
+    asyncio.run(main.chat(main.ChatRequest(message="hola"), _make_request()))
+
+    assert "lexical" in chatbot.settings[0]["_rag_context"]
+
+
+@pytest.mark.parametrize(
+    "mode,precomputed,expected_calls,context",
+    [
+        ("filter", "", [("search", {"topics": ["ruptura"]})], "searched"),
+        ("precomputed", "RAG_CONTEXT_START\nplaybook\nRAG_CONTEXT_END", [("precomputed", ["ruptura"], False)], "playbook"),
+        (
+            "precomputed",
+            "",
+            [("precomputed", ["ruptura"], False), ("search", {"topics": ["ruptura"]})],
+            "searched",
+        ),
+    ],
+)
+def test_chat_topic_routing(monkeypatch, mode, precomputed, expected_calls, context):
+    main = _import_main(monkeypatch)
+    chatbot = RecordingChatbot()
+    rag = RoutingRag(precomputed)
+    monkeypatch.setattr(main, "rag", rag)
+    monkeypatch.setattr(main, "classifier", SlowClassifier(0.0))
+    monkeypatch.setattr(main, "chatbot", chatbot)
+    monkeypatch.setattr(main, "rag_topic_routing", mode)
+
+    asyncio.run(main.chat(main.ChatRequest(message="hola"), _make_request()))
+
+    assert rag.calls == expected_calls
+    assert context in chatbot.settings[0]["_rag_context"]
+
+
+class StreamingChatbot:
+    async def astream_chat(self, message, history, setting, use_local):
+        for delta in ("Ho", "la"):
+            yield delta
+
+
+def test_chat_stream_sends_deltas_and_final_classification(monkeypatch):
+    main = _import_main(monkeypatch)
+    monkeypatch.setattr(main, "rag", SlowRag(0.0))
+    monkeypatch.setattr(main, "classifier", SlowClassifier(0.0))
+    monkeypatch.setattr(main, "chatbot", StreamingChatbot())
+
+    async def run():
+        resp = await main.chat_stream(main.ChatRequest(message="hola"), _make_request())
+        body = "".join([chunk async for chunk in resp.body_iterator])
+        return resp, body
+
+    resp, body = asyncio.run(run())
+
+    assert resp.media_type == "text/event-stream"
+    assert "oms_guest=" in resp.headers["set-cookie"]
+    events = [block for block in body.split("\n\n") if block]
+    assert events[0] == 'event: delta\ndata: {"text": "Ho"}'
+    assert events[1] == 'event: delta\ndata: {"text": "la"}'
+    assert events[-1].startswith("event: done\n")
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert done["classification"]["mood"] == "triste"
+    assert done["risk"] == "none"
+
+
+def test_health_reports_live_before_rag_is_ready(monkeypatch):
+    main = _import_main(monkeypatch)
+
+    body = main.health()
+
+    assert body["live"] is True
+    assert body["ready"] is False
+    assert body["rag"]["state"] == "idle"
+
+
+def test_startup_fails_when_prebuilt_artifacts_are_rejected(monkeypatch, tmp_path):
+    main = _import_main(monkeypatch)
+    monkeypatch.setattr(main, "rag_build_on_startup", False)
+    monkeypatch.setattr(main.rag, "cache_dir", str(tmp_path / "cache"))
+
+    with pytest.raises(RuntimeError, match="RAG prebuilt artifacts rejected"):
+        asyncio.run(main.startup_event())
+
+    assert main.rag.status()["state"] == "failed"
+
+
+def test_admin_rag_reload_requires_token(monkeypatch):
+    main = _import_main(monkeypatch)
+    monkeypatch.setattr(main, "rag_admin_token", "s3cret")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(main.admin_rag_reload(x_admin_token="wrong"))
+
+    assert exc_info.value.status_code == 403
+
+
+def test_admin_rag_reload_rejects_non_ascii_token(monkeypatch):
+    main = _import_main(monkeypatch)
+    monkeypatch.setattr(main, "rag_admin_token", "s3cret")
+
+    with pytest.raises(HTTPException) as exc_info:
+        # Header bytes >= 0x80 arrive decoded as latin-1.
+        asyncio.run(main.admin_rag_reload(x_admin_token=b"\xf1and\xfa".decode("latin-1")))
+
+    assert exc_info.value.status_code == 403
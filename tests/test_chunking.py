@@ -0,0 +1,93 @@
+import pytest
+
+from services.chunking import TextChunk, chunk_markdown
+
+DOC = """# Guía
+
+Intro corta.
+
+## Señales
+
+Primera frase de señales. Segunda frase de señales. Tercera frase de señales.
+
+## Herramientas
+
+- Respirar despacio
+- Escribir lo que pasa
+"""
+
+
+def test_chunks_follow_headings_and_keep_breadcrumbs():
+    chunks = chunk_markdown(DOC, max_tokens=25, overlap_tokens=0)
+
+    assert [chunk.breadcrumb for chunk in chunks] == ["Guía", "Guía > Señales", "Guía > Herramientas"]
+    assert chunks[0].text == "# Guía\n\nIntro corta."
+    assert chunks[1].text.startswith("## Señales\n\nPrimera frase")
+    assert chunks[2].text == "## Herramientas\n\n- Respirar despacio\n- Escribir lo que pasa"
+
+
+def test_small_sections_are_packed_together():
+    chunks = chunk_markdown(DOC, max_tokens=1000, overlap_tokens=0)
+
+    assert chunks == [TextChunk(DOC.strip(), ("Guía",))]
+
+
+def test_long_paragraph_is_cut_at_sentences_with_sentence_overlap():
+    sentences = [f"Frase número {i} del párrafo." for i in range(12)]
+    chunks = chunk_markdown(" ".join(sentences), max_tokens=25, overlap_tokens=8)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.text) <= 100
+        assert chunk.text.startswith("Frase") and chunk.text.endswith(".")
+    for left, right in zip(chunks, chunks[1:]):
+        assert right.text.split(". ")[0] + "." in left.text
+    assert {s for chunk in chunks for s in sentences if s in chunk.text} == set(sentences)
+
+
+def test_heading_never_ends_a_chunk():
+    text = "Párrafo inicial bastante largo.\n\n## Sección\n\n" + "Texto de la sección. " * 3
+    chunks = chunk_markdown(text, max_tokens=12, overlap_tokens=0)
+
+    assert all(not chunk.text.endswith("## Sección") for chunk in chunks)
+    assert any(chunk.text.startswith("## Sección") for chunk in chunks)
+
+
+def test_text_without_breaks_falls_back_to_fixed_windows():
+    chunks = chunk_markdown("a" * 1200, max_tokens=600, overlap_tokens=100, chars_per_token=1)
+
+    assert [len(chunk.text) for chunk in chunks] == [600, 600, 200]
+    assert chunks[0].text[-100:] == chunks[1].text[:100]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Primera frase corta. Segunda frase.\n\n" + "palabra " * 100,
+        "# Título\n\n## Subtítulo\n\n" + "palabra " * 100,
+        "# Título\n\n" + "x" * 195,
+        "# Título\n\n" + "Frase de relleno bastante larga. " * 20,
+        DOC * 5,
+    ],
+)
+def test_no_chunk_exceeds_the_budget(text):
+    chunks = chunk_markdown(text, max_tokens=50, overlap_tokens=8)
+
+    assert max(len(chunk.text) for chunk in chunks) <= 200
+
+
+def test_windows_do_not_repeat_the_previous_chunk():
+    chunks = chunk_markdown("Primera frase corta. Segunda frase.\n\n" + "palabra " * 100, max_tokens=50, overlap_tokens=8)
+
+    assert chunks[0].text == "Primera frase corta. Segunda frase."
+    assert chunks[1].text.startswith("palabra")
+
+
+def test_rules_and_empty_text():
+    assert chunk_markdown("") == []
+    assert [chunk.text for chunk in chunk_markdown("uno\n\n---\n\ndos")] == ["uno\n\ndos"]
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        chunk_markdown("texto", max_tokens=10, overlap_tokens=10)
@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingEmbedder:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return np.array([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_concurrent_queries_share_one_request():
+    embedder = RecordingEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*[batcher.embed(t) for t in ("a", "bb", "a", "cccc")])
+
+    vectors = asyncio.run(run())
+
+    assert embedder.calls == [["a", "bb", "cccc"]]
+    assert [v[0] for v in vectors] == [1.0, 2.0, 1.0, 4.0]
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["items"] == 4
+    assert stats["avg_batch_size"] == 4.0
+
+
+def test_batches_are_capped_by_max_batch_size():
+    embedder = RecordingEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=2, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(*[batcher.embed(str(i)) for i in range(5)])
+
+    asyncio.run(run())
+
+    assert [len(c) for c in embedder.calls] == [2, 2, 1]
+    assert batcher.stats()["largest_batch"] == 2
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    batcher = EmbeddingBatcher(RecordingEmbedder(fail=True), max_batch_size=8, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.stats()["errors"] == 1
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.embed("c"))
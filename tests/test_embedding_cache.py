@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+import numpy as np
+
+from services.embedding_cache import QueryEmbeddingCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query_collapses_case_and_whitespace():
+    assert normalize_query("  No puedo\n  DORMIR ") == "no puedo dormir"
+
+
+def test_cache_hit_miss_and_lru_eviction():
+    cache = QueryEmbeddingCache(max_size=2, ttl_seconds=60)
+    cache.put("m", "hola", np.array([1.0, 0.0]))
+    cache.put("m", "adios", np.array([0.0, 1.0]))
+
+    assert cache.get("m", " HOLA ") is not None
+    cache.put("m", "buenas", np.array([0.5, 0.5]))
+
+    assert cache.get("m", "adios") is None
+    assert cache.get("other-model", "hola") is None
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = QueryEmbeddingCache(max_size=10, ttl_seconds=5, clock=clock)
+    cache.put("m", "hola", np.array([1.0, 0.0]))
+    clock.now += 6
+
+    assert cache.get("m", "hola") is None
+
+
+def test_disk_tier_survives_new_instance():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "query_embeddings.sqlite")
+        cache = QueryEmbeddingCache(max_size=10, ttl_seconds=60, disk_path=path)
+        cache.put("m", "hola", np.array([1.0, 0.0]))
+
+        restarted = QueryEmbeddingCache(max_size=10, ttl_seconds=60, disk_path=path)
+        vector = restarted.get("m", "hola")
+
+        assert vector is not None
+        assert vector.tolist() == [1.0, 0.0]
+        assert restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from services.embedding_dimensions import embedding_space, fit_dimensions, request_kwargs, supports_dimensions
+
+
+def test_only_matryoshka_models_get_the_dimensions_parameter():
+    assert supports_dimensions("text-embedding-3-small")
+    assert request_kwargs("text-embedding-3-large", 256) == {"dimensions": 256}
+    assert request_kwargs("text-embedding-ada-002", 256) == {}
+    assert request_kwargs("text-embedding-3-small", None) == {}
+
+
+def test_fit_dimensions_truncates_and_renormalizes():
+    x = np.random.default_rng(0).standard_normal((4, 12)).astype(np.float32)
+
+    out = fit_dimensions(x, 5)
+
+    assert out.shape == (4, 5)
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0)
+    assert np.allclose(out, x[:, :5] / np.linalg.norm(x[:, :5], axis=1, keepdims=True))
+    assert fit_dimensions(x, None) is x
+    assert fit_dimensions(x, 12) is x
+
+
+def test_fit_dimensions_rejects_vectors_that_are_too_short():
+    with pytest.raises(ValueError, match="EMBEDDING_DIMENSIONS=16"):
+        fit_dimensions(np.ones((1, 8), dtype=np.float32), 16)
+
+
+def test_embedding_space_separates_cache_keys_by_size():
+    assert embedding_space("m", None) == "m"
+    assert embedding_space("m", 256) == "m@256"
+    assert embedding_space("m", 256, "lmstudio") == "lmstudio:m@256"
+    assert embedding_space("m", None, "openai") == "m"
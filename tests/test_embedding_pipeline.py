@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+import pytest
+
+from services.embedding_pipeline import call_with_retry, embed_in_parallel, plan_batches
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_plan_batches_respects_token_budget_and_item_cap():
+    texts = ["x" * 40] * 10  # ~11 tokens each
+
+    assert [len(b) for b in plan_batches(texts, max_tokens=25, max_items=100)] == [2, 2, 2, 2, 2]
+    assert [len(b) for b in plan_batches(texts, max_tokens=10_000, max_items=4)] == [4, 4, 2]
+
+
+def test_call_with_retry_backs_off_on_rate_limit():
+    attempts = []
+    sleeps = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimitError("slow down")
+        return np.ones((1, 2), dtype=np.float32)
+
+    result = call_with_retry(flaky, max_retries=5, sleep=sleeps.append)
+
+    assert result.shape == (1, 2)
+    assert len(attempts) == 3
+    assert len(sleeps) == 2
+
+
+def test_call_with_retry_does_not_retry_client_errors():
+    def broken():
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        call_with_retry(broken, max_retries=5, sleep=lambda _s: None)
+
+
+def test_embed_in_parallel_persists_finished_batches_before_failing():
+    lock = threading.Lock()
+    persisted = {}
+
+    def embed(batch):
+        if "t3" in batch:
+            raise ValueError("boom")
+        return np.array([[float(t[1:]), 0.0] for t in batch], dtype=np.float32)
+
+    def on_batch(items):
+        with lock:
+            persisted.update(items)
+
+    items = {f"k{i}": f"t{i}" for i in range(4)}
+    with pytest.raises(ValueError):
+        embed_in_parallel(embed, items, on_batch, max_workers=1, max_items=1, max_retries=0)
+
+    assert set(persisted) == {"k0", "k1", "k2"}
+    assert persisted["k2"].tolist() == [2.0, 0.0]
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.embedding_providers import EmbeddingClients, HashingEmbedder, embedding_clients, embedding_provider
+
+
+def test_hashing_embedder_is_deterministic_and_unit_length():
+    embedder = HashingEmbedder(dimensions=64)
+
+    first = embedder.embed(["Técnicas de respiración para la ansiedad", ""])
+    second = HashingEmbedder(dimensions=64).embed(["Técnicas de respiración para la ansiedad", ""])
+
+    assert first.shape == (2, 64)
+    assert first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert not first[1].any()
+
+
+def test_hashing_embedder_ranks_shared_terms_higher():
+    embedder = HashingEmbedder()
+    query, near, far = embedder.embed(
+        ["no puedo dormir por la ansiedad", "Ansiedad nocturna: cuando no puedes dormir", "Cómo hablar con tu pareja"]
+    )
+
+    assert query @ near > query @ far
+
+
+def test_hashing_embedder_mimics_the_openai_response_shape():
+    embedder = HashingEmbedder(dimensions=8)
+
+    resp = embedder.embeddings.create(model=embedder.model, input=["hola"], dimensions=8)
+
+    assert embedder.model == "feature-hashing-8"
+    assert np.allclose(resp.data[0].embedding, embedder.embed(["hola"])[0])
+
+
+def test_embedding_provider_validates_the_name():
+    assert embedding_provider(None) == "openai"
+    assert embedding_provider("LMStudio") == "lmstudio"
+    with pytest.raises(ValueError, match="EMBEDDING_PROVIDER"):
+        embedding_provider("cohere")
+
+
+def test_embedding_clients_follow_the_configured_provider():
+    llm = SimpleNamespace(
+        embedding_model="nomic-embed-text",
+        openai_client="openai",
+        openai_async_client="openai-async",
+        lmstudio_client="lmstudio",
+        lmstudio_async_client="lmstudio-async",
+    )
+
+    assert embedding_clients(llm) == EmbeddingClients("openai", "nomic-embed-text", "openai", "openai-async")
+    llm.embedding_provider = "lmstudio"
+    assert embedding_clients(llm) == EmbeddingClients("lmstudio", "nomic-embed-text", "lmstudio", "lmstudio-async")
+
+    hashing = embedding_clients(llm, "hashing")
+    resp = asyncio.run(hashing.async_client.embeddings.create(model=hashing.model, input=["hola"]))
+    assert hashing.model.startswith("feature-hashing-")
+    assert np.allclose(resp.data[0].embedding, hashing.client.embed(["hola"])[0])
@@ -0,0 +1,88 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from services.lexical_index import BM25Index, LexicalIndexWriter, fold, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    "Técnicas de respiración para la ansiedad en el trabajo.",
+    "Noches de insomnio: la soledad pesa más cuando todos duermen.",
+    "Después de una ruptura de pareja, el duelo lleva su tiempo.",
+    "Ansiedad, ansiedad y más ansiedad antes de dormir.",
+]
+
+
+def _index(tmp, docs=DOCS):
+    writer = LexicalIndexWriter(tmp)
+    for text in docs:
+        writer.append(text)
+    entry = writer.close()
+    return BM25Index.open(tmp), entry
+
+
+def test_tokenize_folds_accents_case_stopwords_and_plurals():
+    assert fold("Ñandú ÁRBOL über") == "nandu arbol uber"
+    assert tokenize("Las RUPTURAS de pareja") == tokenize("ruptura parejas")
+    assert tokenize("emociones") == tokenize("emoción")
+    assert tokenize("de la que y en") == []
+
+
+def test_bm25_ranks_matching_chunks_and_skips_the_rest():
+    with tempfile.TemporaryDirectory() as tmp:
+        index, entry = _index(tmp)
+
+        scores, rows = index.search("ANSIEDAD", 4)
+
+        assert entry["terms"] > 0 and entry["postings"] > 0
+        assert rows.tolist() == [3, 0]
+        assert scores[0] > scores[1] > 0
+        assert index.search("insomnio soledad", 1)[1].tolist() == [1]
+        assert index.search("palabra inexistente", 3)[1].size == 0
+
+
+def test_bm25_search_restricted_to_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        index, _ = _index(tmp)
+
+        _, rows = index.search("ansiedad", 4, rows=np.array([0, 1, 2], dtype=np.int64))
+
+        assert rows.tolist() == [0]
+
+
+def test_bm25_empty_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        index, entry = _index(tmp, docs=[])
+
+        assert entry["terms"] == 0
+        assert index.search("ansiedad", 3)[1].size == 0
+
+
+def test_spilled_runs_merge_into_the_same_index():
+    docs = DOCS * 5
+    with tempfile.TemporaryDirectory() as one, tempfile.TemporaryDirectory() as many:
+        _index(one, docs)
+        writer = LexicalIndexWriter(many, run_postings=3)
+        for text in docs:
+            writer.append(text)
+        entry = writer.close()
+
+        assert len(writer._runs) > 3
+        assert sorted(p.name for p in Path(many).iterdir()) == sorted(entry["files"])
+        for name in entry["files"]:
+            a, b = f"{one}/{name}", f"{many}/{name}"
+            if name.endswith(".npy"):
+                assert np.array_equal(np.load(a), np.load(b))
+            else:
+                assert open(a, encoding="utf-8").read() == open(b, encoding="utf-8").read()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    vector = [{"row": 1, "score": 0.9}, {"row": 2, "score": 0.8}, {"row": 3, "score": 0.1}]
+    lexical = [{"row": 2, "score": 7.0}, {"row": 4, "score": 3.0}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=3, k=60)
+
+    assert [chunk["row"] for chunk in fused] == [2, 1, 4]
+    assert 0 < fused[-1]["score"] < fused[0]["score"] <= 1
+    assert reciprocal_rank_fusion([vector, vector], top_k=1)[0]["score"] == 1.0
@@ -8,6 +8,10 @@ class FakeOpenAI:
         self.kwargs = kwargs
 
 
+class FakeAsyncOpenAI(FakeOpenAI):
+    pass
+
+
 class FakeAnthropic:
     def __init__(self, **kwargs):
         self.kwargs = kwargs
@@ -19,6 +23,7 @@ def test_llmsettings_creates_clients_when_keys_present(monkeypatch):
     monkeypatch.setenv("ANTHROPIC_API_KEY", "an-key")
     monkeypatch.setenv("LMSTUDIO_BASE_URL", "http://lm")
     monkeypatch.setattr(ls, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(ls, "AsyncOpenAI", FakeAsyncOpenAI)
     monkeypatch.setattr(ls, "Anthropic", FakeAnthropic)
 
     llm = ls.LLMSettings()
@@ -29,6 +34,10 @@ def test_llmsettings_creates_clients_when_keys_present(monkeypatch):
     assert llm.openai_client.kwargs["api_key"] == "oa-key"
     assert llm.anthropic_client.kwargs["api_key"] == "an-key"
     assert llm.lmstudio_client.kwargs["base_url"] == "http://lm"
+    assert isinstance(llm.openai_async_client, FakeAsyncOpenAI)
+    assert isinstance(llm.lmstudio_async_client, FakeAsyncOpenAI)
+    assert llm.openai_async_client.kwargs["api_key"] == "oa-key"
+    assert llm.lmstudio_async_client.kwargs["base_url"] == "http://lm"
 
 
 def test_llmsettings_handles_missing_keys_gracefully(monkeypatch):
@@ -37,10 +46,13 @@ def test_llmsettings_handles_missing_keys_gracefully(monkeypatch):
     monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
     monkeypatch.setenv("LMSTUDIO_BASE_URL", "http://lm")
     monkeypatch.setattr(ls, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(ls, "AsyncOpenAI", FakeAsyncOpenAI)
     monkeypatch.setattr(ls, "Anthropic", FakeAnthropic)
 
     llm = ls.LLMSettings()
 
     assert llm.openai_client is None
     assert llm.anthropic_client is None
+    assert llm.openai_async_client is None
     assert isinstance(llm.lmstudio_client, FakeOpenAI)
+    assert isinstance(llm.lmstudio_async_client, FakeAsyncOpenAI)
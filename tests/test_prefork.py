@@ -0,0 +1,74 @@
+import pytest
+
+import services.prefork as prefork
+from services.service_rag_faiss import RagFaissService
+
+
+class FakeLLM:
+    openai_client = None
+    openai_async_client = None
+    embedding_model = "text-embedding-test"
+
+
+def test_preload_index_returns_none_when_warm_up_fails(monkeypatch, tmp_path):
+    monkeypatch.setattr(prefork, "LLMSettings", FakeLLM)
+    monkeypatch.setenv("RAG_PLAYBOOKS_PATH", str(tmp_path / "missing"))
+    monkeypatch.setenv("RAG_CACHE_DIR", str(tmp_path / "cache"))
+
+    assert prefork.preload_index(prebuilt=False) is None
+
+
+def test_preload_index_refuses_unverified_prebuilt_artifacts(monkeypatch, tmp_path):
+    monkeypatch.setattr(prefork, "LLMSettings", FakeLLM)
+    monkeypatch.setenv("RAG_CACHE_DIR", str(tmp_path / "cache"))
+
+    with pytest.raises(RuntimeError, match="RAG artifacts not found"):
+        prefork.preload_index(prebuilt=True)
+
+
+def test_preload_index_returns_index_without_connections_or_clients(monkeypatch, tmp_path):
+    closed = []
+
+    class Client:
+        def __init__(self, name):
+            self.name = name
+
+        def close(self):
+            closed.append(self.name)
+
+    class HashingLLM(FakeLLM):
+        embedding_provider = "hashing"
+
+        def __init__(self):
+            self.openai_client = Client("openai")
+            self.lmstudio_client = Client("lmstudio")
+
+    services = []
+
+    class RecordingService(RagFaissService):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            services.append(self)
+
+    (tmp_path / "playbooks").mkdir()
+    (tmp_path / "playbooks" / "a.md").write_text("# Ansiedad\n\nRespirar despacio.", encoding="utf-8")
+    monkeypatch.setattr(prefork, "LLMSettings", HashingLLM)
+    monkeypatch.setattr(prefork, "RagFaissService", RecordingService)
+    monkeypatch.setenv("RAG_PLAYBOOKS_PATH", str(tmp_path / "playbooks"))
+    monkeypatch.setenv("RAG_CACHE_DIR", str(tmp_path / "cache"))
+
+    index = prefork.preload_index(prebuilt=False)
+
+    assert len(index.chunks) == 1
+    assert index.query_cache is None and index.query_batcher is None
+    assert services[0]._store is None
+    assert sorted(closed) == ["lmstudio", "openai"]
+
+
+def test_bind_socket_is_inheritable():
+    sock = prefork.bind_socket("127.0.0.1", 0)
+    try:
+        assert sock.get_inheritable()
+        assert sock.getsockname()[1] > 0
+    finally:
+        sock.close()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from services.quantization import encode_int8, int8_scale, load_codes, vector_dtype, write_codes
+from services.service_rag_faiss import _RescoringIndex, _SimpleIndex
+
+
+def _unit_rows(n, dim, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_vector_dtype_validates():
+    assert vector_dtype("INT8") == "int8"
+    with pytest.raises(ValueError):
+        vector_dtype("float64")
+
+
+def test_int8_codes_roundtrip_within_half_a_step():
+    x = _unit_rows(500, 16)
+    scale = int8_scale(x, block_rows=128)
+    codes = encode_int8(x, scale)
+
+    assert codes.dtype == np.int8
+    assert np.all(np.abs(codes.astype(np.float32) * scale - x) <= scale / 2 + 1e-6)
+
+
+@pytest.mark.parametrize("dtype,files", [("float16", ["embeddings.f16.npy"]), ("int8", ["embeddings.i8.npy", "embeddings.i8scale.npy"])])
+def test_write_and_load_codes(tmp_path, dtype, files):
+    x = _unit_rows(300, 8)
+    entry = write_codes(tmp_path, x, dtype, block_rows=64)
+    codes, scale = load_codes(tmp_path, entry)
+
+    assert entry["files"] == files
+    assert isinstance(codes, np.memmap)
+    assert codes.shape == x.shape
+    assert (scale is None) == (dtype == "float16")
+    assert write_codes(tmp_path, x, "float32") == {"dtype": "float32", "files": []}
+
+
+def test_quantized_simple_index_with_rescoring_matches_exact_top_k(tmp_path):
+    x = _unit_rows(2000, 32)
+    queries = x[:20] + 0.01
+    exact_scores, exact = _SimpleIndex(x).search(queries, 5)
+
+    codes, scale = load_codes(tmp_path, write_codes(tmp_path, x, "int8"))
+    rescored = _RescoringIndex(_SimpleIndex(codes, block_size=300, scale=scale), x, factor=4)
+    scores, found = rescored.search(queries, 5)
+
+    assert np.array_equal(found, exact)
+    assert np.allclose(scores, exact_scores, atol=1e-5)
+
+
+def test_rescoring_index_pads_when_base_returns_fewer_candidates():
+    x = _unit_rows(3, 4)
+    scores, found = _RescoringIndex(_SimpleIndex(x), x, factor=2).search(x[:1], 5)
+
+    assert found[0, 0] == 0
+    assert list(found[0, 3:]) == [-1, -1]
+    assert np.isneginf(scores[0, 3:]).all()
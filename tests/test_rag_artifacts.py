@@ -0,0 +1,72 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import numpy as np
+
+from services.rag_artifacts import ChunkStore, ChunkStoreWriter, VectorFileWriter, build_lock, write_chunk_store
+
+
+def test_chunk_store_roundtrip():
+    chunks = [
+        {"source": "playbook_ruptura.md", "chunk_id": "playbook_ruptura:0", "text": "Duelo y ruptura"},
+        {"source": "playbook_ruptura.md", "chunk_id": "playbook_ruptura:1", "text": "Cómo dormir"},
+        {"source": "b.md", "chunk_id": "b:0", "text": "beta"},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        write_chunk_store(Path(tmp), chunks)
+        store = ChunkStore.open(Path(tmp))
+
+        assert len(store) == 3
+        assert list(store) == chunks
+        assert store[-1]["chunk_id"] == "b:0"
+        assert store.sources == ["playbook_ruptura.md", "b.md"]
+
+
+def test_chunk_store_keeps_metadata_per_source():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ChunkStoreWriter(Path(tmp))
+        writer.append("a.md", 0, "uno", {"topics": ["ruptura"]})
+        writer.append("a.md", 1, "dos", {"ignored": True})
+        writer.append("b.md", 0, "tres")
+        writer.close()
+        store = ChunkStore.open(Path(tmp))
+
+        assert store.metadata(1) == {"topics": ["ruptura"]}
+        assert store.metadata(2) == {}
+        assert store[1] == {"source": "a.md", "chunk_id": "a:1", "text": "dos"}
+
+
+def test_chunk_store_empty():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_chunk_store(Path(tmp), [])
+        store = ChunkStore.open(Path(tmp))
+
+        assert len(store) == 0
+        assert list(store) == []
+
+
+def test_vector_file_writer_appends_blocks():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "embeddings.npy"
+        writer = VectorFileWriter(path, block_rows=2)
+        writer.append(np.arange(6, dtype=np.float32).reshape(3, 2))
+        writer.append(np.arange(6, 10, dtype=np.float32).reshape(2, 2))
+        vectors = writer.close()
+
+        assert isinstance(vectors, np.memmap)
+        assert vectors.shape == (5, 2)
+        assert np.array_equal(np.asarray(vectors).reshape(-1), np.arange(10, dtype=np.float32))
+        assert not (Path(tmp) / "embeddings.npy.part").exists()
+
+
+def test_build_lock_is_exclusive():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / ".build.lock"
+        with build_lock(path):
+            with pytest.raises(TimeoutError):
+                with build_lock(path, timeout=0.05, poll_interval=0.01):
+                    pass
+        with build_lock(path, timeout=0.05):
+            pass
@@ -0,0 +1,64 @@
+import numpy as np
+
+from services.rag_context import assemble_context, estimate_tokens, mmr_select, overlap_length
+
+
+def _chunk(source, ordinal, text, score, row=0):
+    stem = source[:-3]
+    return {
+        "source": source,
+        "chunk_id": f"{stem}:{ordinal}",
+        "text": text,
+        "score": score,
+        "row": row,
+        "ordinal": ordinal,
+        "header": f"[source={source} id={stem}:{ordinal}",
+    }
+
+
+def test_overlap_length():
+    assert overlap_length("uno dos tres", "dos tres cuatro") == 8
+    assert overlap_length("abc", "xyz") == 0
+
+
+def test_assemble_merges_adjacent_chunks_without_the_overlap():
+    chunks = [
+        _chunk("a.md", 1, "tres cuatro cinco", 0.9),
+        _chunk("b.md", 0, "beta", 0.8),
+        _chunk("a.md", 0, "uno dos tres cuatro", 0.7),
+    ]
+
+    context = assemble_context(chunks, token_budget=0)
+
+    assert context == (
+        "RAG_CONTEXT_START\n"
+        "[source=a.md id=a:0-1 score=0.9000]\nuno dos tres cuatro cinco\n---\n"
+        "[source=b.md id=b:0 score=0.8000]\nbeta\n---\n"
+        "RAG_CONTEXT_END"
+    )
+
+
+def test_assemble_respects_the_token_budget():
+    chunks = [_chunk("a.md", 0, "x" * 200, 0.9), _chunk("b.md", 0, "y" * 200, 0.8), _chunk("c.md", 0, "z" * 20, 0.7)]
+
+    context = assemble_context(chunks, token_budget=100, chars_per_token=4)
+
+    assert estimate_tokens(context, 4) <= 100
+    assert "source=a.md" in context and "source=c.md" in context
+    assert "source=b.md" not in context
+
+
+def test_assemble_cuts_the_best_chunk_when_nothing_fits():
+    context = assemble_context([_chunk("a.md", 0, "palabra " * 100, 0.9)], token_budget=40, chars_per_token=4)
+
+    assert estimate_tokens(context, 4) <= 40
+    assert "palabra" in context
+    assert assemble_context([]) == ""
+
+
+def test_mmr_prefers_a_different_chunk_over_a_near_duplicate():
+    vectors = np.array([[1.0, 0.0], [0.99, 0.14], [0.6, 0.8]], dtype=np.float32)
+    chunks = [_chunk("a.md", i, str(i), score, row=i) for i, score in enumerate([0.95, 0.94, 0.7])]
+
+    assert [c["row"] for c in mmr_select(chunks, vectors, 2, lambda_=1.0)] == [0, 1]
+    assert [c["row"] for c in mmr_select(chunks, vectors, 2, lambda_=0.5)] == [0, 2]
@@ -0,0 +1,73 @@
+import json
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from services.chunking import chunk_markdown
+from services.rag_ingest import iter_chunks, iter_documents, split_front_matter, windows
+
+
+def test_iter_documents_walks_nested_markdown_tree():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "duelo").mkdir()
+        (root / "b.md").write_text("beta", encoding="utf-8")
+        (root / "duelo" / "a.md").write_text("alpha", encoding="utf-8")
+        (root / "notes.txt").write_text("ignored", encoding="utf-8")
+
+        assert list(iter_documents(tmp)) == [("b.md", "beta", {}), ("duelo/a.md", "alpha", {})]
+
+
+def test_iter_documents_reads_jsonl():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpus.jsonl"
+        lines = [
+            json.dumps({"id": "p1", "text": "alpha", "topics": ["ruptura"]}),
+            "",
+            json.dumps({"source": "p2.md", "text": "beta"}),
+            json.dumps({"text": "gamma"}),
+            json.dumps({"id": "empty", "text": ""}),
+        ]
+        path.write_text("\n".join(lines), encoding="utf-8")
+
+        assert list(iter_documents(str(path))) == [
+            ("p1", "alpha", {"topics": ["ruptura"]}),
+            ("p2.md", "beta", {}),
+            ("corpus.jsonl#4", "gamma", {}),
+        ]
+
+
+def test_iter_documents_missing_path():
+    with pytest.raises(FileNotFoundError):
+        iter_documents("/does/not/exist")
+
+
+def test_split_front_matter():
+    meta, body = split_front_matter("---\nid: ruptura\ntopics: [ruptura, pareja]\nnight_mode: true\n---\n\n# Title\n")
+
+    assert meta == {"id": "ruptura", "topics": ["ruptura", "pareja"], "night_mode": True}
+    assert body == "# Title\n"
+    assert split_front_matter("# No front matter\n---\n") == ({}, "# No front matter\n---\n")
+
+
+def test_iter_chunks_and_windows():
+    seen = []
+    chunks = iter_chunks(
+        [("a.md", "a b c", {"topics": ["x"]}), ("b.md", "d", {})],
+        lambda text: text.split(),
+        on_document=lambda source, meta: seen.append((source, meta)),
+    )
+
+    assert list(windows(chunks, 2)) == [
+        [("a.md", 0, "a", ""), ("a.md", 1, "b", "")],
+        [("a.md", 2, "c", ""), ("b.md", 0, "d", "")],
+    ]
+    assert seen == [("a.md", {"topics": ["x"]}), ("b.md", {})]
+
+
+def test_iter_chunks_keeps_heading_breadcrumbs():
+    text = "# Guide\n\nIntro.\n\n## Steps\n\nDo it."
+    chunks = list(iter_chunks([("g.md", text, {})], lambda t: chunk_markdown(t, max_tokens=5, overlap_tokens=0)))
+
+    assert [(ordinal, section) for _, ordinal, _, section in chunks] == [(0, "Guide"), (1, "Guide > Steps")]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from services.rag_metadata import MetadataIndex, chunk_metadata
+
+
+def _index():
+    meta = [
+        chunk_metadata("playbook_ruptura.md", {"id": "ruptura", "topics": ["ruptura", "pareja"]}),
+        chunk_metadata("noche/soledad.md", {"topics": "insomnio, Soledad", "night_mode": "true"}),
+        chunk_metadata("work.md", {"topics": ["trabajo"], "language": "EN"}),
+    ]
+    # Rows of one source are contiguous in practice, but need not be.
+    return MetadataIndex(np.array([0, 0, 1, 2, 1, 0], dtype=np.int32), meta)
+
+
+def test_chunk_metadata_defaults():
+    assert chunk_metadata("duelo/a.md", {}) == {"playbook": "a", "topics": [], "language": "es", "night_mode": False}
+
+
+def test_select_intersects_keys_and_unions_values():
+    index = _index()
+
+    assert index.select({"topics": ["ruptura"]}).tolist() == [0, 1, 5]
+    assert index.select({"topics": ["pareja", "soledad"]}).tolist() == [0, 1, 2, 4, 5]
+    assert index.select({"topics": ["insomnio", "trabajo"], "night_mode": True}).tolist() == [2, 4]
+    assert index.select({"language": "en"}).tolist() == [3]
+    assert index.select({"playbook": "soledad"}).tolist() == [2, 4]
+    assert index.select({"topics": ["familia"]}).tolist() == []
+    assert index.topics == {"ruptura", "pareja", "insomnio", "soledad", "trabajo"}
+    with pytest.raises(ValueError, match="unknown RAG filters"):
+        index.select({"mood": "triste"})
+
+
+def test_route_needs_an_unambiguous_topic_match():
+    index = _index()
+
+    assert index.route(["ruptura", "pareja"]) == (0, 1.0)
+    assert index.route(["ruptura", "trabajo"]) == (None, 0.0)
+    assert index.route(["insomnio", "familia"]) == (1, 0.5)
+    assert index.route(["otro"]) == (None, 0.0)
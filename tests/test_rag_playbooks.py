@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 
 from services import rag_playbooks
@@ -45,6 +48,82 @@ class TestRagPlaybooks(unittest.TestCase):
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0]["source"], "a.md")
 
+    def test_retrieve_playbook_chunks_matches_python_cosine(self):
+        import random
+
+        rnd = random.Random(0)
+        vectors = [[rnd.uniform(-1, 1) for _ in range(8)] for _ in range(50)]
+        vectors[7] = [0.0] * 8
+        query = [rnd.uniform(-1, 1) for _ in range(8)]
+        rag_playbooks._INDEX = {
+            "chunks": [{"source": f"{i}.md", "chunk_id": f"{i}:0", "text": str(i)} for i in range(50)],
+            "vectors": rag_playbooks._as_matrix(vectors),
+            "norms": [sum(x * x for x in v) ** 0.5 for v in vectors],
+            "ready": True,
+        }
+
+        def cosine(a, b):
+            na = sum(x * x for x in a) ** 0.5
+            nb = sum(x * x for x in b) ** 0.5
+            if na == 0 or nb == 0:
+                return 0.0
+            return sum(x * y for x, y in zip(a, b)) / (na * nb)
+
+        expected = sorted(range(50), key=lambda i: cosine(query, vectors[i]), reverse=True)[:5]
+        with patch("services.rag_playbooks.embed_texts", return_value=[query]):
+            results = rag_playbooks.retrieve_playbook_chunks("q", top_k=5)
+
+        self.assertEqual([r["chunk_id"] for r in results], [f"{i}:0" for i in expected])
+        for r, i in zip(results, expected):
+            self.assertAlmostEqual(r["score"], cosine(query, vectors[i]), places=5)
+
+    def test_embed_texts_uses_shared_llmsettings_client(self):
+        calls = []
+
+        class FakeEmbeddings:
+            def create(self, model, input):
+                calls.append((model, list(input)))
+                return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input])
+
+        llm = SimpleNamespace(openai_client=SimpleNamespace(embeddings=FakeEmbeddings()), embedding_model="emb-test")
+        with patch("services.rag_playbooks.get_llmsettings", return_value=llm):
+            rag_playbooks.embed_texts(["a"])
+            rag_playbooks.embed_texts(["b", "c"])
+
+        self.assertEqual(calls, [("emb-test", ["a"]), ("emb-test", ["b", "c"])])
+
+    def test_embed_texts_names_the_configured_provider_without_client(self):
+        llm = SimpleNamespace(embedding_provider="lmstudio", lmstudio_client=None, embedding_model="emb-test")
+        with patch("services.rag_playbooks.get_llmsettings", return_value=llm):
+            with self.assertRaisesRegex(RuntimeError, "no lmstudio client"):
+                rag_playbooks.embed_texts(["a"])
+
+    def test_init_rag_index_warm_restart_makes_no_embedding_calls(self):
+        llm = SimpleNamespace(openai_client=None, embedding_model="emb-test")
+        embedded = []
+
+        def fake_embed(texts):
+            embedded.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            playbooks_dir = os.path.join(tmp, "playbooks")
+            os.makedirs(playbooks_dir)
+            with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+                f.write("alpha " * 150)
+            cache_dir = os.path.join(tmp, "cache")
+
+            with patch("services.rag_playbooks.get_llmsettings", return_value=llm), \
+                    patch("services.rag_playbooks.embed_texts", side_effect=fake_embed):
+                rag_playbooks.init_rag_index(playbooks_dir=playbooks_dir, cache_dir=cache_dir)
+                first = rag_playbooks._INDEX["vectors"].copy()
+                cold_calls = len(embedded)
+                rag_playbooks.init_rag_index(playbooks_dir=playbooks_dir, cache_dir=cache_dir)
+
+            self.assertEqual(cold_calls, 2)
+            self.assertEqual(len(embedded), 2)
+            self.assertTrue((rag_playbooks._INDEX["vectors"] == first).all())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from fastapi import HTTPException
 
@@ -92,3 +94,59 @@ def test_chat_injects_rag_context_into_instructions_when_present():
     instructions = responses.calls[0]["instructions"]
     assert "Playbook guidance" in instructions
     assert "RAG_CONTEXT_START" in instructions
+
+
+class FakeAsyncResponses(FakeResponses):
+    async def create(self, **kwargs):
+        return FakeResponses.create(self, **kwargs)
+
+
+def test_achat_uses_async_client_when_available():
+    responses = FakeAsyncResponses([FakeResponse("async ok")])
+    llm = FakeLLMSettings(openai_client=FakeClient(FakeResponses([FakeResponse("sync")])))
+    llm.openai_async_client = FakeClient(responses)
+    chatbot = sc.ChatbotService(llm)
+
+    response = asyncio.run(chatbot.achat(message="hola", history=[], setting={}, use_local=False))
+
+    assert response == "async ok"
+    assert responses.calls[0]["model"] == "cloud-model"
+    assert responses.calls[0]["store"] is False
+
+
+class FakeStreamEvent:
+    def __init__(self, type_: str, delta: str = ""):
+        self.type = type_
+        self.delta = delta
+
+
+class FakeStream:
+    def __init__(self, events):
+        self._events = list(events)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._events:
+            raise StopAsyncIteration
+        return self._events.pop(0)
+
+
+def test_astream_chat_yields_text_deltas():
+    stream = FakeStream([
+        FakeStreamEvent("response.created"),
+        FakeStreamEvent("response.output_text.delta", "Ho"),
+        FakeStreamEvent("response.output_text.delta", "la"),
+        FakeStreamEvent("response.completed"),
+    ])
+    responses = FakeAsyncResponses([stream])
+    llm = FakeLLMSettings(openai_client=None)
+    llm.openai_async_client = FakeClient(responses)
+    chatbot = sc.ChatbotService(llm)
+
+    async def collect():
+        return [d async for d in chatbot.astream_chat("hola", [], {}, use_local=False)]
+
+    assert asyncio.run(collect()) == ["Ho", "la"]
+    assert responses.calls[0]["stream"] is True
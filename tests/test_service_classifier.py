@@ -1,3 +1,5 @@
+import asyncio
+
 from models.classifier import ClassifyResult
 from services.service_classifier import ClassifierService
 from services.llmsettings import LLMSettings
@@ -51,3 +53,32 @@ def test_classify_returns_defaults_on_invalid_json():
     result = service.classify("hola")
 
     assert result == ClassifyResult.coerce_defaults({}).model_dump()
+
+
+class FakeAsyncResponses(FakeResponses):
+    async def create(self, **_kwargs):
+        return self._response
+
+
+class FakeAsyncOpenAIClient:
+    def __init__(self, response):
+        self.responses = FakeAsyncResponses(response)
+
+
+def test_aclassify_uses_async_client():
+    llm = LLMSettings()
+    llm.openai_client = FakeOpenAIClient(FakeResponse("no-json"))
+    llm.openai_async_client = FakeAsyncOpenAIClient(
+        FakeResponse(
+            '{"mood":"ansioso","intensity":4,"tone_hint":"suave",'
+            '"night_mode_hint":true,"risk":"none","topics":["insomnio"]}'
+        )
+    )
+    llm.model_classifier_oa = "classifier"
+    service = ClassifierService(llm)
+
+    result = asyncio.run(service.aclassify("no puedo dormir"))
+
+    assert result["mood"] == "ansioso"
+    assert result["night_mode_hint"] is True
+    assert result["topics"] == ["insomnio"]
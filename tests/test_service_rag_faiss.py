@@ -1,9 +1,14 @@
+import asyncio
+import json
 import os
 import tempfile
+import threading
+import time
 
 import pytest
 
-from services.service_rag_faiss import RagFaissService
+from services.embedding_pipeline import embed_in_parallel
+from services.service_rag_faiss import RagFaissService, _RescoringIndex, _SimpleIndex, _embed_texts, _search_rows, main
 
 
 np = pytest.importorskip("numpy")
@@ -15,7 +20,7 @@ class FakeLLM:
         self.embedding_model = "text-embedding-test"
 
 
-def _fake_embed_texts(_client, _model, texts):
+def _fake_embed_texts(_client, _model, texts, dimensions=None):
     vecs = []
     for t in texts:
         if "alpha" in t:
@@ -27,14 +32,122 @@ def _fake_embed_texts(_client, _model, texts):
     return np.array(vecs, dtype=np.float32)
 
 
-def test_retrieve_returns_empty_if_no_openai_client():
+def test_retrieve_returns_empty_until_index_is_loaded():
     llm = FakeLLM(openai_client=None)
     service = RagFaissService(llm, disable_faiss=True)
-    service._index = object()
 
     assert service.retrieve("hola", top_k=1) == ""
 
 
+def _lexical_service(tmp, llm):
+    playbooks_dir = os.path.join(tmp, "playbooks")
+    os.makedirs(playbooks_dir, exist_ok=True)
+    docs = {
+        "a.md": "alpha: técnicas de respiración para la ansiedad",
+        "b.md": "beta: noches de insomnio y soledad",
+        "c.md": "gamma: rupturas de pareja",
+    }
+    for name, text in docs.items():
+        with open(os.path.join(playbooks_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=os.path.join(tmp, "cache"), disable_faiss=True)
+    service.build_or_load()
+    return service
+
+
+def test_build_without_openai_client_publishes_lexical_only_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        service = _lexical_service(tmp, FakeLLM(openai_client=None))
+        service.warm_up()
+
+        status = service.status()
+        root = os.path.join(tmp, "cache", service._index.manifest["artifacts_dir"])
+        assert status["state"] == "ready"
+        assert status["index"]["index_type"] is None
+        assert service._index.index is None and service._index.vectors is None
+        assert not os.path.exists(os.path.join(root, "embeddings.npy"))
+        assert "[source=b.md id=b:0 " in service.retrieve("insomnio", top_k=1)
+        assert "[source=b.md id=b:0 " in service.lexical_context("insomnio", top_k=1)
+
+        reopened = RagFaissService(FakeLLM(openai_client=None), cache_dir=os.path.join(tmp, "cache"), disable_faiss=True)
+        reopened.load_prebuilt()
+        assert "[source=c.md" in reopened.retrieve("ruptura", top_k=1)
+
+
+def test_lexical_only_index_gets_vectors_once_a_client_is_available(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        service = _lexical_service(tmp, FakeLLM(openai_client=None))
+        assert service._index.index is None
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service.llm.openai_client = object()
+        index = service.build_or_load()
+
+        assert index.loaded_from_cache is False
+        assert index.index is not None and index.vectors.shape == (3, 2)
+
+
+def test_lexical_mode_builds_without_embedding(monkeypatch):
+    monkeypatch.setattr("services.service_rag_faiss._RETRIEVAL_MODE", "lexical")
+
+    def _unexpected(*_args, **_kwargs):
+        raise AssertionError("lexical mode must not embed")
+
+    monkeypatch.setattr("services.service_rag_faiss._embed_texts", _unexpected)
+    with tempfile.TemporaryDirectory() as tmp:
+        service = _lexical_service(tmp, FakeLLM(openai_client=object()))
+
+        assert service._index.index is None
+        assert "[source=a.md" in service.retrieve("respiración", top_k=1)
+
+
+def test_retrieve_without_openai_client_uses_lexical_index(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = _lexical_service(tmp, llm)
+        # Vector index built, then the key goes away.
+        llm.openai_client = None
+
+        context = service.retrieve("Insomnio, SOLEDAD por la noche", top_k=1)
+        filtered = service.retrieve("insomnio", top_k=1, filters={"playbook": "a"})
+
+        assert "[source=b.md id=b:0 " in context
+        assert "[source=a.md" not in context
+        assert filtered == ""
+        assert asyncio.run(service.aretrieve("ruptura", top_k=1)).count("[source=c.md") == 1
+        assert service.status()["index"]["lexical_terms"] > 0
+
+
+def test_retrieve_falls_back_to_lexical_when_embedding_fails(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = _lexical_service(tmp, llm)
+
+        def _down(*_args, **_kwargs):
+            raise ConnectionError("provider down")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _down)
+        context = service.retrieve("respiración ansiosa", top_k=1)
+
+        assert "[source=a.md id=a:0 " in context
+
+
+def test_hybrid_mode_fuses_vector_and_lexical_rankings(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = _lexical_service(tmp, llm)
+        monkeypatch.setattr("services.service_rag_faiss._RETRIEVAL_MODE", "hybrid")
+
+        # The vector ranking favours alpha, BM25 finds only gamma: both make the fused top 2.
+        context = service.retrieve("alpha rupturas", top_k=2)
+
+        assert "[source=a.md" in context and "[source=c.md" in context
+        assert "[source=b.md" not in context
+
+
 def test_build_or_load_creates_cache_manifest(monkeypatch):
     llm = FakeLLM(openai_client=object())
     with tempfile.TemporaryDirectory() as tmp:
@@ -49,5 +162,682 @@ def test_build_or_load_creates_cache_manifest(monkeypatch):
         service.build_or_load()
 
         assert os.path.exists(os.path.join(cache_dir, "manifest.json"))
-        assert os.path.exists(os.path.join(cache_dir, "chunks.json"))
-        assert os.path.exists(os.path.join(cache_dir, "embeddings.npy"))
+        artifacts_dir = os.path.join(cache_dir, service._index.manifest["artifacts_dir"])
+        assert os.path.exists(os.path.join(artifacts_dir, "chunks.blob"))
+        assert os.path.exists(os.path.join(artifacts_dir, "chunks.offsets.npy"))
+        assert os.path.exists(os.path.join(artifacts_dir, "embeddings.npy"))
+
+
+def test_build_or_load_cache_hit_uses_mmapped_artifacts(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha contenido ñ")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        assert index.loaded_from_cache is True
+        assert isinstance(index.index.embeddings, np.memmap)
+        assert index.chunks[0] == {"source": "a.md", "chunk_id": "a:0", "text": "alpha contenido ñ"}
+
+
+def test_aretrieve_uses_async_client(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True)
+        service.build_or_load()
+
+        async def _fake_aembed_texts(_aclient, model, texts, dimensions=None):
+            return _fake_embed_texts(None, model, texts)
+
+        monkeypatch.setattr("services.service_rag_faiss._aembed_texts", _fake_aembed_texts)
+        llm.openai_async_client = object()
+        context = asyncio.run(service.aretrieve("beta?", top_k=1))
+
+        assert "source=b.md" in context
+        assert "source=a.md" not in context
+
+
+def test_retrieve_reuses_cached_query_embedding(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    calls = []
+
+    def _counting_embed_texts(client, model, texts, dimensions=None):
+        calls.append(list(texts))
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _counting_embed_texts)
+        service = RagFaissService(
+            llm, playbooks_dir=playbooks_dir, cache_dir=os.path.join(tmp, "cache"), disable_faiss=True
+        )
+        service.build_or_load()
+        calls.clear()
+
+        first = service.retrieve("alpha?", top_k=1)
+        second = service.retrieve("  ALPHA? ", top_k=1)
+
+        assert first == second
+        assert len(calls) == 1
+        assert service._index.status()["query_cache"]["hits"] == 1
+
+
+def test_build_or_load_only_embeds_changed_playbooks(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    embedded = []
+
+    def _counting_embed_texts(client, model, texts, dimensions=None):
+        embedded.extend(texts)
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _counting_embed_texts)
+        RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+        assert sorted(embedded) == ["alpha content", "beta content"]
+
+        embedded.clear()
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content, edited")
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        assert embedded == ["beta content, edited"]
+        assert index.loaded_from_cache is False
+        assert index.manifest["stats"] == {"chunks": 2, "embedded": 1, "reused": 1}
+        assert index.manifest["files"]["b.md"]["chunks"] == 1
+
+        embedded.clear()
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+        assert embedded == []
+        assert index.loaded_from_cache is True
+
+
+def test_build_or_load_streams_jsonl_corpus_in_windows(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    calls = []
+
+    def _recording_embed_texts(client, model, texts, dimensions=None):
+        calls.append(list(texts))
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, "corpus.jsonl")
+        cache_dir = os.path.join(tmp, "cache")
+        with open(corpus, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "p1", "text": "alpha content"}) + "\n")
+            f.write(json.dumps({"id": "p2", "text": "beta content"}) + "\n")
+            f.write(json.dumps({"id": "p3", "text": "gamma content"}) + "\n")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _recording_embed_texts)
+        monkeypatch.setattr("services.service_rag_faiss._INGEST_WINDOW", 2)
+        index = RagFaissService(llm, playbooks_dir=corpus, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        assert sorted(len(batch) for batch in calls) == [1, 2]
+        assert len(index.chunks) == 3
+        assert [chunk["chunk_id"] for chunk in index.chunks] == ["p1:0", "p2:0", "p3:0"]
+        assert index.manifest["files"]["corpus.jsonl"]["chunks"] == 3
+        assert index.index.search(np.array([[0.0, 1.0]], dtype=np.float32), 1)[1][0][0] == 1
+
+
+def test_build_cli_artifacts_load_prebuilt_without_embedding(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        out_dir = os.path.join(tmp, "artifacts")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+
+        monkeypatch.setattr("services.service_rag_faiss.LLMSettings", lambda: FakeLLM(openai_client=object()))
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        assert main(["build", "--playbooks", playbooks_dir, "--out", out_dir, "--no-faiss"]) == 0
+        assert main(["verify", "--out", out_dir]) == 0
+
+        def _no_network(*_args, **_kwargs):
+            raise AssertionError("load_prebuilt must not embed")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _no_network)
+        service = RagFaissService(FakeLLM(openai_client=None), playbooks_dir="/missing", cache_dir=out_dir)
+        index = service.load_prebuilt()
+
+        assert index.manifest["version"].startswith("v")
+        assert index.manifest["engine"] == "numpy"
+        assert len(index.chunks) == 1
+
+        with open(os.path.join(out_dir, index.manifest["artifacts_dir"], "chunks.blob"), "ab") as f:
+            f.write(b"tampered")
+        with pytest.raises(RuntimeError, match="checksum mismatch"):
+            service.load_prebuilt()
+
+
+def test_load_prebuilt_rejects_other_embedding_model(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        out_dir = os.path.join(tmp, "artifacts")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        RagFaissService(FakeLLM(openai_client=object()), playbooks_dir=playbooks_dir, cache_dir=out_dir, disable_faiss=True).build_or_load()
+
+        llm = FakeLLM(openai_client=None)
+        llm.embedding_model = "text-embedding-other"
+        with pytest.raises(RuntimeError, match="text-embedding-other"):
+            RagFaissService(llm, cache_dir=out_dir).load_prebuilt()
+
+
+def test_warm_up_reports_progress_and_failures(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+
+        missing_dir = os.path.join(tmp, "missing")
+        failing = RagFaissService(FakeLLM(openai_client=None), playbooks_dir=missing_dir, cache_dir=os.path.join(tmp, "c1"), disable_faiss=True)
+        assert failing.status()["state"] == "idle"
+        failing.warm_up()
+        status = failing.status()
+        assert status["state"] == "failed"
+        assert status["ready"] is False
+        assert "playbooks_dir not found" in status["error"]
+        assert failing.retrieve("alpha") == ""
+        assert asyncio.run(failing.aretrieve("alpha")) == ""
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = RagFaissService(FakeLLM(openai_client=object()), playbooks_dir=playbooks_dir, cache_dir=os.path.join(tmp, "c2"), disable_faiss=True)
+        service.warm_up()
+        status = service.status()
+        assert status["state"] == "ready"
+        assert status["progress"] == {"phase": "done", "files_total": 1, "chunks_done": 1, "chunks_embedded": 1}
+        assert status["index"]["embedding_model"] == "text-embedding-test"
+
+
+def test_reload_swaps_index_and_keeps_old_snapshot_usable(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        monkeypatch.setattr("services.service_rag_faiss._KEEP_BUILDS", 1)
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True)
+        service.warm_up()
+        old = service._index
+        assert service.playbooks_changed() is False
+
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content")
+        assert service.playbooks_changed() is True
+        assert service.reload() is True
+
+        new = service._index
+        assert new is not old
+        assert new.manifest["version"] != old.manifest["version"]
+        assert service.status()["index"]["version"] == new.manifest["version"]
+        assert service.status()["reloads"] == 1
+        assert len(new.chunks) == 2
+        # The old build directory was pruned, but its mmapped snapshot still answers.
+        assert not os.path.exists(os.path.join(cache_dir, old.manifest["artifacts_dir"]))
+        assert [c["source"] for c in old._search(np.array([[1.0, 0.0]], dtype=np.float32), 2)] == ["a.md"]
+
+
+def test_reload_keeps_vector_index_when_embedding_fails(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = _lexical_service(tmp, llm)
+        old = service._index
+        with open(os.path.join(tmp, "playbooks", "d.md"), "w", encoding="utf-8") as f:
+            f.write("delta: duelo")
+
+        def _down(*_args, **_kwargs):
+            raise ConnectionError("provider down")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _down)
+
+        assert service.reload() is False
+        assert service._index is old and old.index is not None
+        assert "ConnectionError" in service.status()["error"]
+
+
+def test_reload_is_skipped_while_another_runs():
+    service = RagFaissService(FakeLLM(openai_client=None), disable_faiss=True)
+    service._reload_lock.acquire()
+    try:
+        assert service.reload() is False
+    finally:
+        service._reload_lock.release()
+
+
+def test_concurrent_workers_embed_once_and_share_the_build(monkeypatch):
+    embedded = []
+    lock = threading.Lock()
+
+    def _slow_embed_texts(client, model, texts, dimensions=None):
+        with lock:
+            embedded.extend(texts)
+        time.sleep(0.2)
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        os.makedirs(os.path.join(cache_dir, ".build-crashed"))
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _slow_embed_texts)
+        services = [
+            RagFaissService(FakeLLM(openai_client=object()), playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True)
+            for _ in range(3)
+        ]
+        threads = [threading.Thread(target=service.warm_up) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert embedded == ["alpha content"]
+        assert all(service.status()["state"] == "ready" for service in services)
+        assert len({service._index.manifest["artifacts_dir"] for service in services}) == 1
+        assert sum(service._index.loaded_from_cache is False for service in services) == 1
+        assert not os.path.exists(os.path.join(cache_dir, ".build-crashed"))
+
+
+def test_adopt_rebinds_query_cache_and_batcher(monkeypatch):
+    monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        parent = RagFaissService(FakeLLM(openai_client=object()), playbooks_dir=playbooks_dir, cache_dir=os.path.join(tmp, "cache"), disable_faiss=True)
+        index = parent.build_or_load()
+
+        worker = RagFaissService(FakeLLM(openai_client=object()), disable_faiss=True)
+        worker.adopt(index)
+
+        assert worker.is_ready
+        assert worker.status()["state"] == "ready"
+        assert worker._index.chunks is index.chunks
+        assert worker._index.query_cache is worker.query_cache
+        assert worker._index.query_batcher is worker.query_batcher
+        assert worker._index.query_batcher is not parent.query_batcher
+
+
+def test_changing_index_type_rebuilds_without_reembedding(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    embedded = []
+
+    def _counting_embed_texts(client, model, texts, dimensions=None):
+        embedded.extend(texts)
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content")
+
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _counting_embed_texts)
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir).build_or_load()
+        assert index.manifest["index"]["factory"] == "Flat"
+        assert index.status()["index_type"] == "Flat"
+
+        embedded.clear()
+        monkeypatch.setattr("services.ann_index._INDEX_TYPE", "hnsw")
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir).build_or_load()
+
+        assert index.loaded_from_cache is False
+        assert embedded == []
+        assert index.manifest["index"]["factory"] == "HNSW32"
+        assert index.index.hnsw.efSearch == 64
+        assert [c["source"] for c in index._search(np.array([[0.0, 1.0]], dtype=np.float32), 1)] == ["b.md"]
+
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir).build_or_load()
+        assert index.loaded_from_cache is True
+        assert index.index.hnsw.efSearch == 64
+
+
+@pytest.mark.parametrize("disable_faiss", [True, False])
+def test_int8_storage_is_rescored_and_verified(monkeypatch, disable_faiss):
+    llm = FakeLLM(openai_client=object())
+    embedded = []
+
+    def _counting_embed_texts(client, model, texts, dimensions=None):
+        embedded.extend(texts)
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("beta content")
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _counting_embed_texts)
+        RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=disable_faiss).build_or_load()
+
+        embedded.clear()
+        monkeypatch.setattr("services.quantization._VECTOR_DTYPE", "int8")
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=disable_faiss)
+        index = service.build_or_load()
+
+        assert embedded == []
+        assert index.loaded_from_cache is False
+        assert index.manifest["quantization"]["dtype"] == "int8"
+        assert isinstance(index.index, _RescoringIndex)
+        if disable_faiss:
+            assert "embeddings.i8.npy" in index.manifest["checksums"]
+        else:
+            assert index.manifest["index"]["factory"] == "SQ8"
+        results = index._search(np.array([[0.0, 1.0]], dtype=np.float32), 2)
+        assert [c["source"] for c in results] == ["b.md", "a.md"]
+        assert results[0]["score"] == pytest.approx(1.0)
+
+        prebuilt = service.load_prebuilt()
+        assert isinstance(prebuilt.index, _RescoringIndex)
+
+
+def test_embed_texts_requests_or_truncates_dimensions():
+    requests = []
+
+    class _Embeddings:
+        def create(self, model, input, **kwargs):
+            requests.append(kwargs)
+            size = kwargs.get("dimensions", 6)
+            data = [type("Item", (), {"embedding": [1.0] * size})() for _ in input]
+            return type("Resp", (), {"data": data})()
+
+    client = type("Client", (), {"embeddings": _Embeddings()})()
+
+    native = _embed_texts(client, "text-embedding-3-small", ["a"], 4)
+    truncated = _embed_texts(client, "local-model", ["a"], 4)
+
+    assert requests == [{"dimensions": 4}, {}]
+    assert native.shape == truncated.shape == (1, 4)
+    assert np.allclose(np.linalg.norm(truncated, axis=1), 1.0)
+
+
+def test_each_planned_batch_is_one_request_and_retries_resend_only_it():
+    sizes = []
+
+    class RateLimitError(Exception):
+        status_code = 429
+        response = type("Resp", (), {"headers": {"retry-after": "0"}})()
+
+    class _Embeddings:
+        def create(self, model, input, **kwargs):
+            sizes.append(len(input))
+            if len(sizes) == 1:
+                raise RateLimitError("slow down")
+            data = [type("Item", (), {"embedding": [1.0, 0.0]})() for _ in input]
+            return type("Resp", (), {"data": data})()
+
+    client = type("Client", (), {"embeddings": _Embeddings()})()
+    with tempfile.TemporaryDirectory() as tmp:
+        service = RagFaissService(FakeLLM(openai_client=client), cache_dir=tmp, disable_faiss=True)
+        vectors, embedded = service._embed_with_store(client, "text-embedding-test", [f"texto {i}" for i in range(300)])
+        service._store.close()
+
+    assert embedded == 300
+    assert vectors.shape == (300, 2)
+    # Two requests (256-item cap); only the rate-limited one is sent again.
+    assert set(sizes) == {256, 44}
+    assert len(sizes) == 3 and sum(sizes) - sizes[0] == 300
+
+
+def test_changing_embedding_dimensions_rebuilds_with_separate_cache_keys(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    calls = []
+
+    def _sized_embed_texts(client, model, texts, dimensions=None):
+        calls.append(dimensions)
+        vectors = np.array([[1.0, 0.0, 0.5] if "alpha" in t else [0.0, 1.0, 0.5] for t in texts], dtype=np.float32)
+        return vectors[:, :dimensions] if dimensions else vectors
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("alpha content")
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _sized_embed_texts)
+        full = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        llm.embedding_dimensions = 2
+        calls.clear()
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True)
+        short = service.build_or_load()
+
+        assert full.manifest["dim"] == 3
+        assert full.manifest["embedding_dimensions"] is None
+        assert calls == [2]
+        assert short.loaded_from_cache is False
+        assert short.manifest["dim"] == 2
+        assert short.manifest["embedding_dimensions"] == 2
+        assert short.status()["embedding_dimensions"] == 2
+        assert short.space == "text-embedding-test@2"
+        assert service.load_prebuilt().dimensions == 2
+
+        llm.embedding_dimensions = None
+        with pytest.raises(RuntimeError, match="EMBEDDING_DIMENSIONS is unset"):
+            RagFaissService(llm, cache_dir=cache_dir).load_prebuilt()
+
+
+@pytest.mark.parametrize("disable_faiss", [True, False])
+def test_metadata_filters_and_precomputed_context(monkeypatch, disable_faiss):
+    llm = FakeLLM(openai_client=object())
+    calls = []
+
+    def _counting_embed_texts(client, model, texts, dimensions=None):
+        calls.append(list(texts))
+        return _fake_embed_texts(client, model, texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write("---\ntopics: [ruptura, pareja]\n---\nalpha content")
+        with open(os.path.join(playbooks_dir, "b.md"), "w", encoding="utf-8") as f:
+            f.write("---\ntopics: [insomnio]\nnight_mode: true\n---\nbeta content")
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _counting_embed_texts)
+        RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=disable_faiss).build_or_load()
+
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=disable_faiss)
+        index = service.build_or_load()
+        assert index.loaded_from_cache is True
+        assert index.chunks[0]["text"] == "alpha content"
+        assert index.chunks.metadata(1)["night_mode"] is True
+
+        calls.clear()
+        # "alpha" wins unfiltered; the filter leaves only the insomnio playbook.
+        assert "source=a.md" in service.retrieve("alpha?", top_k=1)
+        filtered = service.retrieve("alpha?", top_k=2, filters=service.topic_filters(["insomnio", "otro"]))
+        assert "source=b.md" in filtered and "source=a.md" not in filtered
+        assert service.retrieve("alpha?", filters={"topics": ["familia"]}) == ""
+        assert service.topic_filters(["familia", "otro"]) is None
+        assert len(calls) == 1  # the filtered query reused the cached embedding, the empty slice embedded nothing
+
+        calls.clear()
+        context = service.precomputed_context(["ruptura", "pareja"])
+        assert "source=a.md" in context and "alpha content" in context
+        assert service.precomputed_context(["ruptura", "insomnio"]) == ""
+        assert calls == []
+
+
+def test_retrieve_merges_overlapping_neighbour_chunks(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    text = " ".join(f"alpha{i:03d}" for i in range(150))
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "a.md"), "w", encoding="utf-8") as f:
+            f.write(text)
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        service = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=os.path.join(tmp, "cache"), disable_faiss=True)
+        index = service.build_or_load()
+        assert len(index.chunks) == 3
+
+        context = service.retrieve("alpha?", top_k=3)
+
+        assert context.count("[source=a.md") == 1
+        assert "[source=a.md id=a:0-2 " in context
+        assert text in context
+
+
+def test_hashing_provider_builds_offline_and_provider_changes_rebuild(monkeypatch):
+    llm = FakeLLM(openai_client=None)
+    llm.embedding_provider = "hashing"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = _lexical_service(tmp, llm)
+        index = service._index
+
+        assert index.manifest["embedding_provider"] == "hashing"
+        assert index.model == "feature-hashing-512"
+        assert index.space == "hashing:feature-hashing-512"
+        assert index.status()["embedding_provider"] == "hashing"
+        assert "alpha" in index.retrieve(service.embedder.client, "alpha respiración", top_k=1)[0]["text"]
+        assert "beta" in service.retrieve("insomnio por las noches", top_k=1)
+        assert "beta" in asyncio.run(service.aretrieve("insomnio por las noches", top_k=1))
+        assert service.load_prebuilt().provider == "hashing"
+
+        llm.embedding_provider = "openai"
+        with pytest.raises(RuntimeError, match="hashing embedding provider, EMBEDDING_PROVIDER is openai"):
+            service.load_prebuilt()
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        llm.openai_client = object()
+        rebuilt = RagFaissService(llm, playbooks_dir=service.playbooks_dir, cache_dir=service.cache_dir, disable_faiss=True)
+
+        assert rebuilt.build_or_load().loaded_from_cache is False
+        assert rebuilt._index.manifest["embedding_provider"] == "openai"
+
+
+def test_markdown_chunks_carry_sections_and_chunker_changes_rebuild(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    text = "# Guide\n\n## Alpha\n\n" + "alpha words here. " * 30 + "\n\n## Beta\n\n" + "beta words here. " * 30
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        with open(os.path.join(playbooks_dir, "g.md"), "w", encoding="utf-8") as f:
+            f.write(text)
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _fake_embed_texts)
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        results = index.retrieve(llm.openai_client, "beta?", top_k=1)
+        assert results[0]["section"] == "Guide > Beta"
+        assert results[0]["text"].startswith("## Beta")
+        assert index.manifest["chunking"]["version"] >= 1
+
+        monkeypatch.setattr("services.service_rag_faiss.chunking_config", lambda: {"version": -1})
+        rebuilt = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+        assert rebuilt.loaded_from_cache is False
+
+
+def test_simple_index_blocked_batch_search_matches_full_sort():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((1000, 16)).astype(np.float32)
+    queries = rng.standard_normal((5, 16)).astype(np.float32)
+
+    scores, idx = _SimpleIndex(embeddings, block_size=64).search(queries, 4)
+
+    full = queries @ embeddings.T
+    expected = np.argsort(-full, axis=1)[:, :4]
+    assert idx.tolist() == expected.tolist()
+    assert np.allclose(scores, np.take_along_axis(full, expected, axis=1))
+
+
+def test_simple_index_k_larger_than_corpus():
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+
+    scores, idx = _SimpleIndex(embeddings).search(np.array([[0.0, 1.0]], dtype=np.float32), 5)
+
+    assert idx.tolist() == [[1, 0]]
+
+
+def test_interrupted_build_resumes_from_stored_batches(monkeypatch):
+    llm = FakeLLM(openai_client=object())
+    embedded = []
+    provider_down = [True]
+
+    def _flaky_embed_texts(client, model, texts, dimensions=None):
+        if provider_down[0] and any("beta" in t for t in texts):
+            raise ValueError("provider down")
+        embedded.extend(texts)
+        return _fake_embed_texts(client, model, texts)
+
+    def _one_item_batches(embed_fn, items, on_batch):
+        return embed_in_parallel(embed_fn, items, on_batch, max_workers=1, max_items=1, max_retries=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playbooks_dir = os.path.join(tmp, "playbooks")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(playbooks_dir, exist_ok=True)
+        for name, text in (("a.md", "alpha content"), ("b.md", "beta content")):
+            with open(os.path.join(playbooks_dir, name), "w", encoding="utf-8") as f:
+                f.write(text)
+
+        monkeypatch.setattr("services.service_rag_faiss.embed_in_parallel", _one_item_batches)
+        monkeypatch.setattr("services.service_rag_faiss._embed_texts", _flaky_embed_texts)
+        # The failed build still publishes a BM25-only index to serve meanwhile.
+        partial = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+        assert partial.index is None
+        assert embedded == ["alpha content"]
+
+        embedded.clear()
+        provider_down[0] = False
+        index = RagFaissService(llm, playbooks_dir=playbooks_dir, cache_dir=cache_dir, disable_faiss=True).build_or_load()
+
+        assert embedded == ["beta content"]
+        assert index.manifest["stats"]["reused"] == 1
+
+
+@pytest.mark.parametrize("rows", [np.arange(100, 400), np.r_[5:40, 300:900, 990:1000], np.arange(0, 1000, 7)])
+def test_search_rows_matches_exact_search_on_the_slice(rows):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 8)).astype(np.float32)
+    q = rng.standard_normal((2, 8)).astype(np.float32)
+
+    scores, idx = _search_rows(vectors, rows.astype(np.int64), q, 5, block_size=64)
+
+    full = q @ vectors[rows].T
+    expected = rows[np.argsort(-full, axis=1)[:, :5]]
+    assert idx.tolist() == expected.tolist()
+    assert np.allclose(scores, np.sort(full, axis=1)[:, ::-1][:, :5])